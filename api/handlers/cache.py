@@ -0,0 +1,61 @@
+"""In-process caches that live as long as a warm Lambda container."""
+
+import sys
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by total entry size, with a TTL.
+
+    `sizeof` estimates an entry's size in bytes. A cache with `max_bytes` of
+    0 is disabled: `get` always misses and `put` stores nothing.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, sizeof=sys.getsizeof):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self.size = 0
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """Returns the cached value, or None when missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self.discard(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        size = self.sizeof(value)
+        self.discard(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, time.monotonic() + self.ttl_seconds)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self):
+        return len(self._entries)
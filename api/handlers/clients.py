@@ -0,0 +1,154 @@
+"""Shared AWS clients, built on first use.
+
+Handlers bind `Lazy` stand-ins at import time instead of constructing boto3
+clients, so a cold start only pays for the session, service models and
+endpoint resolution of the clients a request actually uses; one that fails
+authorization or is routed to 405 builds none. Every client and resource
+comes from one session with the timeouts, retry mode and connection pool
+below, and is reused by later invocations of the same process.
+
+Tests and benchmarks replace a client, resource or table with `inject`.
+
+Cold start and client construction times are reported by the handlers:
+call `invocation_started()` first in the handler and log `take_metrics()`,
+or `print_metrics()` in the stream handlers.
+"""
+
+import json
+import threading
+import time
+
+import boto3
+from botocore.config import Config
+
+BASE_CONFIG = Config(
+    connect_timeout=2,
+    read_timeout=10,
+    retries={"mode": "standard", "max_attempts": 3},
+    # memo.py scatters up to SCATTER_CONCURRENCY queries at once
+    max_pool_connections=32,
+    tcp_keepalive=True,
+)
+# A Bedrock call reads for as long as the model generates; two attempts fit
+# the OCR worker's 120 second timeout, and the job queue retries after that
+SERVICE_CONFIGS = {
+    "bedrock-runtime": Config(read_timeout=50, retries={"mode": "standard", "max_attempts": 2}),
+}
+
+KINDS = ("client", "resource", "table")
+
+_lock = threading.RLock()
+_session = None
+# {(kind, name): client, resource or table}, built or injected
+_instances = {}
+
+_loaded = time.perf_counter()
+_cold = True
+_pending_metrics = {}
+
+
+class Lazy:
+    """Stands in for a client, resource or table until it is first used.
+
+    Every attribute access looks the instance up again, so `inject` also
+    reaches modules that bound the stand-in at import time.
+    """
+
+    __slots__ = ("_kind", "_name")
+
+    def __init__(self, kind: str, name: str):
+        if kind not in KINDS:
+            raise ValueError(f"kind must be one of {', '.join(KINDS)}")
+        self._kind = kind
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._kind, self._name), attr)
+
+    def __repr__(self):
+        return f"Lazy({self._kind!r}, {self._name!r})"
+
+
+def get(kind: str, name: str):
+    """The client or resource for service `name`, or the DynamoDB table `name`."""
+    instance = _instances.get((kind, name))
+    if instance is None:
+        with _lock:
+            instance = _instances.get((kind, name))
+            if instance is None:
+                instance = _instances[(kind, name)] = _build(kind, name)
+    return instance
+
+
+def client(service_name: str):
+    return get("client", service_name)
+
+
+def resource(service_name: str):
+    return get("resource", service_name)
+
+
+def table(table_name: str):
+    return get("table", table_name)
+
+
+def inject(kind: str, name: str, value):
+    """Makes `get(kind, name)` return `value`, e.g. a stubbed client.
+
+    Injecting the DynamoDB resource also drops the tables built from the old one.
+    """
+    with _lock:
+        if (kind, name) == ("resource", "dynamodb"):
+            for key in [key for key in _instances if key[0] == "table"]:
+                del _instances[key]
+        _instances[(kind, name)] = value
+
+
+def reset():
+    """Forgets every built and injected instance; the next use builds anew."""
+    with _lock:
+        _instances.clear()
+
+
+def invocation_started():
+    """Marks the start of an invocation; the first one in a process is the cold start."""
+    global _cold
+    if _cold:
+        _cold = False
+        _pending_metrics["ColdStart"] = 1
+        _pending_metrics["InitMs"] = round((time.perf_counter() - _loaded) * 1000, 3)
+
+
+def take_metrics():
+    """Returns and clears the timings recorded since the last call.
+
+    ColdStart and InitMs (from the first handler import to its first
+    invocation) on a cold start, and ClientInitMs for clients built since.
+    """
+    metrics = dict(_pending_metrics)
+    _pending_metrics.clear()
+    return metrics
+
+
+def print_metrics(source: str):
+    """Prints the timings `take_metrics` would return, if there are any."""
+    metrics = take_metrics()
+    if metrics:
+        print(f"{source} client timings: {json.dumps(metrics)}")
+
+
+def _build(kind: str, name: str):
+    global _session
+    if kind == "table":
+        return resource("dynamodb").Table(name)
+    started = time.perf_counter()
+    if _session is None:
+        _session = boto3.session.Session()
+    config = BASE_CONFIG.merge(SERVICE_CONFIGS[name]) if name in SERVICE_CONFIGS else BASE_CONFIG
+    if kind == "client":
+        instance = _session.client(name, config=config)
+    else:
+        instance = _session.resource(name, config=config)
+    elapsed = round((time.perf_counter() - started) * 1000, 3)
+    _pending_metrics["ClientInitMs"] = _pending_metrics.get("ClientInitMs", 0) + elapsed
+    return instance
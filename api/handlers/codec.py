@@ -0,0 +1,60 @@
+"""Storage codec for memo bodies kept in DynamoDB.
+
+Values are written either as plain strings or as a Binary whose first byte
+names the codec, so readers can always tell how to decode them and items
+written before compression existed keep working.
+"""
+
+import os
+import zlib
+
+from boto3.dynamodb.types import Binary
+
+try:
+    import zstandard
+except ImportError:  # Not part of the Lambda runtime; zlib is always available
+    zstandard = None
+
+ZLIB = 0x01
+ZSTD = 0x02
+
+# Values smaller than this are stored as-is; DynamoDB bills writes per 1 KB.
+MIN_COMPRESS_BYTES = 256
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+CODEC = os.environ.get("MEMO_CODEC", "zlib")
+
+
+def encode(text: str, codec: str = None):
+    """Returns `text` as a compressed Binary, or unchanged when that is not smaller."""
+    codec = codec or CODEC
+    raw = text.encode("utf-8")
+    if codec == "none" or len(raw) < MIN_COMPRESS_BYTES:
+        return text
+
+    if codec == "zstd" and zstandard is not None:
+        packed = bytes([ZSTD]) + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = bytes([ZLIB]) + zlib.compress(raw, ZLIB_LEVEL)
+    if len(packed) >= len(raw):
+        return text
+    return packed
+
+
+def decode(value) -> str:
+    """Inverse of `encode`; accepts plain strings, bytes and boto3 Binary values."""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, Binary):
+        value = value.value
+    marker, payload = value[0], bytes(value[1:])
+    if marker == ZLIB:
+        return zlib.decompress(payload).decode("utf-8")
+    if marker == ZSTD:
+        if zstandard is None:
+            raise ValueError("Value is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+    raise ValueError(f"Unknown codec marker {marker:#x}")
@@ -0,0 +1,54 @@
+"""Compacts memo revision history (see handlers/revisions.py).
+
+Triggered by the revision table's stream, filtered to new revisions. For each
+memo in a batch it counts back from the newest revision to the last snapshot;
+once REVISION_SNAPSHOT_EVERY deltas follow it, or they add up to its size, the
+newest revision is rebuilt and stored as a snapshot and the oldest revisions
+beyond the retention limits are trimmed. A history without any snapshot (the
+memo was written before history was kept) gets one from the memo's current
+content. Failures are raised so the stream retries the batch.
+"""
+
+from handlers import clients, memo, revisions
+
+
+def handler(event, context):
+    clients.invocation_started()
+    newest = {}
+    for record in event.get("Records", []):
+        keys = record["dynamodb"]["Keys"]
+        memo_key, version = keys["memo"]["S"], int(keys["version"]["N"])
+        newest[memo_key] = max(version, newest.get(memo_key, 0))
+    for memo_key, version in newest.items():
+        user_id, _, memo_id = memo_key.partition("#")
+        _compact(user_id, memo_id, version)
+    clients.print_metrics("Compactor")
+
+
+def _compact(user_id: str, memo_id: str, version: int):
+    count, size, snapshot_bytes = revisions.since_snapshot(user_id, memo_id, version)
+    snapshotted = version
+    if snapshot_bytes is None:
+        snapshotted = _snapshot_current(user_id, memo_id)
+    elif count >= revisions.SNAPSHOT_EVERY or (count and size >= snapshot_bytes):
+        content = memo._revision_content(user_id, memo_id, version)
+        if content is None:
+            snapshotted = _snapshot_current(user_id, memo_id)
+        else:
+            revisions.add_snapshot(user_id, memo_id, version, content)
+    elif count:
+        return
+    # Trimmed whenever a snapshot was added, by the memo handler or above
+    trimmed = revisions.trim(user_id, memo_id)
+    print(f"Compacted {user_id}/{memo_id}: snapshot at {snapshotted}, {trimmed} revisions trimmed")
+
+
+def _snapshot_current(user_id: str, memo_id: str):
+    """Snapshots the memo as stored now; returns the version, or None if it is gone."""
+    header, item_rows = memo._read_memo(user_id, memo_id, consistent=True)
+    if header is None:
+        return None
+    version = memo._version_of(header)
+    content = memo._content_of(user_id, header, item_rows, resolve=False)
+    revisions.add_snapshot(user_id, memo_id, version, content)
+    return version
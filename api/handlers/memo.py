@@ -1,19 +1,221 @@
 """Memo API handler backed by DynamoDB with Cognito auth."""
 
+import base64
+import gzip
+import hashlib
+import heapq
+import hmac
+import io
+import itertools
 import json
 import os
+import random
+import re
+import sys
+import tarfile
+import tempfile
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
-import boto3
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
 
-# Initialize DynamoDB resource
-dynamodb = boto3.resource("dynamodb")
+from handlers import cache, clients, codec, revisions, search
+
+# DynamoDB resource and table, built on first use (see handlers/clients.py)
+dynamodb = clients.Lazy("resource", "dynamodb")
 TABLE_NAME = os.environ.get("DYNAMO_TABLE_NAME", "")
-table = dynamodb.Table(TABLE_NAME)
+table = clients.Lazy("table", TABLE_NAME)
+
+# Canvas images are stored once per user in S3, keyed by their SHA-256
+s3 = clients.Lazy("client", "s3")
+ASSET_BUCKET_NAME = os.environ.get("ASSET_BUCKET_NAME", "")
+ASSET_URL_EXPIRES_IN = 3600
+# ETags handed out for GET include the current window, so a client revalidating
+# with If-None-Match never keeps presigned URLs older than half their lifetime
+ETAG_WINDOW_SECONDS = ASSET_URL_EXPIRES_IN // 2
+# SVG previews rendered by handlers/preview.py from the table's stream. The
+# presigned URL for each (memo, updated_at) is reused for a window, so the
+# browser's cached copy stays valid across list requests.
+PREVIEW_PREFIX = "previews/"
+preview_urls = cache.LRUCache(1024 * 1024, ETAG_WINDOW_SECONDS)
+DATA_URL_PATTERN = re.compile(r"^data:(?P<media_type>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,")
+
+# Memos this container read or wrote recently, keyed by (user_id, memo_id,
+# version). GET still reads the header's version, and writes publish a new
+# version only after their item rows, so a hit is never stale. A read that
+# overlaps a write is not cached. Set MEMO_CACHE_MAX_BYTES=0 to always read
+# through to DynamoDB.
+MEMO_CACHE_MAX_BYTES = int(os.environ.get("MEMO_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+MEMO_CACHE_TTL_SECONDS = int(os.environ.get("MEMO_CACHE_TTL_SECONDS", "300"))
+memo_cache = cache.LRUCache(
+    MEMO_CACHE_MAX_BYTES,
+    MEMO_CACHE_TTL_SECONDS,
+    sizeof=lambda entry: sys.getsizeof(entry["content"]) + 256,
+)
+
+# Counters added to the invocation's metrics line, reset per request
+invocation_metrics = {}
+
+# Signs the opaque list cursors so clients cannot forge a LastEvaluatedKey. The
+# key is read from Secrets Manager on first use and kept for the life of the
+# container; without CURSOR_SECRET_ARN (local runs) it is empty.
+CURSOR_SECRET_ARN = os.environ.get("CURSOR_SECRET_ARN", "")
+secretsmanager = clients.Lazy("client", "secretsmanager")
+_cursor_signing_key = None
+
+# Canvases are stored as a header row keyed by memo_id plus one row per item
+# keyed by "{memo_id}#{item_id}". Other content stays in the header's `content`.
+ROW_SEPARATOR = "#"
+ROWS_LAYOUT = "rows"
+
+# A PUT or PATCH claims the memo's header (`write_claim`, `write_claim_until`) while it
+# writes item rows, so two writes never interleave their rows; its new version
+# and ETag are published by the final header update, which also releases the
+# claim. Longer than the handler's 30 second timeout, so a claim only expires
+# once its writer is gone.
+WRITE_CLAIM_SECONDS = 60
+CLAIM_ATTRIBUTES = ("write_claim", "write_claim_until")
+# A write without a version precondition waits this many attempts for a
+# claimed header to be published, then gives up with 409
+CLAIM_ATTEMPTS = 5
+CLAIM_RETRY_BASE_SECONDS = 0.05
+
+# Key schema of the table. Version 1 keeps all of a user's rows under the
+# partition key `user_id`; version 2 spreads them over MEMO_SHARD_COUNT
+# partitions "{user_id}#{shard}" picked by memo_id, so one user's autosaves
+# are not capped by a single partition's throughput. A memo's rows always
+# share a partition; lists scatter-gather across all of them. MEMO_SHARD_COUNT
+# must not change once version 2 holds data.
+#
+# MEMO_KEY_MIGRATION=1 is set while moving from version 1 (see
+# scripts/migrate_memo_shards.py): multi-memo reads also look under the
+# version 1 key, and a memo is moved to its shard before it is read or written.
+TABLE_KEY_VERSION = int(os.environ.get("MEMO_TABLE_KEY_VERSION", "1"))
+SHARD_COUNT = int(os.environ.get("MEMO_SHARD_COUNT", "8"))
+SHARD_SEPARATOR = "#"
+KEY_MIGRATION = TABLE_KEY_VERSION >= 2 and os.environ.get("MEMO_KEY_MIGRATION") == "1"
+SCATTER_CONCURRENCY = 16
+# A move within these bounds is one transaction (a put and a delete per row;
+# transactions take 100 actions and 4 MB)
+MAX_TRANSACT_ROWS = 50
+MAX_TRANSACT_BYTES = 3 * 1024 * 1024
+
+# GSI over (user_id, updated_at) that projects only SUMMARY_ATTRIBUTES.
+# Item rows have no updated_at, so only headers are indexed.
+UPDATED_AT_INDEX = "UpdatedAtIndex"
+
+LIST_VIEWS = ("full", "summary")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 200
+
+# PATCH /memos/{memo_id} limits
+MAX_PATCH_OPS = 500
+
+# Autosaves from one tab carry `clientId` and an increasing `clientSeq`. The
+# header remembers the last pair applied, so a save overtaken in flight by a
+# newer one from the same tab is dropped instead of writing older state.
+MAX_CLIENT_ID_LENGTH = 128
+
+# POST /memos/batch-get. API Gateway resource paths cannot contain ':', so the
+# batch method is a static sub-resource; it takes precedence over {memo_id}.
+BATCH_GET_RESOURCE = "/memos/batch-get"
+BATCH_GET_VIEWS = ("summary", "full")
+MAX_BATCH_GET_IDS = 100
+BATCH_RETRY_ATTEMPTS = 5
+BATCH_RETRY_BASE_SECONDS = 0.05
+
+# GET /memos/export and POST /memos/import. Archives are spooled in memory up to
+# EXPORT_SPOOL_BYTES, then to /tmp, and handed out as a temporary S3 object
+# under EXPORT_PREFIX (expired by a bucket lifecycle rule).
+EXPORT_RESOURCE = "/memos/export"
+IMPORT_RESOURCE = "/memos/import"
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "tar": "application/gzip"}
+EXPORT_EXTENSIONS = {"ndjson": "ndjson", "tar": "tar.gz"}
+EXPORT_PREFIX = "exports/"
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+EXPORT_URL_EXPIRES_IN = 900
+# PAX header of a tar export's assets/{assetId} entries holding the image's type
+ASSET_MEDIA_TYPE_PAX_HEADER = "NEATMEMO.mediaType"
+IMPORT_CHUNK_SIZE = 25
+MAX_IMPORT_ERRORS = 100
+
+# DELETE /memos/{memo_id} leaves a tombstone: `deleted_at` plus `expires_at`,
+# the table's TTL attribute. Until DynamoDB expires it the memo can be restored
+# with POST /memos/{memo_id}/restore; afterwards handlers/purge.py removes its
+# item rows and search postings.
+RESTORE_RESOURCE = "/memos/{memo_id}/restore"
+TOMBSTONE_TTL_SECONDS = int(os.environ.get("MEMO_TOMBSTONE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Revision history in handlers/revisions.py; a revision is the memo version
+# the write produced
+REVISIONS_RESOURCE = "/memos/{memo_id}/revisions"
+REVISION_RESOURCE = "/memos/{memo_id}/revisions/{version}"
+DEFAULT_REVISION_PAGE_SIZE = 50
+
+# GET /memos/search, backed by the inverted index in handlers/search.py
+SEARCH_RESOURCE = "/memos/search"
+DEFAULT_SEARCH_RESULTS = 20
+
+# `?content=inline` embeds canvas content as a JSON value instead of a string
+CONTENT_FORMATS = ("string", "inline")
+
+# Responses at least this large are gzipped for clients that accept it. API
+# Gateway only passes binary bodies through for Accept types listed in the
+# API's binary media types, so compression is limited to GZIP_ACCEPT_TYPE.
+GZIP_MIN_BYTES = int(os.environ.get("MEMO_GZIP_MIN_BYTES", "1024"))
+GZIP_ACCEPT_TYPE = "application/json"
+METRICS_NAMESPACE = "NeatMemo"
+
+# Attributes read by `GET /memos?view=summary`. Everything except `content`.
+SUMMARY_ATTRIBUTES = (
+    "user_id",
+    "memo_id",
+    "project_name",
+    "created_at",
+    "updated_at",
+    "item_count",
+    "content_bytes",
+)
+
+
+class VersionConflict(Exception):
+    """The stored memo version no longer matches the client's precondition."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Current version is {current_version}")
+        self.current_version = current_version
+
+
+class StaleSave(Exception):
+    """A newer save from the same client was already applied."""
+
+    def __init__(self, current_version: int):
+        super().__init__(f"Current version is {current_version}")
+        self.current_version = current_version
+
+
+class _RawJSON:
+    """Already-serialized JSON that `_encode_json` splices in as-is."""
+
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
 
 
 def handler(event, context):
+    invocation_metrics.clear()
+    clients.invocation_started()
+    response = _route(event)
+    invocation_metrics.update(clients.take_metrics())
+    return _encode_response(event, response)
+
+
+def _route(event):
     http_method = event.get("httpMethod")
     path_params = event.get("pathParameters") or {}
     memo_id = path_params.get("memo_id")
@@ -26,16 +228,46 @@ def handler(event, context):
         return _response(401, {"error": "Unauthorized"})
 
     try:
+        # Static sub-resources of /memos; API Gateway matches them before {memo_id}
+        collection_actions = {
+            BATCH_GET_RESOURCE: {"POST": _batch_get_memos},
+            EXPORT_RESOURCE: {"GET": _export_memos},
+            IMPORT_RESOURCE: {"POST": _import_memos},
+            SEARCH_RESOURCE: {"GET": _search_memos},
+        }
+        if event.get("resource") in collection_actions:
+            action = collection_actions[event["resource"]].get(http_method)
+            if action is None:
+                return _response(405, {"error": "Method not allowed"})
+            return action(user_id, event)
+        # Item rows are keyed "{memo_id}#{item_id}"; such an id would address one
+        if memo_id and ROW_SEPARATOR in memo_id:
+            return _response(400, {"error": f"memo_id must not contain '{ROW_SEPARATOR}'"})
+        if event.get("resource") == RESTORE_RESOURCE:
+            if http_method != "POST":
+                return _response(405, {"error": "Method not allowed"})
+            return _restore_memo(user_id, memo_id)
+        if event.get("resource") in (REVISIONS_RESOURCE, REVISION_RESOURCE):
+            if http_method != "GET":
+                return _response(405, {"error": "Method not allowed"})
+            version = path_params.get("version")
+            if version is None:
+                return _list_revisions(user_id, memo_id, event)
+            return _get_revision(user_id, memo_id, version, event)
         if http_method == "GET":
             if memo_id:
-                return _get_memo(user_id, memo_id)
-            return _list_memos(user_id)
+                return _get_memo(user_id, memo_id, event)
+            return _list_memos(user_id, event)
         elif http_method == "POST":
             return _create_memo(user_id, event)
         elif http_method == "PUT":
             if not memo_id:
                 return _response(400, {"error": "memo_id is required"})
             return _update_memo(user_id, memo_id, event)
+        elif http_method == "PATCH":
+            if not memo_id:
+                return _response(400, {"error": "memo_id is required"})
+            return _patch_memo(user_id, memo_id, event)
         elif http_method == "DELETE":
             if not memo_id:
                 return _response(400, {"error": "memo_id is required"})
@@ -51,26 +283,418 @@ def handler(event, context):
 # Operations
 # --------------
 
-def _list_memos(user_id: str):
-    """GET /memos — Returns all memos for the authenticated user."""
-    resp = table.query(
-        KeyConditionExpression=boto3.dynamodb.conditions.Key("user_id").eq(user_id),
-    )
-    items = resp.get("Items", [])
-    # Sort by updated_at descending (most recent first)
-    items.sort(key=lambda x: x.get("updated_at", ""), reverse=True)
+def _list_memos(user_id: str, event):
+    """GET /memos — Returns memos for the authenticated user, most recent first.
 
-    memos = [{"memoId": item["memo_id"], "content": item.get("content", "")} for item in items]
-    return _response(200, {"memos": memos})
+    `?view=summary` returns one page (`limit`, `cursor`) of the denormalized
+    project metadata from the updated_at index instead of every canvas body.
+    The full view still returns every memo with its content.
+    """
+    params = event.get("queryStringParameters") or {}
+    view = params.get("view", "full")
+    if view not in LIST_VIEWS:
+        return _response(400, {"error": f"view must be one of {', '.join(LIST_VIEWS)}"})
+    content_format = params.get("content", "string")
+    if content_format not in CONTENT_FORMATS:
+        return _response(400, {"error": f"content must be one of {', '.join(CONTENT_FORMATS)}"})
 
+    if view == "full":
+        partitions = _scatter(
+            lambda partition: _query_all(KeyConditionExpression=Key("user_id").eq(partition)),
+            _partitions(user_id),
+        )
+        headers = {}
+        item_rows = {}
+        for rows in partitions:
+            # While migrating, a memo found in its shard wins over its version 1 copy
+            moved = set(headers)
+            for row in rows:
+                memo_id, _, item_id = row["memo_id"].partition(ROW_SEPARATOR)
+                if memo_id in moved:
+                    continue
+                if item_id:
+                    item_rows.setdefault(memo_id, []).append(row)
+                elif "deleted_at" not in row:
+                    headers[memo_id] = row
+        # Sort by updated_at descending (most recent first)
+        ordered = sorted(headers.values(), key=lambda x: x.get("updated_at", ""), reverse=True)
+        memos = [
+            {
+                "memoId": header["memo_id"],
+                "content": _content_value(
+                    header,
+                    _content_of(user_id, header, item_rows.get(header["memo_id"], [])),
+                    content_format,
+                ),
+            }
+            for header in ordered
+        ]
+        return _response(200, {"memos": memos})
 
-def _get_memo(user_id: str, memo_id: str):
-    """GET /memos/{memo_id}"""
-    resp = table.get_item(Key={"user_id": user_id, "memo_id": memo_id})
-    item = resp.get("Item")
-    if not item:
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return _response(400, {"error": "limit must be an integer"})
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return _response(400, {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"})
+
+    starts = dict.fromkeys(_partitions(user_id))
+    if params.get("cursor"):
+        try:
+            starts = _decode_cursor(user_id, params["cursor"])
+        except ValueError:
+            return _response(400, {"error": "Invalid cursor"})
+
+    items, next_starts = _summary_page(starts, limit)
+    memos = [_summary(user_id, _backfill_metadata(user_id, item)) for item in items]
+    body = {"memos": memos}
+    if next_starts:
+        body["nextCursor"] = _encode_cursor(user_id, next_starts)
+    return _response(200, body)
+
+
+def _get_memo(user_id: str, memo_id: str, event):
+    """GET /memos/{memo_id} — Hydrates the header and item rows in one query.
+
+    With `If-None-Match` the stored content hash is checked first with a
+    projection-only read, and an unchanged memo is answered with 304.
+    `?content=inline` returns canvas content as a JSON value, not a string.
+    """
+    content_format = (event.get("queryStringParameters") or {}).get("content", "string")
+    if content_format not in CONTENT_FORMATS:
+        return _response(400, {"error": f"content must be one of {', '.join(CONTENT_FORMATS)}"})
+
+    if_none_match = _header(event, "If-None-Match")
+    _migrate_memo(user_id, memo_id)
+    current = None
+    if if_none_match or memo_cache.enabled:
+        resp = table.get_item(
+            Key=_key(user_id, memo_id),
+            ProjectionExpression="#etag, #version, #deleted_at, #write_claim_until",
+            ExpressionAttributeNames={
+                "#etag": "etag",
+                "#version": "version",
+                "#deleted_at": "deleted_at",
+                "#write_claim_until": "write_claim_until",
+            },
+        )
+        current = resp.get("Item")
+        if current is None or "deleted_at" in current:
+            return _response(404, {"error": "Memo not found"})
+        etag = current.get("etag")
+        if if_none_match and etag and _etag_matches(if_none_match, _etag_header(etag, content_format)):
+            return _response(304, None, headers=_cache_headers(etag, content_format))
+
+        version = _version_of(current)
+        cached = memo_cache.get((user_id, memo_id, version))
+        _count_metric("MemoCacheHit" if cached else "MemoCacheMiss")
+        if cached:
+            if not cached["resolved"]:
+                # Written through by _write_memo; sign image URLs once
+                cached = _cache_memo(
+                    user_id,
+                    memo_id,
+                    version,
+                    _resolve_assets(user_id, cached["content"]),
+                    cached["etag"],
+                    cached["layout"],
+                )
+            return _memo_response(memo_id, version, cached, content_format)
+
+    header, item_rows = _read_memo(user_id, memo_id)
+    if not header or "deleted_at" in header:
         return _response(404, {"error": "Memo not found"})
-    return _response(200, {"memoId": item["memo_id"], "content": item.get("content", "")})
+    etag = header.get("etag")
+    if etag:
+        content = _content_of(user_id, header, item_rows)
+    else:
+        stored = _content_of(user_id, header, item_rows, resolve=False)
+        etag = _backfill_etag(user_id, header, stored)
+        content = _resolve_assets(user_id, stored)
+    if current is not None and _settled(current, header):
+        entry = _cache_memo(user_id, memo_id, _version_of(header), content, etag, header.get("layout"))
+    else:
+        # Rows may be from a write that has not published its version yet
+        entry = {"content": content, "etag": etag, "layout": header.get("layout"), "resolved": True}
+    return _memo_response(memo_id, _version_of(header), entry, content_format)
+
+
+def _cache_memo(user_id, memo_id, version, content, etag, layout, resolved=True):
+    """Caches a memo version; `content` has signed image URLs when `resolved`.
+
+    Signed URLs outlive the cache TTL by far, so resolved content is reused as is.
+    """
+    entry = {"content": content, "etag": etag, "layout": layout, "resolved": resolved}
+    memo_cache.put((user_id, memo_id, version), entry)
+    # Every write bumps the version by one; the previous entry is unreachable
+    memo_cache.discard((user_id, memo_id, version - 1))
+    return entry
+
+
+def _memo_response(memo_id: str, version: int, entry, content_format: str):
+    return _response(
+        200,
+        {
+            "memoId": memo_id,
+            "content": _content_value(entry, entry["content"], content_format),
+            "version": version,
+        },
+        headers=_cache_headers(entry["etag"], content_format),
+    )
+
+
+def _batch_get_memos(user_id: str, event):
+    """POST /memos/batch-get — Fetches up to 100 memos in one request.
+
+    Body: {"memoIds": [...], "view": "summary" | "full", "content": "string" | "inline"}
+
+    Headers are read with batch_get_item; `view=full` then hydrates canvases
+    stored as rows with one query each. Keys are always built from the
+    caller's user_id, so other users' memos cannot be addressed. Ids that do
+    not exist are listed in `missing`, and keys DynamoDB still left
+    unprocessed after retrying in `unprocessed`.
+    """
+    body = _parse_json_body(event)
+    memo_ids = body.get("memoIds")
+    view = body.get("view", "summary")
+    content_format = body.get("content", "string")
+    if not isinstance(memo_ids, list) or not all(isinstance(i, str) and i for i in memo_ids):
+        return _response(400, {"error": "memoIds must be a list of ids"})
+    if len(memo_ids) > MAX_BATCH_GET_IDS:
+        return _response(400, {"error": f"At most {MAX_BATCH_GET_IDS} memoIds are allowed"})
+    if any(ROW_SEPARATOR in memo_id for memo_id in memo_ids):
+        return _response(400, {"error": f"memoIds must not contain '{ROW_SEPARATOR}'"})
+    if view not in BATCH_GET_VIEWS:
+        return _response(400, {"error": f"view must be one of {', '.join(BATCH_GET_VIEWS)}"})
+    if content_format not in CONTENT_FORMATS:
+        return _response(400, {"error": f"content must be one of {', '.join(CONTENT_FORMATS)}"})
+
+    memo_ids = list(dict.fromkeys(memo_ids))
+    projection = (*SUMMARY_ATTRIBUTES, "deleted_at") if view == "summary" else None
+    headers, unprocessed = _batch_get_headers(user_id, memo_ids, projection)
+    headers = {memo_id: h for memo_id, h in headers.items() if "deleted_at" not in h}
+
+    memos = []
+    for memo_id in memo_ids:
+        header = headers.get(memo_id)
+        if header is None:
+            continue
+        if view == "summary":
+            memos.append(_summary(user_id, _backfill_metadata(user_id, header)))
+            continue
+        item_rows = []
+        if header.get("layout") == ROWS_LAYOUT:
+            # Where the header was found; not moved to its shard yet while migrating
+            _, item_rows = _read_memo(user_id, memo_id, partition=header["user_id"])
+        stored = _content_of(user_id, header, item_rows, resolve=False)
+        etag = header.get("etag") or _backfill_etag(user_id, header, stored)
+        memos.append(
+            {
+                "memoId": memo_id,
+                "content": _content_value(header, _resolve_assets(user_id, stored), content_format),
+                "version": _version_of(header),
+                # Usable as If-None-Match on GET /memos/{memo_id}
+                "etag": _etag_header(etag, content_format),
+            }
+        )
+
+    missing = [i for i in memo_ids if i not in headers and i not in unprocessed]
+    return _response(200, {"memos": memos, "missing": missing, "unprocessed": sorted(unprocessed)})
+
+
+def _export_memos(user_id: str, event):
+    """GET /memos/export — Archives every memo of the user.
+
+    `?format=ndjson` (default) writes one {"memoId", "createdAt", "updatedAt",
+    "content"} record per line; `?format=tar` writes the same records as
+    memos/{memoId}.json plus the referenced images as assets/{assetId}.
+    Content is exported as stored, so images are referenced by assetId; only
+    a tar export carries them to another account.
+
+    The partition is read page by page and each memo is written out as soon
+    as its rows are complete. The archive is returned as a presigned URL to a
+    temporary S3 object.
+    """
+    params = event.get("queryStringParameters") or {}
+    export_format = params.get("format", "ndjson")
+    if export_format not in EXPORT_FORMATS:
+        return _response(400, {"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"})
+
+    records = _iter_export_records(user_id)
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as spool:
+        if export_format == "tar":
+            memo_count = _write_tar_export(user_id, records, spool)
+        else:
+            memo_count = 0
+            for record in records:
+                spool.write((_dumps(record) + "\n").encode("utf-8"))
+                memo_count += 1
+        size = spool.tell()
+        spool.seek(0)
+
+        key = f"{EXPORT_PREFIX}{user_id}/{uuid.uuid4()}.{EXPORT_EXTENSIONS[export_format]}"
+        s3.upload_fileobj(
+            spool,
+            ASSET_BUCKET_NAME,
+            key,
+            ExtraArgs={"ContentType": EXPORT_FORMATS[export_format]},
+        )
+
+    filename = f"neatmemo-export.{EXPORT_EXTENSIONS[export_format]}"
+    url = s3.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": ASSET_BUCKET_NAME,
+            "Key": key,
+            "ResponseContentDisposition": f'attachment; filename="{filename}"',
+        },
+        ExpiresIn=EXPORT_URL_EXPIRES_IN,
+    )
+    return _response(
+        200,
+        {
+            "downloadUrl": url,
+            "expiresIn": EXPORT_URL_EXPIRES_IN,
+            "format": export_format,
+            "memoCount": memo_count,
+            "bytes": size,
+        },
+    )
+
+
+def _import_memos(user_id: str, event):
+    """POST /memos/import — Ingests an export.
+
+    `?format=ndjson` (default) takes one {"memoId", "content", "createdAt"?,
+    "updatedAt"?} record per line; `?format=tar` takes a tar export, whose
+    assets/{assetId} images are stored under the importing user. Asset ids
+    are the images' SHA-256, so the imported content refers to them as is.
+    An NDJSON export's images only resolve for the user who exported it.
+
+    New memos go through one batch_writer, IMPORT_CHUNK_SIZE records at a
+    time. Memos that already exist are skipped unless `?overwrite=true`, in
+    which case they are replaced like a PUT. Bad records are reported and do
+    not stop the import. A memo listed more than once is imported from its
+    last record.
+    """
+    params = event.get("queryStringParameters") or {}
+    import_format = params.get("format", "ndjson")
+    if import_format not in EXPORT_FORMATS:
+        return _response(400, {"error": f"format must be one of {', '.join(EXPORT_FORMATS)}"})
+    overwrite = params.get("overwrite") == "true"
+    raw = event.get("body") or ""
+
+    result = {"imported": 0, "overwritten": 0, "skipped": [], "errors": []}
+    # Errors name the line of an NDJSON export and the entry of a tar export
+    location = "entry" if import_format == "tar" else "line"
+
+    def error(where, message):
+        if len(result["errors"]) < MAX_IMPORT_ERRORS:
+            result["errors"].append({location: where, "error": message})
+
+    if import_format == "tar":
+        if not event.get("isBase64Encoded"):
+            return _response(400, {"error": f"A tar export must be sent as {EXPORT_FORMATS['tar']}"})
+        records = _iter_tar_import_records(user_id, io.BytesIO(base64.b64decode(raw)), error)
+    else:
+        if event.get("isBase64Encoded"):
+            raw = base64.b64decode(raw).decode("utf-8")
+        records = _iter_import_records(io.StringIO(raw), error)
+    # The last record of a memo wins. Each memo is written once, so none is
+    # replaced by _write_memo while the batch still holds its earlier rows.
+    latest = {record["memoId"]: (where, record) for where, record in records}
+    records = iter(latest.values())
+    with table.batch_writer(overwrite_by_pkeys=["user_id", "memo_id"]) as batch:
+        while chunk := list(itertools.islice(records, IMPORT_CHUNK_SIZE)):
+            ids = [record["memoId"] for _, record in chunk]
+            existing, unprocessed = _batch_get_headers(
+                user_id, ids, projection=("memo_id", "deleted_at")
+            )
+            for line_no, record in chunk:
+                memo_id = record["memoId"]
+                now = datetime.now(timezone.utc).isoformat()
+                timestamps = {
+                    "created_at": record.get("createdAt") or now,
+                    "updated_at": record.get("updatedAt") or now,
+                }
+                if memo_id in unprocessed:
+                    error(line_no, "Throttled; retry this memo")
+                elif memo_id in existing and "deleted_at" not in existing[memo_id] and not overwrite:
+                    result["skipped"].append(memo_id)
+                elif memo_id in existing:
+                    try:
+                        # Replaces the memo, or a tombstone and its leftover rows
+                        _write_memo(user_id, memo_id, record["content"], **timestamps)
+                    except VersionConflict:
+                        error(line_no, "Memo is being saved; retry this memo")
+                        continue
+                    if "deleted_at" in existing[memo_id]:
+                        result["imported"] += 1
+                    else:
+                        result["overwritten"] += 1
+                else:
+                    _, fields, _, rows = _stored_form(user_id, memo_id, record["content"])
+                    for row in rows:
+                        batch.put_item(Item=row)
+                    search.apply(
+                        user_id,
+                        memo_id,
+                        search.difference(
+                            [], [fields.get("tokens", set()), *(r.get("tokens", set()) for r in rows)]
+                        ),
+                    )
+                    batch.put_item(
+                        Item={
+                            **_key(user_id, memo_id),
+                            **fields,
+                            **timestamps,
+                            "version": 1,
+                        }
+                    )
+                    result["imported"] += 1
+    return _response(200, result)
+
+
+def _search_memos(user_id: str, event):
+    """GET /memos/search?q= — Finds memos by text, project name and OCR text.
+
+    Every query token must match. Returns summaries of the `limit` most
+    recently updated matches and the total number of matches. Matches are
+    ranked by updated_at, so every match's header is read before the page
+    is cut.
+    """
+    params = event.get("queryStringParameters") or {}
+    query = (params.get("q") or "").strip()
+    if not query:
+        return _response(400, {"error": "q is required"})
+    try:
+        limit = int(params.get("limit", DEFAULT_SEARCH_RESULTS))
+    except ValueError:
+        return _response(400, {"error": "limit must be an integer"})
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return _response(400, {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"})
+    try:
+        memo_ids = sorted(search.lookup(user_id, query))
+    except ValueError as e:
+        return _response(400, {"error": str(e)})
+
+    headers = {}
+    for start in range(0, len(memo_ids), MAX_BATCH_GET_IDS):
+        found, _ = _batch_get_headers(
+            user_id,
+            memo_ids[start : start + MAX_BATCH_GET_IDS],
+            (*SUMMARY_ATTRIBUTES, "deleted_at"),
+        )
+        # Deleted memos keep their postings until they are purged
+        headers.update((i, h) for i, h in found.items() if "deleted_at" not in h)
+    ranked = sorted(headers.values(), key=lambda h: h.get("updated_at", ""), reverse=True)
+    return _response(
+        200,
+        {
+            "memos": [_summary(user_id, _backfill_metadata(user_id, h)) for h in ranked[:limit]],
+            "total": len(headers),
+        },
+    )
 
 
 def _create_memo(user_id: str, event):
@@ -81,50 +705,1245 @@ def _create_memo(user_id: str, event):
     if isinstance(content, (dict, list)):
         content = json.dumps(content)
 
-    now = datetime.now(timezone.utc).isoformat()
-    table.put_item(
-        Item={
-            "user_id": user_id,
-            "memo_id": memo_id,
-            "content": content,
-            "created_at": now,
-            "updated_at": now,
-        }
-    )
-    return _response(201, {"memoId": memo_id, "content": content})
+    content, version = _write_memo(user_id, memo_id, content)
+    content = _resolve_assets(user_id, content)
+    return _response(201, {"memoId": memo_id, "content": content, "version": version})
 
 
 def _update_memo(user_id: str, memo_id: str, event):
-    """PUT /memos/{memo_id} — Creates or updates a memo (Upsert)."""
+    """PUT /memos/{memo_id} — Creates or updates a memo (Upsert).
+
+    With `If-Match: <version>` or `"expectedVersion"` in the body the write only
+    succeeds if the stored version still matches (0 for a memo without one).
+    `If-Match` also takes the ETag from GET; the write then succeeds only if
+    the memo has not changed since.
+    With `"clientId"` and `"clientSeq"` it is dropped if a later save from the
+    same client was applied first. Item rows that did not change are not
+    rewritten.
+    """
     body = _parse_json_body(event)
     content = body.get("content", "")
     if isinstance(content, (dict, list)):
         content = json.dumps(content)
+    try:
+        expected_version = _expected_version(event, body)
+        client = _client_sequence(body)
+    except ValueError as e:
+        return _response(400, {"error": str(e)})
+
+    try:
+        expected_version = _precondition_version(user_id, memo_id, expected_version)
+        content, version = _write_memo(
+            user_id, memo_id, content, expected_version=expected_version, client=client
+        )
+    except VersionConflict as e:
+        return _conflict(e)
+    except StaleSave as e:
+        _count_metric("SavedWriteUnits", _write_units({"content": content}))
+        return _stale(memo_id, e)
+    content = _resolve_assets(user_id, content)
+    return _response(200, {"memoId": memo_id, "content": content, "version": version})
+
+
+def _patch_memo(user_id: str, memo_id: str, event):
+    """PATCH /memos/{memo_id} — Applies item upserts/deletes to a canvas.
+
+    Body: {"ops": [{"op": "upsert", "item": {...}}, {"op": "delete", "id": "..."}],
+           "project": {...}}  (project is optional)
 
+    Only the touched item rows and the header are written. Memos still stored
+    as a single `content` blob are converted to rows on their first patch.
+    Accepts the same version precondition and client sequence as PUT.
+    """
+    body = _parse_json_body(event)
+    try:
+        ops = _parse_ops(body)
+        expected_version = _expected_version(event, body)
+        client = _client_sequence(body)
+    except ValueError as e:
+        return _response(400, {"error": str(e)})
+    project = body.get("project")
+    try:
+        expected_version = _precondition_version(user_id, memo_id, expected_version)
+    except VersionConflict as e:
+        return _conflict(e)
+
+    # Check and claim the header first; this is also the existence check. The
+    # new version is published after the rows.
     now = datetime.now(timezone.utc).isoformat()
-    table.put_item(
-        Item={
-            "user_id": user_id,
-            "memo_id": memo_id,
-            "content": content,
-            "created_at": now,
-            "updated_at": now,
-        }
-    )
-    return _response(200, {"memoId": memo_id, "content": content})
+    _migrate_memo(user_id, memo_id)
+    claim = uuid.uuid4().hex
+    condition = Attr("layout").eq(ROWS_LAYOUT) & Attr("deleted_at").not_exists() & _unclaimed()
+    claim_fields = {"updated_at": now, **_claim_fields(claim)}
+    if expected_version is not None:
+        condition = condition & _version_condition(expected_version)
+    if client is not None:
+        condition = condition & _client_condition(client)
+        claim_fields.update(_client_fields(client))
+    # Without a version precondition a header claimed by another write is
+    # waited for, as in _claim_write; with one, only one of them can succeed
+    attempts = CLAIM_ATTEMPTS if expected_version is None else 1
+    for attempt in range(attempts):
+        if attempt:
+            time.sleep(random.uniform(0, CLAIM_RETRY_BASE_SECONDS * 2**attempt))
+        try:
+            table.update_item(
+                Key=_key(user_id, memo_id),
+                ConditionExpression=condition,
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                **_update_expression(claim_fields),
+            )
+            break
+        except ClientError as e:
+            current = _condition_failure_item(e)
+        if current is None or "deleted_at" in current:
+            return _response(404, {"error": "Memo not found"})
+        if _is_stale(current, client):
+            _count_metric(
+                "SavedWriteUnits",
+                sum(_write_units(op.get("item", op)) for op in ops),
+            )
+            return _stale(memo_id, StaleSave(_version_of(current)))
+        if expected_version is not None and _version_of(current) != expected_version:
+            return _conflict(VersionConflict(_version_of(current)))
+        if current.get("layout") != ROWS_LAYOUT:
+            # Still a `content` blob; the version already matched
+            return _patch_blob(user_id, memo_id, ops, project, _version_of(current), client)
+        # Claimed by another write in flight
+    else:
+        return _conflict(VersionConflict(_version_of(current)))
+
+    old_sources = []
+    new_sources = []
+    count_delta = 0
+    bytes_delta = 0
+    upserted = []
+    base_position = time.time_ns() // 1000
+    for index, op in enumerate(ops):
+        if op["op"] == "upsert":
+            item = op["item"]
+            _offload_item_images(user_id, [item])
+            row = _item_row(user_id, memo_id, item, base_position + index)
+            row_fields = {"body": row["body"], "body_bytes": row["body_bytes"]}
+            row_remove = []
+            if search.TABLE_NAME:
+                _set_tokens(row_fields, row_remove, row.get("tokens", set()))
+            try:
+                resp = table.update_item(
+                    Key=_key(user_id, row["memo_id"]),
+                    ConditionExpression=Attr("item_id").exists(),
+                    ReturnValues="UPDATED_OLD",
+                    **_update_expression(row_fields, remove=row_remove),
+                )
+                bytes_delta += row["body_bytes"] - int(resp["Attributes"].get("body_bytes", 0))
+                old_sources.append(resp["Attributes"].get("tokens", set()))
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                table.put_item(Item=row)
+                count_delta += 1
+                bytes_delta += row["body_bytes"]
+            new_sources.append(row.get("tokens", set()))
+            upserted.append(item)
+        else:
+            try:
+                resp = table.delete_item(
+                    Key=_key(user_id, _item_key(memo_id, op["id"])),
+                    ConditionExpression=Attr("item_id").exists(),
+                    ReturnValues="ALL_OLD",
+                )
+                count_delta -= 1
+                bytes_delta -= int(resp["Attributes"].get("body_bytes", 0))
+                old_sources.append(resp["Attributes"].get("tokens", set()))
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+
+    # The version and ETag go out only once the rows are written, so neither
+    # names old content. The rows are not re-read; the ETag hashes what this
+    # patch changed.
+    set_fields = {
+        "updated_at": now,
+        "etag": _content_hash(_dumps({"at": now, "ops": ops, "project": project})),
+    }
+    remove = list(CLAIM_ATTRIBUTES)
+    if project is not None:
+        set_fields["project"] = _dumps(project)
+        if project.get("name"):
+            set_fields["project_name"] = str(project["name"])
+        else:
+            remove.append("project_name")
+        if search.TABLE_NAME:
+            new_sources.append(search.tokenize(str(project.get("name") or "")))
+            _set_tokens(set_fields, remove, new_sources[-1])
+    condition = Attr("deleted_at").not_exists() & Attr("write_claim").eq(claim)
+    if expected_version is not None:
+        condition = condition & _version_condition(expected_version)
+    if client is not None:
+        condition = condition & _client_condition(client, own=True)
+    try:
+        resp = table.update_item(
+            Key=_key(user_id, memo_id),
+            ConditionExpression=condition,
+            # Old values: the previous name tokens, and version + 1 is ours
+            ReturnValues="UPDATED_OLD",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            **_update_expression(
+                set_fields,
+                remove=remove,
+                add={"version": 1, "item_count": count_delta, "content_bytes": bytes_delta},
+            ),
+        )
+    except ClientError as e:
+        current = _condition_failure_item(e)
+        _release_claim(user_id, memo_id, claim)
+        if current is None or "deleted_at" in current:
+            return _response(404, {"error": "Memo not found"})
+        if _is_stale(current, client, own=True):
+            return _stale(memo_id, StaleSave(_version_of(current)))
+        return _conflict(VersionConflict(_version_of(current)))
+    previous = resp.get("Attributes", {})
+    version = _version_of(previous) + 1
+    if project is not None:
+        old_sources.append(previous.get("tokens", set()))
+
+    search.apply(user_id, memo_id, search.difference(old_sources, new_sources))
+    memo_cache.discard((user_id, memo_id, version - 1))
+    # The ops themselves are the delta; upserted items now reference their assets
+    delta = {"ops": ops} if project is None else {"ops": ops, "project": project}
+    revisions.record(user_id, memo_id, version, delta=delta)
+    return _response(200, {"memoId": memo_id, "items": upserted, "version": version})
+
+
+def _patch_blob(user_id: str, memo_id: str, ops, project, version: int, client=None):
+    """Applies PATCH ops to a memo stored as a `content` blob and rewrites it as rows."""
+    header, item_rows = _read_memo(user_id, memo_id, consistent=True)
+    if not header or "deleted_at" in header:
+        return _response(404, {"error": "Memo not found"})
+    data = _load_canvas(_content_of(user_id, header, item_rows, resolve=False))
+    if data is None:
+        return _response(409, {"error": "Memo content is not a canvas"})
+
+    _apply_ops(data, ops, project)
+    try:
+        content, version = _write_memo(
+            user_id, memo_id, _dumps(data), expected_version=version, client=client
+        )
+    except VersionConflict as e:
+        return _conflict(e)
+    except StaleSave as e:
+        return _stale(memo_id, e)
+
+    upserted_ids = {op["item"]["id"] for op in ops if op["op"] == "upsert"}
+    items = [i for i in json.loads(content)["items"] if i.get("id") in upserted_ids]
+    return _response(200, {"memoId": memo_id, "items": items, "version": version})
 
 
 def _delete_memo(user_id: str, memo_id: str):
-    """DELETE /memos/{memo_id}"""
-    resp = table.delete_item(
-        Key={"user_id": user_id, "memo_id": memo_id},
-        ReturnValues="ALL_OLD",
-    )
-    if not resp.get("Attributes"):
+    """DELETE /memos/{memo_id} — Tombstones the memo; nothing is read back.
+
+    Removing `updated_at` takes the memo out of the updated_at index, so
+    summary listings skip it without a filter. Bumping the version fails any
+    write still holding the pre-delete version.
+    """
+    _migrate_memo(user_id, memo_id)
+    now = datetime.now(timezone.utc)
+    try:
+        table.update_item(
+            Key=_key(user_id, memo_id),
+            ConditionExpression=Attr("memo_id").exists() & Attr("deleted_at").not_exists(),
+            ReturnValues="NONE",
+            **_update_expression(
+                {
+                    "deleted_at": now.isoformat(),
+                    "expires_at": int(now.timestamp()) + TOMBSTONE_TTL_SECONDS,
+                },
+                remove=["updated_at"],
+                add={"version": 1},
+            ),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
         return _response(404, {"error": "Memo not found or access denied"})
     return _response(204, None)
 
 
+def _restore_memo(user_id: str, memo_id: str):
+    """POST /memos/{memo_id}/restore — Undoes a DELETE that has not been purged yet."""
+    _migrate_memo(user_id, memo_id)
+    try:
+        resp = table.update_item(
+            Key=_key(user_id, memo_id),
+            ConditionExpression=Attr("deleted_at").exists(),
+            ReturnValues="UPDATED_NEW",
+            **_update_expression(
+                {"updated_at": datetime.now(timezone.utc).isoformat()},
+                remove=["deleted_at", "expires_at"],
+                add={"version": 1},
+            ),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return _response(404, {"error": "No deleted memo to restore"})
+    return _response(200, {"memoId": memo_id, "version": _version_of(resp["Attributes"])})
+
+
+def _list_revisions(user_id: str, memo_id: str, event):
+    """GET /memos/{memo_id}/revisions — Lists revisions, newest first.
+
+    One page of `limit` revisions older than `?before=<version>`; the response
+    carries `nextBefore` while older revisions remain. A deleted memo keeps its
+    history until it is purged.
+    """
+    params = event.get("queryStringParameters") or {}
+    try:
+        limit = int(params.get("limit", DEFAULT_REVISION_PAGE_SIZE))
+        before = int(params["before"]) if params.get("before") else None
+    except ValueError:
+        return _response(400, {"error": "limit and before must be integers"})
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return _response(400, {"error": f"limit must be between 1 and {MAX_PAGE_SIZE}"})
+
+    _migrate_memo(user_id, memo_id)
+    header = table.get_item(Key=_key(user_id, memo_id), ProjectionExpression="memo_id")
+    if "Item" not in header:
+        return _response(404, {"error": "Memo not found"})
+    items, next_before = revisions.page(user_id, memo_id, limit, before)
+    body = {
+        "revisions": [
+            {
+                "version": int(item["version"]),
+                "createdAt": item.get("created_at"),
+                "snapshot": "snapshot_bytes" in item,
+                "bytes": int(item.get("delta_bytes", item.get("snapshot_bytes", 0))),
+            }
+            for item in items
+        ]
+    }
+    if next_before is not None:
+        body["nextBefore"] = next_before
+    return _response(200, body)
+
+
+def _get_revision(user_id: str, memo_id: str, version: str, event):
+    """GET /memos/{memo_id}/revisions/{version} — Rebuilds the memo as of a revision.
+
+    Reads back to the nearest snapshot and replays the deltas after it. To
+    revert, PUT the returned content.
+    """
+    content_format = (event.get("queryStringParameters") or {}).get("content", "string")
+    if content_format not in CONTENT_FORMATS:
+        return _response(400, {"error": f"content must be one of {', '.join(CONTENT_FORMATS)}"})
+    try:
+        version = int(version)
+    except ValueError:
+        return _response(400, {"error": "version must be an integer"})
+
+    content = _revision_content(user_id, memo_id, version)
+    if content is None:
+        return _response(404, {"error": "Revision not found"})
+    layout = ROWS_LAYOUT if _load_canvas(content) is not None else None
+    return _response(
+        200,
+        {
+            "memoId": memo_id,
+            "version": version,
+            "content": _content_value(
+                {"layout": layout}, _resolve_assets(user_id, content), content_format
+            ),
+        },
+    )
+
+
+# --------------
+# Storage
+# --------------
+
+def _record_revision(user_id: str, memo_id: str, version: int, content: str, delta):
+    """Records a write as a delta, or as a snapshot when the delta saves little."""
+    if delta is not None and 2 * len(_dumps(delta)) < len(content):
+        revisions.record(user_id, memo_id, version, delta=delta)
+    else:
+        revisions.record(user_id, memo_id, version, snapshot=content)
+
+
+def _revision_delta(content: str, fields, previous, rows, old_rows, unchanged):
+    """PATCH-form delta of a full write from the previous revision.
+
+    None unless both the old and the new content are canvases stored as rows.
+    `order` lists the item ids when items moved, since upserts keep positions.
+    """
+    if fields.get("layout") != ROWS_LAYOUT or previous.get("layout") != ROWS_LAYOUT:
+        return None
+    items = {str(item["id"]): item for item in json.loads(content)["items"]}
+    ops = [
+        {"op": "upsert", "item": items[row["item_id"]]}
+        for row in rows
+        if row["memo_id"] not in unchanged
+    ]
+    ops.extend(
+        {"op": "delete", "id": key.partition(ROW_SEPARATOR)[2]}
+        for key in old_rows.keys() - {row["memo_id"] for row in rows}
+    )
+    delta = {"ops": ops}
+    if previous.get("project") != fields["project"]:
+        delta["project"] = json.loads(fields["project"])
+    if any(
+        old_rows[row["memo_id"]].get("position") != row["position"]
+        for row in rows
+        if row["memo_id"] in old_rows
+    ):
+        delta["order"] = list(items)
+    return delta
+
+
+def _revision_content(user_id: str, memo_id: str, version: int):
+    """Rebuilds the stored content of a revision, or None if it cannot be."""
+    found = revisions.chain(user_id, memo_id, version)
+    if found is None:
+        return None
+    content, deltas = found
+    if not deltas:
+        return content
+    data = _load_canvas(content)
+    if data is None:
+        # Only canvas writes are recorded as deltas
+        return None
+    for _, delta in deltas:
+        _apply_delta(data, delta)
+    return _dumps(data)
+
+
+def _read_memo(user_id: str, memo_id: str, consistent: bool = False, partition: str = None):
+    """Returns (header, item_rows) for a memo; header is None when it does not exist.
+
+    `partition` overrides where the rows are read from, e.g. the version 1 key
+    a header was found under while migrating.
+    """
+    rows = _query_all(
+        KeyConditionExpression=Key("user_id").eq(partition or _partition(user_id, memo_id))
+        & Key("memo_id").begins_with(memo_id),
+        ConsistentRead=consistent,
+    )
+    header = None
+    item_rows = []
+    for row in rows:
+        if row["memo_id"] == memo_id:
+            header = row
+        elif row["memo_id"].startswith(memo_id + ROW_SEPARATOR):
+            item_rows.append(row)
+    return header, item_rows
+
+
+def _iter_partition(partition: str, **kwargs):
+    """Yields a partition's rows in sort key order, one query page at a time."""
+    kwargs["KeyConditionExpression"] = Key("user_id").eq(partition)
+    while True:
+        resp = table.query(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _iter_memos(rows):
+    """Groups a sort-key-ordered row stream into (header, item_rows) per memo.
+
+    A memo's rows all sort before `memo_id + "$"` ('#' + 1), so a memo is
+    complete once a later key is reached and only open memos are held.
+    """
+    pending = {}
+    for row in rows:
+        key = row["memo_id"]
+        for memo_id in [m for m in pending if m + "$" <= key]:
+            yield pending.pop(memo_id)
+        memo_id, _, item_id = key.partition(ROW_SEPARATOR)
+        entry = pending.setdefault(memo_id, (None, []))
+        if item_id:
+            entry[1].append(row)
+        else:
+            pending[memo_id] = (row, entry[1])
+    yield from pending.values()
+
+
+def _iter_export_records(user_id: str):
+    exported = set()
+    memos = itertools.chain.from_iterable(
+        _iter_memos(_iter_partition(partition)) for partition in _partitions(user_id)
+    )
+    for header, item_rows in memos:
+        if header is None or "deleted_at" in header or header["memo_id"] in exported:
+            # Deleted, item rows left behind by an interrupted delete, or the
+            # version 1 copy of a memo being moved to its shard
+            continue
+        exported.add(header["memo_id"])
+        yield {
+            "memoId": header["memo_id"],
+            "createdAt": header.get("created_at"),
+            "updatedAt": header.get("updated_at"),
+            "content": _content_of(user_id, header, item_rows, resolve=False),
+        }
+
+
+def _write_tar_export(user_id: str, records, fileobj):
+    """Streams records and their images into a gzipped tar; returns the memo count."""
+    memo_count = 0
+    asset_ids = set()
+    with tarfile.open(fileobj=fileobj, mode="w|gz") as tar:
+        for record in records:
+            data = _dumps(record).encode("utf-8")
+            info = tarfile.TarInfo(f"memos/{record['memoId']}.json")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+            memo_count += 1
+            if '"assetId"' in record["content"]:
+                canvas = _load_canvas(record["content"]) or {"items": []}
+                asset_ids.update(
+                    item["assetId"]
+                    for item in canvas["items"]
+                    if isinstance(item, dict) and item.get("assetId")
+                )
+
+        for asset_id in sorted(asset_ids):
+            try:
+                obj = s3.get_object(Bucket=ASSET_BUCKET_NAME, Key=_asset_key(user_id, asset_id))
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                    raise
+                continue
+            info = tarfile.TarInfo(f"assets/{asset_id}")
+            info.size = obj["ContentLength"]
+            info.mtime = int(time.time())
+            if obj.get("ContentType"):
+                info.pax_headers = {ASSET_MEDIA_TYPE_PAX_HEADER: obj["ContentType"]}
+            tar.addfile(info, obj["Body"])
+    return memo_count
+
+
+def _iter_import_records(lines, error):
+    """Yields (line number, record) for valid NDJSON lines; reports the rest to `error`."""
+    for line_no, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            error(line_no, "Invalid JSON")
+            continue
+        if not isinstance(record, dict):
+            error(line_no, "Each line must be an object")
+            continue
+        try:
+            yield line_no, _parse_import_record(record)
+        except ValueError as e:
+            error(line_no, str(e))
+
+
+def _iter_tar_import_records(user_id: str, fileobj, error):
+    """Yields (entry name, record) for the memos of a tar export.
+
+    Its images are stored under `user_id` as they are reached; an image
+    whose content does not match its assetId is reported and skipped.
+    Entries are read in archive order, so a bad archive stops the import
+    after the memos before it.
+    """
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+            for info in tar:
+                if not info.isfile():
+                    continue
+                data = tar.extractfile(info).read()
+                if info.name.startswith("memos/"):
+                    try:
+                        record = json.loads(data)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        error(info.name, "Invalid JSON")
+                        continue
+                    if not isinstance(record, dict):
+                        error(info.name, "Each memo must be an object")
+                        continue
+                    try:
+                        yield info.name, _parse_import_record(record)
+                    except ValueError as e:
+                        error(info.name, str(e))
+                elif info.name.startswith("assets/"):
+                    asset_id = info.name[len("assets/") :]
+                    if hashlib.sha256(data).hexdigest() != asset_id:
+                        error(info.name, "Image does not match its assetId")
+                        continue
+                    _put_asset(user_id, data, info.pax_headers.get(ASSET_MEDIA_TYPE_PAX_HEADER))
+    except (tarfile.TarError, EOFError):
+        error(None, "Not a valid tar.gz archive, or truncated")
+
+
+def _parse_import_record(record):
+    """Validates an exported memo record and returns it with string content."""
+    memo_id = record.get("memoId")
+    if not isinstance(memo_id, str) or not memo_id or ROW_SEPARATOR in memo_id:
+        raise ValueError(f"memoId must be a non-empty string without '{ROW_SEPARATOR}'")
+    if isinstance(record.get("content"), (dict, list)):
+        record["content"] = json.dumps(record["content"])
+    if not isinstance(record.get("content"), str):
+        raise ValueError("content must be a string")
+    return record
+
+
+def _batch_get_headers(user_id: str, memo_ids, projection=None):
+    """Reads memo headers with batch_get_item, retrying UnprocessedKeys.
+
+    Returns ({memo_id: header}, set of memo_ids still unprocessed).
+    """
+    headers, unprocessed = _batch_get_keys([_key(user_id, i) for i in memo_ids], projection)
+    if KEY_MIGRATION:
+        # Memos not moved yet are still under their version 1 key
+        rest = [i for i in memo_ids if i not in headers and i not in unprocessed]
+        if rest:
+            legacy, legacy_unprocessed = _batch_get_keys(
+                [{"user_id": user_id, "memo_id": i} for i in rest], projection
+            )
+            headers.update(legacy)
+            unprocessed |= legacy_unprocessed
+    return headers, unprocessed
+
+
+def _batch_get_keys(keys, projection=None):
+    if not keys:
+        return {}, set()
+    request = {"Keys": keys}
+    if projection:
+        names = {f"#p{i}": attr for i, attr in enumerate(projection)}
+        request["ProjectionExpression"] = ", ".join(names)
+        request["ExpressionAttributeNames"] = names
+
+    headers = {}
+    pending = {table.name: request}
+    for attempt in range(BATCH_RETRY_ATTEMPTS):
+        if attempt:
+            # Full jitter; unprocessed keys mean the partition is throttling
+            time.sleep(random.uniform(0, BATCH_RETRY_BASE_SECONDS * 2**attempt))
+        resp = dynamodb.batch_get_item(RequestItems=pending)
+        for item in resp.get("Responses", {}).get(table.name, []):
+            headers[item["memo_id"]] = item
+        pending = resp.get("UnprocessedKeys") or {}
+        if not pending:
+            return headers, set()
+    return headers, {key["memo_id"] for key in pending[table.name]["Keys"]}
+
+
+def _content_of(user_id: str, header, item_rows, resolve: bool = True):
+    """Rebuilds the `content` string clients see from stored rows."""
+    if header.get("layout") != ROWS_LAYOUT:
+        content = codec.decode(header.get("content", ""))
+        return _resolve_assets(user_id, content) if resolve else content
+
+    # Row bodies are stored as compact JSON, so they are spliced in as-is and
+    # only items that reference an asset are parsed to sign their URLs
+    bodies = []
+    for row in sorted(item_rows, key=lambda r: r["position"]):
+        body = codec.decode(row["body"])
+        if resolve and '"assetId"' in body:
+            item = json.loads(body)
+            _resolve_item_assets(user_id, [item])
+            body = _dumps(item)
+        bodies.append(body)
+    return '{"project":%s,"items":[%s]}' % (header.get("project", "null"), ",".join(bodies))
+
+
+def _write_memo(
+    user_id: str,
+    memo_id: str,
+    content: str,
+    expected_version: int = None,
+    condition=None,
+    client=None,
+    claim=None,
+    **header_fields,
+):
+    """Stores `content`, as rows when it is a canvas.
+
+    Returns the stored content and the new version. `expected_version` and the
+    `client` sequence are checked before any row is touched; `condition` guards
+    only the final header write and `header_fields` override its attributes.
+    Item rows already holding the same body and position are not rewritten.
+    The header is claimed while the rows are written (unless the caller passes
+    the `claim` it took), and the new version is published after them.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    _migrate_memo(user_id, memo_id)
+
+    if claim is None and expected_version is not None:
+        claim = _claim_version(user_id, memo_id, expected_version, client)
+    elif claim is None:
+        claim = _claim_write(user_id, memo_id, client)
+    if claim is not None:
+        claimed = Attr("write_claim").eq(claim)
+        if expected_version is not None:
+            claimed = _version_condition(expected_version) & claimed
+    else:
+        # A new memo; fails if another write claimed it meanwhile
+        claimed = _unclaimed()
+    condition = claimed if condition is None else condition & claimed
+    if client is not None:
+        # Fails if a newer save from the client claimed the header meanwhile
+        own = _client_condition(client, own=True)
+        condition = own if condition is None else condition & own
+
+    content, fields, remove, rows = _stored_form(user_id, memo_id, content)
+    old_rows = _stored_rows(user_id, memo_id)
+    unchanged = {row["memo_id"] for row in rows if _same_row(old_rows.get(row["memo_id"]), row)}
+    if unchanged:
+        _count_metric("RowWritesSkipped", len(unchanged))
+        _count_metric(
+            "SavedWriteUnits",
+            sum(_write_units(row) for row in rows if row["memo_id"] in unchanged),
+        )
+    if len(unchanged) < len(rows):
+        with table.batch_writer() as batch:
+            for row in rows:
+                if row["memo_id"] not in unchanged:
+                    batch.put_item(Item=row)
+    _delete_rows(user_id, old_rows.keys() - {row["memo_id"] for row in rows})
+
+    fields["updated_at"] = now
+    if client is not None:
+        fields.update(_client_fields(client))
+    fields.update(header_fields)
+    # Header last, so it never points at rows that are not written yet
+    kwargs = _update_expression(
+        fields,
+        # A write to a deleted memo brings it back
+        remove=[*remove, "deleted_at", "expires_at", *(CLAIM_ATTRIBUTES if claim else ())],
+        add={"version": 1},
+        if_not_exists={} if "created_at" in fields else {"created_at": now},
+    )
+    if condition is not None:
+        kwargs["ConditionExpression"] = condition
+        kwargs["ReturnValuesOnConditionCheckFailure"] = "ALL_OLD"
+    try:
+        resp = table.update_item(Key=_key(user_id, memo_id), ReturnValues="UPDATED_OLD", **kwargs)
+    except ClientError as e:
+        current = _condition_failure_item(e)
+        if current is not None and _is_stale(current, client, own=True):
+            raise StaleSave(_version_of(current))
+        if claim is not None:
+            # Published meanwhile by a PATCH, or the claim expired and another
+            # write took the header
+            _release_claim(user_id, memo_id, claim)
+        raise VersionConflict(_version_of(current) if current else 0)
+    previous = resp.get("Attributes", {})
+    version = _version_of(previous) + 1
+    _cache_memo(
+        user_id, memo_id, version, content, fields["etag"], fields.get("layout"), resolved=False
+    )
+    if revisions.TABLE_NAME:
+        delta = _revision_delta(content, fields, previous, rows, old_rows, unchanged)
+        _record_revision(user_id, memo_id, version, content, delta)
+
+    search.apply(
+        user_id,
+        memo_id,
+        search.difference(
+            [previous.get("tokens", set()), *(r.get("tokens", set()) for r in old_rows.values())],
+            [fields.get("tokens", set()), *(r.get("tokens", set()) for r in rows)],
+        ),
+    )
+    return content, version
+
+
+def _stored_form(user_id: str, memo_id: str, content: str):
+    """Splits `content` into what is stored for it.
+
+    Returns (content as stored, header fields, header attributes to remove,
+    item rows). Only canvases have item rows; images are moved to S3 first.
+    """
+    data = _load_canvas(content)
+    if data is None:
+        fields = {"content": codec.encode(content), **_project_metadata(content)}
+        fields["etag"] = _content_hash(content)
+        remove = ["layout", "project"]
+        if search.TABLE_NAME:
+            _set_tokens(fields, remove, search.tokenize(content))
+        return content, fields, remove, []
+
+    # Last occurrence wins for duplicated ids, like the client-side Map
+    items = {}
+    for item in data["items"]:
+        if isinstance(item, dict):
+            items[str(item.setdefault("id", str(uuid.uuid4())))] = item
+    _offload_item_images(user_id, items.values())
+
+    rows = [_item_row(user_id, memo_id, item, pos) for pos, item in enumerate(items.values())]
+    project = data.get("project") if isinstance(data.get("project"), dict) else {}
+    fields = {
+        "layout": ROWS_LAYOUT,
+        "project": _dumps(data.get("project")),
+        "item_count": len(rows),
+        # Item bodies only; the project header is small and rewritten in place
+        "content_bytes": sum(row["body_bytes"] for row in rows),
+    }
+    remove = ["content"]
+    if project.get("name"):
+        fields["project_name"] = str(project["name"])
+    else:
+        remove.append("project_name")
+    content = _dumps({"project": data.get("project"), "items": list(items.values())})
+    fields["etag"] = _content_hash(content)
+    if search.TABLE_NAME:
+        _set_tokens(fields, remove, search.tokenize(str(project.get("name") or "")))
+    return content, fields, remove, rows
+
+
+def _claim_version(user_id: str, memo_id: str, expected_version: int, client=None):
+    """Claims the header if its version still equals `expected_version`; returns the claim.
+
+    The version itself is left alone until the write publishes it. A header
+    claimed by another write in flight is a conflict too: only one of the two
+    could succeed. With `client` its sequence is recorded, unless a newer one
+    already was.
+    """
+    claim = uuid.uuid4().hex
+    condition = _version_condition(expected_version) & _unclaimed()
+    if client is not None:
+        condition = condition & _client_condition(client)
+    try:
+        table.update_item(
+            Key=_key(user_id, memo_id),
+            ConditionExpression=condition,
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            **_update_expression({**_client_fields(client), **_claim_fields(claim)}),
+        )
+    except ClientError as e:
+        current = _condition_failure_item(e)
+        if current and _is_stale(current, client):
+            raise StaleSave(_version_of(current))
+        raise VersionConflict(_version_of(current) if current else 0)
+    return claim
+
+
+def _release_claim(user_id: str, memo_id: str, claim: str):
+    """Drops a claim whose write failed, unless another write holds the header by now."""
+    try:
+        table.update_item(
+            Key=_key(user_id, memo_id),
+            ConditionExpression=Attr("write_claim").eq(claim),
+            **_update_expression({}, remove=CLAIM_ATTRIBUTES),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+
+
+def _unclaimed():
+    """Passes unless a write in flight holds the header."""
+    return Attr("write_claim_until").not_exists() | Attr("write_claim_until").lt(int(time.time()))
+
+
+def _write_in_flight(header):
+    return int(header.get("write_claim_until", 0)) >= time.time()
+
+
+def _settled(before, after):
+    """Whether no write overlapped a read that saw the header as `before`, then `after`."""
+    return (
+        _version_of(before) == _version_of(after)
+        and before.get("etag") == after.get("etag")
+        and not _write_in_flight(before)
+        and not _write_in_flight(after)
+    )
+
+
+def _claim_write(user_id: str, memo_id: str, client=None):
+    """Claims an existing header for a write without a version precondition.
+
+    Returns the claim, or None for a memo that does not exist yet. A header
+    claimed by another write is waited for; with `client` its sequence is
+    recorded too, unless a newer one already was.
+    """
+    claim = uuid.uuid4().hex
+    condition = Attr("memo_id").exists() & _unclaimed()
+    if client is not None:
+        condition = condition & _client_condition(client)
+    for attempt in range(CLAIM_ATTEMPTS):
+        if attempt:
+            time.sleep(random.uniform(0, CLAIM_RETRY_BASE_SECONDS * 2**attempt))
+        try:
+            table.update_item(
+                Key=_key(user_id, memo_id),
+                ConditionExpression=condition,
+                ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                **_update_expression({**_client_fields(client), **_claim_fields(claim)}),
+            )
+            return claim
+        except ClientError as e:
+            current = _condition_failure_item(e)
+        # A new memo has nothing to claim; its header write checks the sequence
+        if current is None:
+            return None
+        if _is_stale(current, client):
+            raise StaleSave(_version_of(current))
+    raise VersionConflict(_version_of(current))
+
+
+def _claim_fields(claim: str):
+    return {"write_claim": claim, "write_claim_until": int(time.time()) + WRITE_CLAIM_SECONDS}
+
+
+def _client_condition(client, own: bool = False):
+    """Passes unless a later save from `client` (or, unless `own`, this one) was applied."""
+    client_id, seq = client
+    applied = Attr("client_seq").lte(seq) if own else Attr("client_seq").lt(seq)
+    return Attr("client_seq").not_exists() | Attr("client_id").ne(client_id) | applied
+
+
+def _client_fields(client):
+    if client is None:
+        return {}
+    client_id, seq = client
+    return {"client_id": client_id, "client_seq": seq}
+
+
+def _is_stale(current, client, own: bool = False):
+    """Whether the header `current` already applied a later save from `client`."""
+    if client is None or current.get("client_id") != client[0] or "client_seq" not in current:
+        return False
+    applied = int(current["client_seq"])
+    return applied > client[1] if own else applied >= client[1]
+
+
+def _version_condition(expected_version: int):
+    if expected_version == 0:
+        return Attr("version").not_exists()
+    return Attr("version").eq(expected_version)
+
+
+def _version_of(header):
+    # 0 for memos that do not exist or were written before versioning
+    return int(header.get("version", 0))
+
+
+def _content_hash(content: str):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def _backfill_etag(user_id: str, header, content: str):
+    """Stores the hash of a memo written before ETags existed and returns it."""
+    etag = _content_hash(content)
+    try:
+        table.update_item(
+            # The header's own key; while migrating it may be the version 1 copy
+            Key={"user_id": header["user_id"], "memo_id": header["memo_id"]},
+            ConditionExpression=_version_condition(_version_of(header)) & Attr("etag").not_exists(),
+            **_update_expression({"etag": etag}),
+        )
+    except ClientError as e:
+        # Saved concurrently; that write stored its own etag
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    return etag
+
+
+def _condition_failure_item(error: ClientError):
+    """Returns the item from ReturnValuesOnConditionCheckFailure, or None."""
+    if error.response["Error"]["Code"] != "ConditionalCheckFailedException":
+        raise error
+    item = error.response.get("Item")
+    if not item:
+        return None
+    deserializer = TypeDeserializer()
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def _update_expression(set_fields, remove=(), add=None, if_not_exists=None):
+    """Builds UpdateExpression kwargs from plain attribute dicts."""
+    names = {}
+    values = {}
+    clauses = {"SET": [], "REMOVE": [], "ADD": []}
+
+    def placeholder(attr):
+        # Distinct from the #n/:v placeholders boto3 uses for conditions
+        key = f"#u{len(names)}"
+        names[key] = attr
+        return key
+
+    def value(v):
+        key = f":u{len(values)}"
+        values[key] = v
+        return key
+
+    for attr, v in set_fields.items():
+        clauses["SET"].append(f"{placeholder(attr)} = {value(v)}")
+    for attr, v in (if_not_exists or {}).items():
+        name = placeholder(attr)
+        clauses["SET"].append(f"{name} = if_not_exists({name}, {value(v)})")
+    for attr in remove:
+        clauses["REMOVE"].append(placeholder(attr))
+    for attr, v in (add or {}).items():
+        clauses["ADD"].append(f"{placeholder(attr)} {value(v)}")
+
+    kwargs = {
+        "UpdateExpression": " ".join(
+            f"{action} {', '.join(parts)}" for action, parts in clauses.items() if parts
+        ),
+        "ExpressionAttributeNames": names,
+    }
+    if values:
+        kwargs["ExpressionAttributeValues"] = values
+    return kwargs
+
+
+def _item_row(user_id: str, memo_id: str, item, position: int):
+    body = _dumps(item)
+    row = {
+        **_key(user_id, _item_key(memo_id, item["id"])),
+        "item_id": str(item["id"]),
+        "body": codec.encode(body),
+        # Uncompressed size, summed into the header's content_bytes
+        "body_bytes": len(body.encode("utf-8")),
+        "position": position,
+    }
+    if search.TABLE_NAME:
+        tokens = search.item_tokens(item)
+        if tokens:
+            # What this row contributes to the search index; diffed on rewrite
+            row["tokens"] = tokens
+    return row
+
+
+def _set_tokens(fields, remove, tokens):
+    # DynamoDB has no empty sets, so no tokens means no attribute
+    if tokens:
+        fields["tokens"] = tokens
+    else:
+        remove.append("tokens")
+
+
+def _item_key(memo_id: str, item_id: str):
+    return f"{memo_id}{ROW_SEPARATOR}{item_id}"
+
+
+def _item_row_tokens(user_id: str, memo_id: str):
+    """Returns {sort key: search tokens} for a memo's item rows."""
+    rows = _query_all(
+        KeyConditionExpression=Key("user_id").eq(_partition(user_id, memo_id))
+        & Key("memo_id").begins_with(memo_id + ROW_SEPARATOR),
+        ProjectionExpression="memo_id, tokens",
+        # The postings change is computed from these; a stale read miscounts them
+        ConsistentRead=True,
+    )
+    return {row["memo_id"]: row.get("tokens", set()) for row in rows}
+
+
+def _stored_rows(user_id: str, memo_id: str):
+    """Returns {sort key: row} for a memo's item rows, as compared by `_same_row`."""
+    # A query is billed for whole items whatever it projects
+    rows = _query_all(
+        KeyConditionExpression=Key("user_id").eq(_partition(user_id, memo_id))
+        & Key("memo_id").begins_with(memo_id + ROW_SEPARATOR),
+        ProjectionExpression="memo_id, body, #position, tokens",
+        ExpressionAttributeNames={"#position": "position"},
+        # Skipped writes, deleted rows and the search and revision deltas are
+        # all decided from these, so a save must see the previous one's rows
+        ConsistentRead=True,
+    )
+    return {row["memo_id"]: row for row in rows}
+
+
+def _same_row(stored, row):
+    """Whether the stored row already holds everything `row` would write."""
+    return stored is not None and all(
+        stored.get(attr) == row.get(attr) for attr in ("body", "position", "tokens")
+    )
+
+
+def _write_units(item):
+    """Approximate WCUs of writing `item`: one per started KB of names and values."""
+    size = 0
+    for name, value in item.items():
+        value = getattr(value, "value", value)
+        if isinstance(value, (set, frozenset)):
+            size += sum(len(str(v).encode("utf-8")) for v in value)
+        elif isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        else:
+            size += len(str(value).encode("utf-8"))
+        size += len(name.encode("utf-8"))
+    return max(1, -(-size // 1024))
+
+
+def _delete_rows(user_id: str, keys):
+    if not keys:
+        return
+    with table.batch_writer() as batch:
+        for key in keys:
+            batch.delete_item(Key=_key(user_id, key))
+
+
+def _partition(user_id: str, memo_id: str):
+    """Partition key of a memo's rows under the current key schema."""
+    if TABLE_KEY_VERSION < 2:
+        return user_id
+    shard = int(hashlib.sha256(memo_id.encode("utf-8")).hexdigest()[:8], 16) % SHARD_COUNT
+    return f"{user_id}{SHARD_SEPARATOR}{shard}"
+
+
+def _partitions(user_id: str):
+    """Every partition key that can hold the user's memos, shards first."""
+    if TABLE_KEY_VERSION < 2:
+        return [user_id]
+    partitions = [f"{user_id}{SHARD_SEPARATOR}{shard}" for shard in range(SHARD_COUNT)]
+    if KEY_MIGRATION:
+        partitions.append(user_id)
+    return partitions
+
+
+def _key(user_id: str, sort_key: str):
+    """Primary key of a header or item row ("{memo_id}#{item_id}")."""
+    memo_id = sort_key.partition(ROW_SEPARATOR)[0]
+    return {"user_id": _partition(user_id, memo_id), "memo_id": sort_key}
+
+
+def _owner(partition: str):
+    """The user_id a partition key belongs to, under either key schema."""
+    return partition.partition(SHARD_SEPARATOR)[0]
+
+
+def _scatter(fn, partitions):
+    """Calls `fn` for every partition concurrently; results in partition order.
+
+    `fn` runs on worker threads, so it must not use the Table resource, which
+    is not thread-safe; `_query` and `_query_all` go through its client.
+    """
+    partitions = list(partitions)
+    if len(partitions) <= 1:
+        return [fn(partition) for partition in partitions]
+    with ThreadPoolExecutor(max_workers=min(SCATTER_CONCURRENCY, len(partitions))) as pool:
+        return list(pool.map(fn, partitions))
+
+
+def _summary_page(starts, limit: int):
+    """One page of the updated_at index, merged across partitions.
+
+    `starts` maps each partition left to read to its ExclusiveStartKey (None
+    for its beginning). Every partition is queried for `limit` items and the
+    sorted results are k-way merged. Returns (items, starts of the next page);
+    a partition drops out of the next page's starts once it is exhausted.
+    """
+
+    def query(partition):
+        kwargs = {
+            "IndexName": UPDATED_AT_INDEX,
+            "KeyConditionExpression": Key("user_id").eq(partition),
+            "ProjectionExpression": ", ".join(SUMMARY_ATTRIBUTES),
+            "ScanIndexForward": False,
+            "Limit": limit,
+        }
+        if starts[partition]:
+            kwargs["ExclusiveStartKey"] = starts[partition]
+        return _query(**kwargs)
+
+    pages = dict(zip(starts, _scatter(query, starts)))
+    merged = heapq.merge(
+        *(
+            [(item, partition) for item in resp.get("Items", [])]
+            for partition, resp in pages.items()
+        ),
+        key=lambda entry: entry[0].get("updated_at", ""),
+        reverse=True,
+    )
+    page = list(itertools.islice(merged, limit))
+
+    next_starts = {}
+    for partition, resp in pages.items():
+        used = [item for item, p in page if p == partition]
+        if len(used) < len(resp.get("Items", [])):
+            # Resume right after the last item this page took
+            next_starts[partition] = _index_key(used[-1]) if used else starts[partition]
+        elif resp.get("LastEvaluatedKey"):
+            next_starts[partition] = resp["LastEvaluatedKey"]
+
+    items = []
+    seen = set()
+    for item, _ in page:
+        # A memo being moved can briefly be in both its shard and version 1 partition
+        if item["memo_id"] not in seen:
+            seen.add(item["memo_id"])
+            items.append(item)
+    return items, next_starts
+
+
+def _index_key(item):
+    return {"user_id": item["user_id"], "memo_id": item["memo_id"], "updated_at": item["updated_at"]}
+
+
+def _migrate_memo(user_id: str, memo_id: str):
+    """Moves a memo from its version 1 key to its shard (MEMO_KEY_MIGRATION).
+
+    Returns the number of rows moved. A memo of up to MAX_TRANSACT_ROWS rows
+    and MAX_TRANSACT_BYTES moves in one transaction. Larger ones are copied item rows first and
+    header last; the memo counts as moved once the header is. Every copy is
+    conditional on the row being absent, so a memo already moved and written
+    since is never overwritten, and its version 1 rows are just deleted.
+    Item rows of a large memo copied while a concurrent move completes and is
+    followed by a delete of those items can outlive the delete.
+    """
+    if not KEY_MIGRATION:
+        return 0
+    rows = _query_all(
+        KeyConditionExpression=Key("user_id").eq(user_id) & Key("memo_id").begins_with(memo_id),
+        ConsistentRead=True,
+    )
+    rows = [r for r in rows if r["memo_id"].partition(ROW_SEPARATOR)[0] == memo_id]
+    if not rows:
+        return 0
+    # Header last
+    rows.sort(key=lambda row: row["memo_id"] == memo_id)
+    partition = _partition(user_id, memo_id)
+    size = int(rows[-1].get("content_bytes", 0)) if rows[-1]["memo_id"] == memo_id else 0
+
+    if len(rows) <= MAX_TRANSACT_ROWS and size <= MAX_TRANSACT_BYTES:
+        # The resource's client serializes plain values, as the Table does
+        actions = []
+        for row in rows:
+            put = {"TableName": table.name, "Item": {**row, "user_id": partition}}
+            if row["memo_id"] == memo_id:
+                # Without the header in the shard nothing has written its rows there
+                put["ConditionExpression"] = "attribute_not_exists(memo_id)"
+            actions.append({"Put": put})
+            legacy_key = {"user_id": user_id, "memo_id": row["memo_id"]}
+            actions.append({"Delete": {"TableName": table.name, "Key": legacy_key}})
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=actions)
+            return len(rows)
+        except dynamodb.meta.client.exceptions.TransactionCanceledException:
+            if "Item" not in table.get_item(
+                Key={"user_id": partition, "memo_id": memo_id}, ConsistentRead=True
+            ):
+                raise
+            # Moved concurrently; the version 1 rows read here are stale
+            moved = 0
+    else:
+        moved = len(rows)
+        for row in rows:
+            try:
+                table.put_item(
+                    Item={**row, "user_id": partition},
+                    ConditionExpression=Attr("memo_id").not_exists(),
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                if row["memo_id"] == memo_id:
+                    moved = 0
+
+    with table.batch_writer() as batch:
+        for row in rows:
+            batch.delete_item(Key={"user_id": user_id, "memo_id": row["memo_id"]})
+    return moved
+
+
 # -------
 # Helpers
 # -------
@@ -140,23 +1959,520 @@ def _get_user_id(event):
     return sub
 
 
+def _project_metadata(content: str):
+    """Derives the attributes denormalized next to `content` on every write."""
+    metadata = {"content_bytes": len(content.encode("utf-8")), "item_count": 0}
+    try:
+        data = json.loads(content) if content else {}
+    except json.JSONDecodeError:
+        return metadata
+    if not isinstance(data, dict):
+        return metadata
+
+    project = data.get("project") if isinstance(data.get("project"), dict) else data
+    if project.get("name"):
+        metadata["project_name"] = str(project["name"])
+    if isinstance(data.get("items"), list):
+        metadata["item_count"] = len(data["items"])
+    return metadata
+
+
+def _query(**kwargs):
+    """Table.query through the resource's client, which is thread-safe.
+
+    The client keeps the resource's handling of plain values and conditions.
+    """
+    return dynamodb.meta.client.query(TableName=TABLE_NAME, **kwargs)
+
+
+def _query_all(**kwargs):
+    """Runs a query to completion, following LastEvaluatedKey across pages."""
+    items = []
+    while True:
+        resp = _query(**kwargs)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _encode_cursor(user_id: str, starts):
+    """Signs {partition: ExclusiveStartKey or None} for the next summary page."""
+    payload = base64.urlsafe_b64encode(
+        json.dumps(starts, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    ).decode("ascii")
+    return f"{payload}.{_cursor_signature(user_id, payload)}"
+
+
+def _decode_cursor(user_id: str, cursor: str):
+    """Returns the partitions' start keys for a cursor issued to this user."""
+    payload, _, signature = cursor.partition(".")
+    if not hmac.compare_digest(signature, _cursor_signature(user_id, payload)):
+        raise ValueError("Cursor signature mismatch")
+    try:
+        starts = json.loads(base64.urlsafe_b64decode(payload.encode("ascii")))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if not isinstance(starts, dict) or not starts:
+        raise ValueError("Malformed cursor")
+    for partition, start in starts.items():
+        if _owner(partition) != user_id or not (
+            start is None or isinstance(start, dict) and start.get("user_id") == partition
+        ):
+            raise ValueError("Cursor does not belong to this user")
+    # A version 1 partition left in a cursor from before the migration ended is empty
+    partitions = _partitions(user_id)
+    return {partition: start for partition, start in starts.items() if partition in partitions}
+
+
+def _cursor_signature(user_id: str, payload: str):
+    digest = hmac.new(
+        _cursor_key(), f"{user_id}.{payload}".encode("utf-8"), hashlib.sha256
+    ).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def _cursor_key():
+    global _cursor_signing_key
+    if _cursor_signing_key is None:
+        secret = ""
+        if CURSOR_SECRET_ARN:
+            secret = secretsmanager.get_secret_value(SecretId=CURSOR_SECRET_ARN)["SecretString"]
+        _cursor_signing_key = secret.encode("utf-8")
+    return _cursor_signing_key
+
+
+def _backfill_metadata(user_id: str, item):
+    """Stores and fills in metadata for memos written before it was denormalized.
+
+    Like `_backfill_etag`, the update is conditional on the version read, so
+    a concurrent save (which stores its own metadata) is never overwritten.
+    """
+    if "content_bytes" in item:
+        return item
+    # The header's own key; while migrating it may be the version 1 copy
+    key = {"user_id": item["user_id"], "memo_id": item["memo_id"]}
+    header = table.get_item(Key=key, ProjectionExpression="content, version").get("Item", {})
+    metadata = _project_metadata(codec.decode(header.get("content", "")))
+    try:
+        table.update_item(
+            Key=key,
+            ConditionExpression=(
+                Attr("memo_id").exists()
+                & _version_condition(_version_of(header))
+                & Attr("content_bytes").not_exists()
+                & Attr("deleted_at").not_exists()
+            ),
+            **_update_expression(metadata),
+        )
+    except ClientError as e:
+        # Saved or deleted concurrently; a save stored its own metadata
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+    return {**item, **metadata}
+
+
+def _offload_item_images(user_id: str, items):
+    """Moves inline `data:` image sources to S3 and keeps only their assetId."""
+    for item in items:
+        if not isinstance(item, dict) or item.get("type") != "image":
+            continue
+        if item.get("assetId"):
+            # Already stored; `src` is a presigned URL resolved on read
+            item.pop("src", None)
+            continue
+        src = item.get("src") or ""
+        match = DATA_URL_PATTERN.match(src)
+        if match:
+            image = base64.b64decode(src[match.end():])
+            item["assetId"] = _put_asset(user_id, image, match.group("media_type"))
+            item.pop("src")
+
+
+def _resolve_assets(user_id: str, content: str):
+    """Replaces stored assetIds with presigned S3 URLs in `src`."""
+    if '"assetId"' not in content:
+        return content
+    data = _load_canvas(content)
+    if data is None:
+        return content
+    _resolve_item_assets(user_id, data["items"])
+    return _dumps(data)
+
+
+def _resolve_item_assets(user_id: str, items):
+    for item in items:
+        if isinstance(item, dict) and item.get("assetId"):
+            item["src"] = s3.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": ASSET_BUCKET_NAME, "Key": _asset_key(user_id, item["assetId"])},
+                ExpiresIn=ASSET_URL_EXPIRES_IN,
+            )
+
+
+def _put_asset(user_id: str, image: bytes, media_type: str | None):
+    asset_id = hashlib.sha256(image).hexdigest()
+    key = _asset_key(user_id, asset_id)
+    try:
+        s3.head_object(Bucket=ASSET_BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        s3.put_object(
+            Bucket=ASSET_BUCKET_NAME,
+            Key=key,
+            Body=image,
+            ContentType=media_type or "application/octet-stream",
+            CacheControl="private, max-age=31536000, immutable",
+        )
+    return asset_id
+
+
+def _asset_key(user_id: str, asset_id: str):
+    return f"assets/{user_id}/{asset_id}"
+
+
+def _preview_key(user_id: str, memo_id: str):
+    return f"{PREVIEW_PREFIX}{user_id}/{memo_id}.svg"
+
+
+def _load_canvas(content: str):
+    """Parses `{project, items}` canvas JSON; None for anything else."""
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("items"), list):
+        return None
+    return data
+
+
+def _parse_ops(body):
+    """Validates the PATCH op list."""
+    ops = body.get("ops")
+    if not isinstance(ops, list):
+        raise ValueError("ops must be a list")
+    if len(ops) > MAX_PATCH_OPS:
+        raise ValueError(f"At most {MAX_PATCH_OPS} ops are allowed per request")
+    if "project" in body and not isinstance(body["project"], dict):
+        raise ValueError("project must be an object")
+
+    for op in ops:
+        if not isinstance(op, dict):
+            raise ValueError("Each op must be an object")
+        if op.get("op") == "upsert":
+            if not isinstance(op.get("item"), dict) or not op["item"].get("id"):
+                raise ValueError("upsert requires an item with an id")
+        elif op.get("op") == "delete":
+            if not op.get("id"):
+                raise ValueError("delete requires an id")
+        else:
+            raise ValueError("op must be 'upsert' or 'delete'")
+    return ops
+
+
+def _apply_ops(data, ops, project=None):
+    """Applies PATCH ops in order to a parsed canvas, in place."""
+    positions = {
+        item.get("id"): i for i, item in enumerate(data["items"]) if isinstance(item, dict)
+    }
+    removed = set()
+    for op in ops:
+        if op["op"] == "upsert":
+            item_id = op["item"]["id"]
+            removed.discard(item_id)
+            if item_id in positions:
+                data["items"][positions[item_id]] = op["item"]
+            else:
+                positions[item_id] = len(data["items"])
+                data["items"].append(op["item"])
+        else:
+            if op["id"] in positions:
+                removed.add(op["id"])
+
+    if removed:
+        data["items"] = [
+            item for item in data["items"] if not (isinstance(item, dict) and item.get("id") in removed)
+        ]
+    if project is not None:
+        data["project"] = project
+
+
+def _apply_delta(data, delta):
+    """Applies a revision delta (see handlers/revisions.py) to a parsed canvas."""
+    _apply_ops(data, delta["ops"], delta.get("project"))
+    if "order" in delta:
+        rank = {item_id: i for i, item_id in enumerate(delta["order"])}
+        data["items"].sort(
+            key=lambda item: rank.get(item.get("id") if isinstance(item, dict) else None, len(rank))
+        )
+
+
+def _summary(user_id: str, item):
+    return {
+        "memoId": item["memo_id"],
+        "name": item.get("project_name"),
+        "createdAt": item.get("created_at"),
+        "updatedAt": item.get("updated_at"),
+        "itemCount": int(item.get("item_count", 0)),
+        "contentBytes": int(item.get("content_bytes", 0)),
+        "previewUrl": _preview_url(user_id, item),
+    }
+
+
+def _preview_url(user_id: str, item):
+    """Presigned URL of the memo's preview; None for an empty canvas.
+
+    Previews are rendered asynchronously, so a memo saved moments ago may
+    still show its previous preview, or none yet.
+    """
+    if not int(item.get("item_count", 0)):
+        return None
+    key = (user_id, item["memo_id"], item.get("updated_at"))
+    url = preview_urls.get(key)
+    if url is None:
+        url = s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": ASSET_BUCKET_NAME, "Key": _preview_key(user_id, item["memo_id"])},
+            ExpiresIn=ASSET_URL_EXPIRES_IN,
+        )
+        preview_urls.put(key, url)
+    return url
+
+
+def _expected_version(event, body):
+    """Reads the version precondition from If-Match or `expectedVersion`.
+
+    Returns the version, or for an If-Match ETag from GET the content hash
+    it names, which `_precondition_version` turns into a version.
+    """
+    raw = _header(event, "If-Match")
+    if raw is None:
+        raw = body.get("expectedVersion")
+    if raw is None or raw == "*":
+        return None
+    if isinstance(raw, str):
+        raw = raw.strip().removeprefix("W/").strip('"')
+        if "." in raw:
+            # "{content hash}.{window}[.inline]", see _etag_header
+            return raw.partition(".")[0]
+    try:
+        version = int(raw)
+    except (TypeError, ValueError):
+        raise ValueError("If-Match must be a version number or an ETag; expectedVersion a version number")
+    if version < 0:
+        raise ValueError("If-Match / expectedVersion must not be negative")
+    return version
+
+
+def _precondition_version(user_id: str, memo_id: str, expected):
+    """The version the write is conditional on, for a version or an ETag's content hash.
+
+    An ETag names the stored version while its content hash still matches;
+    otherwise the memo changed since the GET and VersionConflict is raised.
+    The write is then conditional on that version, so a save in between
+    still conflicts.
+    """
+    if not isinstance(expected, str):
+        return expected
+    _migrate_memo(user_id, memo_id)
+    header = table.get_item(
+        Key=_key(user_id, memo_id),
+        ProjectionExpression="#etag, #version, #deleted_at",
+        ExpressionAttributeNames={
+            "#etag": "etag",
+            "#version": "version",
+            "#deleted_at": "deleted_at",
+        },
+        ConsistentRead=True,
+    ).get("Item")
+    if header is None or "deleted_at" in header or header.get("etag") != expected:
+        raise VersionConflict(_version_of(header or {}))
+    return _version_of(header)
+
+
+def _header(event, name: str):
+    """Case-insensitive request header lookup."""
+    name = name.lower()
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _etag_header(etag: str, content_format: str = "string"):
+    # Weak: the body embeds presigned URLs, so equal content is not byte-identical
+    suffix = ".inline" if content_format == "inline" else ""
+    return f'W/"{etag}.{int(time.time()) // ETAG_WINDOW_SECONDS}{suffix}"'
+
+def _etag_matches(if_none_match: str, current: str):
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return current.removeprefix("W/") in candidates
+
+
+def _cache_headers(etag: str, content_format: str = "string"):
+    return {"ETag": _etag_header(etag, content_format), "Cache-Control": "private, no-cache"}
+
+
+def _content_value(header, content: str, content_format: str):
+    """Returns `content` for a response body in the requested format."""
+    if content_format != "inline":
+        return content
+    if header.get("layout") != ROWS_LAYOUT:
+        # Blobs may hold plain text, which stays a string
+        try:
+            json.loads(content)
+        except json.JSONDecodeError:
+            return content
+    return _RawJSON(content)
+
+
+def _client_sequence(body):
+    """Reads the optional (`clientId`, `clientSeq`) pair that orders a client's saves."""
+    client_id, seq = body.get("clientId"), body.get("clientSeq")
+    if client_id is None and seq is None:
+        return None
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= MAX_CLIENT_ID_LENGTH:
+        raise ValueError(f"clientId must be a string of 1 to {MAX_CLIENT_ID_LENGTH} characters")
+    if isinstance(seq, bool) or not isinstance(seq, int) or seq < 0:
+        raise ValueError("clientSeq must be a non-negative integer")
+    return client_id, seq
+
+
+def _stale(memo_id: str, error):
+    # Not an error for the client: what it sent is superseded by its own later save
+    _count_metric("StaleSavesDropped")
+    return _response(
+        200, {"memoId": memo_id, "version": error.current_version, "stale": True}
+    )
+
+
+def _conflict(error):
+    return _response(
+        409,
+        {"error": "Memo was modified by another save", "currentVersion": error.current_version},
+    )
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
 def _parse_json_body(event):
     raw = event.get("body") or ""
     if not raw:
         return {}
+    if event.get("isBase64Encoded"):
+        # application/json is a binary media type so responses can be gzipped
+        raw = base64.b64decode(raw).decode("utf-8")
     try:
         return json.loads(raw)
     except json.JSONDecodeError:
         raise ValueError("Invalid JSON body")
 
 
-def _response(status_code: int, body):
+def _response(status_code: int, body, headers=None):
+    """Builds a response; `body` is serialized by `_encode_response`."""
     return {
         "statusCode": status_code,
         "headers": {
-            "Content-Type": "application/json",
+            "Content-Type": "application/json; charset=utf-8",
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Credentials": "true",
+            "Access-Control-Expose-Headers": "ETag",
+            **(headers or {}),
         },
-        "body": json.dumps(body) if body is not None else "",
+        "body": body,
     }
+
+
+def _encode_response(event, response):
+    """Serializes the body, gzips it when worthwhile and logs its size."""
+    started = time.perf_counter()
+    body = response["body"]
+    text = _encode_json(body) if body is not None else ""
+    raw = text.encode("utf-8")
+    metrics = {"SerializeMs": round((time.perf_counter() - started) * 1000, 3)}
+
+    if len(raw) >= GZIP_MIN_BYTES and _accepts_gzip(event):
+        started = time.perf_counter()
+        response["body"] = base64.b64encode(gzip.compress(raw, compresslevel=5)).decode("ascii")
+        response["isBase64Encoded"] = True
+        response["headers"]["Content-Encoding"] = "gzip"
+        response["headers"]["Vary"] = "Accept-Encoding"
+        metrics["GzipMs"] = round((time.perf_counter() - started) * 1000, 3)
+    else:
+        response["body"] = text
+
+    _log_metrics(
+        event,
+        response["statusCode"],
+        ResponseBytes=len(raw),
+        WireBytes=len(response["body"]),
+        **metrics,
+        **invocation_metrics,
+    )
+    return response
+
+
+def _encode_json(value):
+    """json.dumps that splices `_RawJSON` fragments without re-encoding them."""
+    if isinstance(value, _RawJSON):
+        return value.text
+    if isinstance(value, dict):
+        return "{%s}" % ",".join(f"{_dumps(str(k))}:{_encode_json(v)}" for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return "[%s]" % ",".join(_encode_json(v) for v in value)
+    return _dumps(value)
+
+
+def _accepts_gzip(event):
+    accept = _header(event, "Accept") or ""
+    if GZIP_ACCEPT_TYPE not in accept:
+        return False
+    for coding in (_header(event, "Accept-Encoding") or "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+def _metric_unit(name: str):
+    if name.endswith("Bytes"):
+        return "Bytes"
+    if name.endswith("Ms"):
+        return "Milliseconds"
+    return "Count"
+
+
+def _count_metric(name: str, amount: int = 1):
+    invocation_metrics[name] = invocation_metrics.get(name, 0) + amount
+
+
+def _log_metrics(event, status_code: int, **metrics):
+    """Prints an Embedded Metric Format line; CloudWatch turns it into metrics."""
+    route = f"{event.get('httpMethod')} {event.get('resource', '')}".strip()
+    print(
+        json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": METRICS_NAMESPACE,
+                            "Dimensions": [["Route"]],
+                            "Metrics": [
+                                {"Name": name, "Unit": _metric_unit(name)}
+                                for name in metrics
+                            ],
+                        }
+                    ],
+                },
+                "Route": route,
+                "StatusCode": status_code,
+                **metrics,
+            }
+        )
+    )
@@ -1,120 +1,190 @@
 """OCR API handler using Amazon Bedrock Vision."""
 
 import base64
+import binascii
+import hashlib
+import io
 import json
 import logging
+import math
+import os
+import re
+import time
 import uuid
-from email.parser import BytesParser
-from email.policy import HTTP
+from datetime import datetime, timezone
 
-import boto3
+from handlers import cache, clients
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-# Bedrock client
-bedrock_runtime = boto3.client("bedrock-runtime")
+# Bedrock client, built on first use (see handlers/clients.py)
+bedrock_runtime = clients.Lazy("client", "bedrock-runtime")
+
+# Jobs: POST stages the image in the OCR bucket, records the job and queues
+# it; handlers/ocr_worker.py runs it and GET reads the result from the table
+OCR_BUCKET_NAME = os.environ.get("OCR_BUCKET_NAME", "")
+JOB_TABLE_NAME = os.environ.get("OCR_JOB_TABLE_NAME", "")
+QUEUE_URL = os.environ.get("OCR_QUEUE_URL", "")
+s3 = clients.Lazy("client", "s3")
+sqs = clients.Lazy("client", "sqs")
+job_table = clients.Lazy("table", JOB_TABLE_NAME)
+JOB_PREFIX = "jobs/"
+# Jobs expire with the bucket's 7-day lifecycle
+JOB_TTL_SECONDS = 7 * 24 * 3600
+# Attempts per job; matches the queue's maxReceiveCount
+MAX_ATTEMPTS = 3
+
+# API Gateway's payload limit; larger uploads are refused before decoding
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+# `; name=value` or `; name="quoted value"` in a header
+HEADER_PARAM = re.compile(r';\s*([\w*.-]+)\s*=\s*("(?:[^"\\]|\\.)*"|[^;\s]*)')
 
 # Claude 3 Haiku model ID
 MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
 
+OCR_PROMPT = "この画像に含まれるすべてのテキストを抽出してください。テキストのみを出力し、説明や解説は不要です。テキストが見つからない場合は「テキストが見つかりませんでした」と出力してください。"
+# Part of the result cache key; bump it whenever OCR_PROMPT or the request changes
+PROMPT_VERSION = "1"
+
+# Images are downscaled to these bounds and re-encoded before they are sent to
+# Bedrock (with Pillow installed). The model scales larger images down to
+# about 1.15 megapixels itself, so their extra pixels only cost request bytes
+# and latency.
+MAX_IMAGE_LONG_EDGE = int(os.environ.get("OCR_MAX_LONG_EDGE", "1568"))
+MAX_IMAGE_MEGAPIXELS = float(os.environ.get("OCR_MAX_MEGAPIXELS", "1.15"))
+IMAGE_GRAYSCALE = os.environ.get("OCR_GRAYSCALE") == "1"
+# webp, jpeg or png; all are accepted by the model
+IMAGE_FORMAT = os.environ.get("OCR_IMAGE_FORMAT", "webp")
+IMAGE_QUALITY = int(os.environ.get("OCR_IMAGE_QUALITY", "85"))
+
+# Results by image content, model and prompt version: an in-process LRU in
+# front of the cache table. The table is skipped when OCR_CACHE_TABLE_NAME is
+# not set.
+CACHE_TABLE_NAME = os.environ.get("OCR_CACHE_TABLE_NAME", "")
+cache_table = clients.Lazy("table", CACHE_TABLE_NAME)
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+result_cache = cache.LRUCache(
+    4 * 1024 * 1024, 3600, sizeof=lambda text: len(text.encode("utf-8"))
+)
+
+
+class MultipartError(ValueError):
+    """An upload that cannot be parsed; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
 
 def parse_multipart(event):
-    """Parse multipart/form-data from API Gateway event."""
-    content_type = event.get("headers", {}).get("content-type") or event.get(
-        "headers", {}
-    ).get("Content-Type", "")
+    """Parse the "file" part of a multipart/form-data upload from an API Gateway event.
+
+    The decoded body is scanned forward once for the boundaries, and the
+    file's content is returned as a memoryview into it, without copies or
+    trimming. Bodies larger than MAX_UPLOAD_BYTES are refused before they
+    are decoded. Raises MultipartError.
+    """
+    headers = event.get("headers") or {}
+    content_type = headers.get("content-type") or headers.get("Content-Type", "")
 
     if "multipart/form-data" not in content_type:
-        return None, "Content-Type must be multipart/form-data"
-
-    # Extract boundary from content-type
-    boundary = None
-    for part in content_type.split(";"):
-        part = part.strip()
-        if part.startswith("boundary="):
-            boundary = part[9:].strip('"')
-            break
+        raise MultipartError("Content-Type must be multipart/form-data")
 
+    boundary = header_params(content_type).get("boundary")
     if not boundary:
-        return None, "No boundary found in Content-Type"
+        raise MultipartError("No boundary found in Content-Type")
+
+    data = decode_body(event)
+    logger.info(f"Body after decode: length={len(data)}, boundary: {boundary}")
+
+    view = memoryview(data)
+    dash_boundary = b"--" + boundary.encode("latin-1")
+    delimiter = b"\r\n" + dash_boundary
+
+    # The first boundary opens the body, or follows a preamble and CRLF
+    if data.startswith(dash_boundary):
+        pos = len(dash_boundary)
+    else:
+        pos = data.find(delimiter)
+        if pos < 0:
+            raise MultipartError("No file found in request")
+        pos += len(delimiter)
+
+    while not data.startswith(b"--", pos):
+        # Rest of the boundary line (transport padding), then the part's headers
+        line_end = data.find(b"\n", pos)
+        if line_end < 0:
+            break
+        next_delimiter = data.find(delimiter, line_end)
+        if next_delimiter < 0:
+            raise MultipartError("Malformed multipart body: missing closing boundary")
+        headers_end = data.find(b"\r\n\r\n", line_end - 1, next_delimiter + 2)
+        if headers_end < 0:
+            raise MultipartError("Malformed multipart body: part without headers")
+
+        part_headers = part_header_map(view[line_end + 1 : headers_end])
+        disposition = header_params(part_headers.get("content-disposition", ""))
+        if disposition.get("name") == "file":
+            content = view[headers_end + 4 : next_delimiter]
+            if len(content) > MAX_UPLOAD_BYTES:
+                raise MultipartError("File too large", 413)
+            filename = disposition.get("filename") or "image"
+            file_content_type = part_headers.get("content-type", "application/octet-stream")
+            logger.info(f"Extracted file: {filename}, content_type: {file_content_type}, content_length: {len(content)}")
+            return {
+                "filename": filename,
+                "content": content,
+                "content_type": file_content_type,
+            }
+        pos = next_delimiter + len(delimiter)
+
+    raise MultipartError("No file found in request")
+
 
+def decode_body(event):
+    """Return the request body as bytes, refusing oversized bodies before decoding."""
     # Get body - API Gateway always base64 encodes binary data
-    body = event.get("body", "")
+    body = event.get("body") or ""
     is_base64 = event.get("isBase64Encoded", False)
 
-    logger.info(f"isBase64Encoded: {is_base64}, body type: {type(body)}, body length: {len(body) if body else 0}")
-
+    if isinstance(body, bytes):
+        if len(body) > MAX_UPLOAD_BYTES:
+            raise MultipartError("File too large", 413)
+        return body
+    # Base64 takes 4 characters per 3 bytes
+    if len(body) // 4 * 3 > MAX_UPLOAD_BYTES:
+        raise MultipartError("File too large", 413)
+    # As base64.b64decode, without first copying the text into bytes
     if is_base64:
-        body = base64.b64decode(body)
-    elif isinstance(body, str):
-        # Try to decode as base64 first (API Gateway might not set the flag correctly)
-        try:
-            body = base64.b64decode(body)
-            logger.info("Successfully decoded body as base64")
-        except Exception:
-            # If not base64, encode as raw bytes
-            body = body.encode("utf-8", errors="surrogateescape")
-            logger.info("Encoded body as utf-8 with surrogateescape")
-
-    logger.info(f"Body after decode: type={type(body)}, length={len(body)}")
-
-    # Parse multipart manually
-    boundary_bytes = f"--{boundary}".encode("utf-8")
-    parts = body.split(boundary_bytes)
-
-    logger.info(f"Found {len(parts)} parts with boundary: {boundary}")
-
-    for i, part in enumerate(parts):
-        if b'name="file"' not in part:
-            continue
+        return binascii.a2b_base64(body)
+    # Try to decode as base64 first (API Gateway might not set the flag correctly)
+    try:
+        return binascii.a2b_base64(body)
+    except Exception:
+        # If not base64, encode as raw bytes
+        return body.encode("utf-8", errors="surrogateescape")
 
-        logger.info(f"Processing part {i} with file data")
 
-        # Split headers and content
-        if b"\r\n\r\n" in part:
-            headers_section, content = part.split(b"\r\n\r\n", 1)
-        elif b"\n\n" in part:
-            headers_section, content = part.split(b"\n\n", 1)
-        else:
-            continue
+def part_header_map(raw):
+    """Headers of a multipart part as {lowercased name: value}."""
+    headers = {}
+    for line in bytes(raw).decode("utf-8", errors="replace").split("\r\n"):
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return headers
 
-        # Remove trailing boundary marker and whitespace
-        content = content.rstrip()
-        if content.endswith(b"--"):
-            content = content[:-2].rstrip()
-
-        # Extract filename
-        headers_str = headers_section.decode("utf-8", errors="ignore")
-        filename = "image"
-        if 'filename="' in headers_str:
-            start = headers_str.index('filename="') + 10
-            end = headers_str.index('"', start)
-            filename = headers_str[start:end]
-
-        # Extract content type
-        file_content_type = "application/octet-stream"
-        for line in headers_str.split("\n"):
-            if line.lower().startswith("content-type:"):
-                file_content_type = line.split(":", 1)[1].strip()
-                break
-
-        logger.info(f"Extracted file: {filename}, content_type: {file_content_type}, content_length: {len(content)}")
-
-        # Verify PNG signature
-        if content[:8] == b'\x89PNG\r\n\x1a\n':
-            logger.info("Valid PNG signature detected")
-        else:
-            logger.warning(f"Invalid PNG signature. First 20 bytes: {content[:20]}")
-
-        return {
-            "filename": filename,
-            "content": content,
-            "content_type": file_content_type,
-        }, None
 
-    return None, "No file found in request"
+def header_params(value):
+    """Parameters of a header value such as Content-Disposition, unquoted."""
+    params = {}
+    for name, raw in HEADER_PARAM.findall(value):
+        if raw.startswith('"'):
+            raw = re.sub(r"\\(.)", r"\1", raw[1:-1])
+        params[name.lower()] = raw
+    return params
 
 
 def get_media_type(content_type, filename):
@@ -142,8 +212,93 @@ def get_media_type(content_type, filename):
     return ext_map.get(ext, "image/jpeg")
 
 
-def invoke_bedrock_vision(image_data, media_type):
-    """Call Bedrock Vision API to extract text from image."""
+def prepare_image(image_data, media_type):
+    """Downscale and re-encode an image for Bedrock; returns (image_data, media_type).
+
+    The image is scaled to MAX_IMAGE_LONG_EDGE and MAX_IMAGE_MEGAPIXELS,
+    optionally converted to grayscale, and re-encoded as IMAGE_FORMAT. It is
+    sent as uploaded when Pillow is not installed, it cannot be decoded, or
+    the result is not smaller (e.g. a flat PNG screenshot); the model scales
+    it itself then.
+    """
+    try:
+        # Only the worker prepares images, so only it pays for the import; it
+        # gets Pillow from a layer (infra/layers/imaging)
+        from PIL import Image, ImageOps
+    except ImportError:
+        return image_data, media_type
+
+    started = time.perf_counter()
+    try:
+        with Image.open(io.BytesIO(image_data)) as image:
+            width, height = image.size
+            # JPEGs decode at a reduced scale directly, which is much faster;
+            # draft() never goes below the requested size
+            image.draft("RGB", target_size(width, height))
+            # Phone photos are stored sideways with their rotation in EXIF
+            image = ImageOps.exif_transpose(image)
+            size = target_size(*image.size)
+            if size != image.size:
+                image = image.resize(size, Image.Resampling.LANCZOS)
+            image = flatten_image(image)
+            if IMAGE_GRAYSCALE:
+                image = image.convert("L")
+            out = io.BytesIO()
+            image.save(out, format=IMAGE_FORMAT.upper(), quality=IMAGE_QUALITY, optimize=True)
+    except Exception as e:
+        logger.warning(f"Image preprocessing failed, sending the upload as is: {str(e)}")
+        return image_data, media_type
+
+    prepared = out.getvalue()
+    elapsed = (time.perf_counter() - started) * 1000
+    if len(prepared) >= len(image_data):
+        logger.info(f"Image sent as uploaded: {width}x{height} {media_type}, {len(image_data)} bytes ({elapsed:.0f} ms)")
+        return image_data, media_type
+    logger.info(f"Image preprocessed: {width}x{height} {media_type}, {len(image_data)} bytes -> {image.width}x{image.height} image/{IMAGE_FORMAT}, {len(prepared)} bytes ({elapsed:.0f} ms)")
+    return prepared, f"image/{IMAGE_FORMAT}"
+
+
+def target_size(width, height):
+    """The size an image is scaled to, within MAX_IMAGE_LONG_EDGE and MAX_IMAGE_MEGAPIXELS."""
+    scale = min(
+        1.0,
+        MAX_IMAGE_LONG_EDGE / max(width, height),
+        math.sqrt(MAX_IMAGE_MEGAPIXELS * 1_000_000 / (width * height)),
+    )
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def flatten_image(image):
+    """The image in RGB (or L), transparent areas on white: the model reads dark text."""
+    from PIL import Image
+
+    if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        return Image.alpha_composite(background, image).convert("RGB")
+    if image.mode not in ("RGB", "L"):
+        return image.convert("RGB")
+    return image
+
+
+def preprocessing_signature():
+    """How images are prepared, as part of the result cache key.
+
+    Built from the settings alone, so the API function, which does not load
+    Pillow, computes the same key as the worker that prepares the image.
+    """
+    gray = "-gray" if IMAGE_GRAYSCALE else ""
+    return f"{MAX_IMAGE_LONG_EDGE}px-{MAX_IMAGE_MEGAPIXELS:g}mp{gray}-{IMAGE_FORMAT}{IMAGE_QUALITY}"
+
+
+def invoke_bedrock_vision(image_data, media_type, on_text=None):
+    """Call Bedrock Vision API to extract text from image.
+
+    With `on_text`, the response is streamed and `on_text(text)` is called
+    with the text extracted so far as each chunk arrives.
+    """
+    image_data, media_type = prepare_image(image_data, media_type)
+
     # Encode image as base64
     image_base64 = base64.b64encode(image_data).decode("utf-8")
 
@@ -167,13 +322,16 @@ def invoke_bedrock_vision(image_data, media_type):
                     },
                     {
                         "type": "text",
-                        "text": "この画像に含まれるすべてのテキストを抽出してください。テキストのみを出力し、説明や解説は不要です。テキストが見つからない場合は「テキストが見つかりませんでした」と出力してください。",
+                        "text": OCR_PROMPT,
                     },
                 ],
             }
         ],
     }
 
+    if on_text is not None:
+        return stream_bedrock_vision(request_body, on_text)
+
     # Call Bedrock
     response = bedrock_runtime.invoke_model(
         modelId=MODEL_ID,
@@ -189,6 +347,34 @@ def invoke_bedrock_vision(image_data, media_type):
     return extracted_text
 
 
+def stream_bedrock_vision(request_body, on_text):
+    """Call Bedrock with a streamed response; returns the full text."""
+    started = time.perf_counter()
+    response = bedrock_runtime.invoke_model_with_response_stream(
+        modelId=MODEL_ID,
+        contentType="application/json",
+        accept="application/json",
+        body=json.dumps(request_body),
+    )
+
+    # Errors raised mid-stream (e.g. throttlingException) are EventStreamErrors
+    chunks = []
+    for event in response["body"]:
+        chunk = event.get("chunk")
+        if chunk is None:
+            continue
+        message = json.loads(chunk["bytes"])
+        if message["type"] != "content_block_delta" or message["delta"].get("type") != "text_delta":
+            continue
+        if not chunks:
+            logger.info(f"First OCR text after {(time.perf_counter() - started) * 1000:.0f} ms")
+        chunks.append(message["delta"]["text"])
+        on_text("".join(chunks))
+
+    logger.info(f"OCR stream finished after {(time.perf_counter() - started) * 1000:.0f} ms")
+    return "".join(chunks)
+
+
 def create_response(status_code, body):
     """Create API Gateway response with CORS headers."""
     return {
@@ -205,6 +391,17 @@ def create_response(status_code, body):
 
 def handler(event, context):
     """OCR API handler."""
+    clients.invocation_started()
+    try:
+        return route(event)
+    finally:
+        metrics = clients.take_metrics()
+        if metrics:
+            logger.info(f"Client timings: {json.dumps(metrics)}")
+
+
+def route(event):
+    """Dispatches the request to its job handler."""
     http_method = event.get("httpMethod", "")
     path = event.get("path", "")
 
@@ -212,7 +409,7 @@ def handler(event, context):
     if http_method == "POST" and path.endswith("/ocr/jobs"):
         return handle_create_job(event)
 
-    # GET /ocr/jobs/{job_id} - Get job status (placeholder for sync implementation)
+    # GET /ocr/jobs/{job_id} - Job status, with the text extracted so far or the result
     if http_method == "GET" and "/ocr/jobs/" in path:
         return handle_get_job(event)
 
@@ -220,12 +417,13 @@ def handler(event, context):
 
 
 def handle_create_job(event):
-    """Handle POST /ocr/jobs - Process image and return OCR result."""
+    """Handle POST /ocr/jobs - Stage the image and queue an OCR job."""
     # Parse multipart form data
-    file_data, error = parse_multipart(event)
-    if error:
-        logger.error(f"Multipart parse error: {error}")
-        return create_response(400, {"error": error})
+    try:
+        file_data = parse_multipart(event)
+    except MultipartError as e:
+        logger.error(f"Multipart parse error: {str(e)}")
+        return create_response(e.status, {"error": str(e)})
 
     # Validate file
     if not file_data or not file_data["content"]:
@@ -238,51 +436,234 @@ def handle_create_job(event):
     # Generate job ID
     job_id = str(uuid.uuid4())
 
-    logger.info(f"Processing OCR job {job_id}: filename={file_data['filename']}, content_type={file_data['content_type']}, media_type={media_type}, size={len(file_data['content'])} bytes")
-
-    try:
-        # Call Bedrock Vision for OCR
-        extracted_text = invoke_bedrock_vision(file_data["content"], media_type)
-
-        logger.info(f"OCR job {job_id} succeeded, extracted {len(extracted_text)} chars")
+    # The same image OCRed before is answered from the cache without a job run
+    key = cache_key(file_data["content"])
+    extracted_text = cached_text(key)
+    if extracted_text is not None:
+        logger.info(f"OCR job {job_id} answered from cache: size={len(file_data['content'])} bytes")
+        try:
+            record_cached_job(job_id, key, extracted_text, media_type, file_data["filename"])
+        except Exception as e:
+            # The result is returned anyway; only GET /ocr/jobs/{job_id} will not find it
+            logger.error(f"OCR job {job_id} could not be recorded: {str(e)}")
         return create_response(
             200,
             {
                 "job_id": job_id,
                 "status": "SUCCEEDED",
                 "text": extracted_text,
+                "error": None,
+                "cached": True,
             },
         )
 
-    except boto3.exceptions.Boto3Error as e:
-        logger.error(f"OCR job {job_id} Bedrock error: {str(e)}")
-        return create_response(
-            500,
-            {
-                "job_id": job_id,
-                "status": "FAILED",
-                "error": f"Bedrock API error: {str(e)}",
-            },
-        )
+    logger.info(f"Queueing OCR job {job_id}: filename={file_data['filename']}, content_type={file_data['content_type']}, media_type={media_type}, size={len(file_data['content'])} bytes")
+
+    try:
+        create_job(job_id, file_data["content"], media_type, file_data["filename"], key)
     except Exception as e:
-        logger.error(f"OCR job {job_id} failed: {str(e)}", exc_info=True)
-        return create_response(
-            500,
-            {
-                "job_id": job_id,
-                "status": "FAILED",
-                "error": f"OCR processing failed: {str(e)}",
-            },
-        )
+        logger.error(f"OCR job {job_id} could not be queued: {str(e)}", exc_info=True)
+        return create_response(500, {"error": "Failed to queue OCR job"})
+
+    return create_response(202, {"job_id": job_id, "status": "QUEUED"})
 
 
 def handle_get_job(event):
-    """Handle GET /ocr/jobs/{job_id} - Placeholder for sync implementation."""
-    # In synchronous implementation, jobs are processed immediately
-    # This endpoint returns 404 as jobs are not persisted
+    """Handle GET /ocr/jobs/{job_id} - Return the job's status and result."""
+    job_id = (event.get("pathParameters") or {}).get("job_id") or event.get("path", "").rsplit("/", 1)[-1]
+    job = get_job(job_id) if job_id else None
+    if job is None:
+        return create_response(404, {"error": "Job not found"})
     return create_response(
-        404,
+        200,
         {
-            "error": "Job not found. In synchronous mode, results are returned immediately from POST /ocr/jobs"
+            "job_id": job_id,
+            "status": job["status"],
+            "text": job.get("text"),
+            "error": job.get("error"),
+            "cached": bool(job.get("cached", False)),
         },
     )
+
+
+# Job store: one row per job in the job table; handlers/ocr_worker.py runs them
+
+
+def create_job(job_id, image_data, media_type, filename, key):
+    """Stage the image, record the job as QUEUED and enqueue it for the worker.
+
+    `key` is the image's result cache key, stored for the worker.
+    """
+    image_key = f"{JOB_PREFIX}{job_id}"
+    # botocore takes bytes or files, not the parser's memoryview
+    s3.put_object(Bucket=OCR_BUCKET_NAME, Key=image_key, Body=bytes(image_data), ContentType=media_type)
+    now = datetime.now(timezone.utc)
+    job_table.put_item(
+        Item={
+            "job_id": job_id,
+            "status": "QUEUED",
+            "image_key": image_key,
+            "media_type": media_type,
+            "filename": filename,
+            "size": len(image_data),
+            "cache_key": key,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "expires_at": int(now.timestamp()) + JOB_TTL_SECONDS,
+        },
+        ConditionExpression="attribute_not_exists(job_id)",
+    )
+    try:
+        sqs.send_message(QueueUrl=QUEUE_URL, MessageBody=json.dumps({"job_id": job_id}))
+    except Exception as e:
+        finish_job(job_id, "FAILED", error=f"Failed to queue job: {str(e)}", expected="QUEUED")
+        raise
+
+
+def record_cached_job(job_id, key, text, media_type, filename):
+    """Record a job answered from the result cache as SUCCEEDED."""
+    now = datetime.now(timezone.utc)
+    job_table.put_item(
+        Item={
+            "job_id": job_id,
+            "status": "SUCCEEDED",
+            "text": text,
+            "cached": True,
+            "media_type": media_type,
+            "filename": filename,
+            "cache_key": key,
+            "created_at": now.isoformat(),
+            "updated_at": now.isoformat(),
+            "expires_at": int(now.timestamp()) + JOB_TTL_SECONDS,
+        },
+        ConditionExpression="attribute_not_exists(job_id)",
+    )
+
+
+def get_job(job_id):
+    """Return the job's row, or None if it does not exist (or has expired)."""
+    return job_table.get_item(Key={"job_id": job_id}, ConsistentRead=True).get("Item")
+
+
+def start_job(job_id):
+    """Mark a job RUNNING and return its row; None if it already finished.
+
+    A RUNNING job is started again, since its previous attempt was retried;
+    the partial text that attempt streamed is dropped.
+    """
+    try:
+        resp = job_table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET #status = :running, updated_at = :now REMOVE #text ADD attempts :one",
+            ConditionExpression="#status IN (:queued, :running)",
+            ExpressionAttributeNames={"#status": "status", "#text": "text"},
+            ExpressionAttributeValues={
+                ":running": "RUNNING",
+                ":queued": "QUEUED",
+                ":now": datetime.now(timezone.utc).isoformat(),
+                ":one": 1,
+            },
+            ReturnValues="ALL_NEW",
+        )
+    except job_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return None
+    return resp["Attributes"]
+
+
+def update_job_text(job_id, text):
+    """Record the text a RUNNING job has extracted so far; False if it is no longer running."""
+    try:
+        job_table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression="SET #text = :text, updated_at = :now",
+            ConditionExpression="#status = :running",
+            ExpressionAttributeNames={"#status": "status", "#text": "text"},
+            ExpressionAttributeValues={
+                ":text": text,
+                ":running": "RUNNING",
+                ":now": datetime.now(timezone.utc).isoformat(),
+            },
+        )
+    except job_table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+    return True
+
+
+def finish_job(job_id, status, text=None, error=None, cached=None, expected="RUNNING"):
+    """Record a job's result (SUCCEEDED with text, FAILED with error) and drop its image."""
+    names = {"#status": "status"}
+    values = {":status": status, ":expected": expected, ":now": datetime.now(timezone.utc).isoformat()}
+    clauses = ["#status = :status", "updated_at = :now"]
+    for name, value in (("text", text), ("error", error), ("cached", cached)):
+        if value is not None:
+            names[f"#{name}"] = name
+            values[f":{name}"] = value
+            clauses.append(f"#{name} = :{name}")
+    update = "SET " + ", ".join(clauses)
+    if text is None:
+        # Partial text streamed before the job failed
+        names["#text"] = "text"
+        update += " REMOVE #text"
+    try:
+        job_table.update_item(
+            Key={"job_id": job_id},
+            UpdateExpression=update,
+            ConditionExpression="#status = :expected",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+    except job_table.meta.client.exceptions.ConditionalCheckFailedException:
+        logger.info(f"OCR job {job_id} was already finished")
+        return
+    s3.delete_object(Bucket=OCR_BUCKET_NAME, Key=f"{JOB_PREFIX}{job_id}")
+
+
+# Result cache
+
+
+def cache_key(image_data):
+    """Cache key of an image's OCR result.
+
+    The upload's SHA-256 with the model, the prompt version and how the image
+    is preprocessed, since each of them changes the result.
+    """
+    digest = hashlib.sha256(image_data).hexdigest()
+    return f"{MODEL_ID}#{PROMPT_VERSION}#{preprocessing_signature()}#{digest}"
+
+
+def cached_text(key):
+    """Return the cached OCR result for `key`, or None on a miss.
+
+    Lookup failures count as misses; the image is then OCRed as usual.
+    """
+    text = result_cache.get(key)
+    if text is not None or not CACHE_TABLE_NAME:
+        return text
+    try:
+        item = cache_table.get_item(Key={"cache_key": key}).get("Item")
+    except Exception as e:
+        logger.warning(f"OCR cache lookup failed: {str(e)}")
+        return None
+    # TTL deletes expired items lazily, so they can still be read for a while
+    if item is None or int(item.get("expires_at", 0)) <= time.time():
+        return None
+    result_cache.put(key, item["text"])
+    return item["text"]
+
+
+def cache_text(key, text):
+    """Store an OCR result under `key`; failures are logged, not raised."""
+    result_cache.put(key, text)
+    if not CACHE_TABLE_NAME:
+        return
+    try:
+        cache_table.put_item(
+            Item={
+                "cache_key": key,
+                "text": text,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "expires_at": int(time.time()) + CACHE_TTL_SECONDS,
+            }
+        )
+    except Exception as e:
+        logger.warning(f"OCR cache write failed: {str(e)}")
@@ -0,0 +1,154 @@
+"""Runs queued OCR jobs (see handlers/ocr.py).
+
+Triggered by the OCR job queue. Each message names a job whose image was
+staged in the OCR bucket by POST /ocr/jobs; the worker marks it RUNNING,
+sends the image to Bedrock and records SUCCEEDED with the text or FAILED
+with the error. Results go to the OCR result cache, and a job whose image
+was OCRed meanwhile (e.g. dropped twice in a row) is answered from it.
+
+The model's response is streamed: while it runs, the text extracted so far
+is written to the job row every PROGRESS_INTERVAL_SECONDS, so a client
+polling the job shows it long before the whole image is read.
+
+Throttling, timeouts and other transient errors return the message to the
+queue, so the job is retried from the staged image until MAX_ATTEMPTS is
+reached. A retry is due after RETRY_DELAY_SECONDS per attempt so far rather
+than the queue's visibility timeout, keeping the job within the client's
+polling deadline. Jobs that already finished are skipped, so a redelivered
+message is harmless.
+"""
+
+import json
+import logging
+import time
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from handlers import clients, ocr
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+# Bedrock errors worth another attempt; anything else fails the job
+RETRYABLE_ERRORS = (
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    # The same errors when they interrupt a streamed response
+    "throttlingException",
+    "serviceUnavailableException",
+    "internalServerException",
+    "modelTimeoutException",
+    "modelStreamErrorException",
+)
+
+# Partial text is written to the job row at most this often while the model
+# streams; the first chunk is written at once
+PROGRESS_INTERVAL_SECONDS = 0.5
+
+# A failed attempt is retried after this many seconds times the attempts so
+# far. With the worker's 120 second timeout, MAX_ATTEMPTS attempts finish
+# within 3 * 120 + 10 + 20 = 390 seconds; ui/src/services/ocr.js polls for
+# JOB_TIMEOUT_MS = 7 minutes.
+RETRY_DELAY_SECONDS = 10
+
+
+def handler(event, context):
+    """SQS handler; failed messages are reported individually for retry."""
+    clients.invocation_started()
+    failures = []
+    for record in event.get("Records", []):
+        try:
+            process(record)
+        except Exception as e:
+            logger.error(f"OCR message {record.get('messageId')} will be retried: {str(e)}")
+            failures.append({"itemIdentifier": record["messageId"]})
+    metrics = clients.take_metrics()
+    if metrics:
+        logger.info(f"Client timings: {json.dumps(metrics)}")
+    return {"batchItemFailures": failures}
+
+
+def process(record):
+    """Run the job named by one queue message."""
+    job_id = json.loads(record["body"])["job_id"]
+    attempt = int(record.get("attributes", {}).get("ApproximateReceiveCount", "1"))
+
+    job = ocr.start_job(job_id)
+    if job is None:
+        logger.info(f"OCR job {job_id} is already finished or gone, skipping")
+        return
+
+    key = job.get("cache_key")
+    extracted_text = ocr.cached_text(key) if key else None
+    if extracted_text is not None:
+        logger.info(f"OCR job {job_id} answered from cache")
+        ocr.finish_job(job_id, "SUCCEEDED", text=extracted_text, cached=True)
+        return
+
+    logger.info(f"Running OCR job {job_id} (attempt {attempt}): media_type={job['media_type']}, size={job.get('size')} bytes")
+    try:
+        obj = ocr.s3.get_object(Bucket=ocr.OCR_BUCKET_NAME, Key=job["image_key"])
+        extracted_text = ocr.invoke_bedrock_vision(obj["Body"].read(), job["media_type"], on_text=progress_writer(job_id))
+    except Exception as e:
+        if is_retryable(e) and attempt < ocr.MAX_ATTEMPTS:
+            delay_retry(record, attempt)
+            raise
+        logger.error(f"OCR job {job_id} failed: {str(e)}", exc_info=True)
+        ocr.finish_job(job_id, "FAILED", error=f"OCR processing failed: {str(e)}")
+        return
+
+    logger.info(f"OCR job {job_id} succeeded, extracted {len(extracted_text)} chars")
+    if key:
+        ocr.cache_text(key, extracted_text)
+    ocr.finish_job(job_id, "SUCCEEDED", text=extracted_text, cached=False)
+
+
+def progress_writer(job_id):
+    """An `on_text` callback that records a job's partial text, throttled.
+
+    Progress is best effort: a failed write is logged and the job goes on.
+    """
+    written_at = None
+    running = True
+
+    def write(text):
+        nonlocal written_at, running
+        now = time.monotonic()
+        if not running or (written_at is not None and now - written_at < PROGRESS_INTERVAL_SECONDS):
+            return
+        written_at = now
+        try:
+            running = ocr.update_job_text(job_id, text)
+        except Exception as e:
+            logger.warning(f"Could not record progress of OCR job {job_id}: {str(e)}")
+
+    return write
+
+
+def delay_retry(record, attempt):
+    """Makes a failed message visible again after RETRY_DELAY_SECONDS * attempt.
+
+    Without it the retry waits out the queue's visibility timeout, which is
+    sized for the worker's timeout. Best effort: on failure it does just that.
+    """
+    if not ocr.QUEUE_URL:
+        return
+    try:
+        ocr.sqs.change_message_visibility(
+            QueueUrl=ocr.QUEUE_URL,
+            ReceiptHandle=record["receiptHandle"],
+            VisibilityTimeout=RETRY_DELAY_SECONDS * attempt,
+        )
+    except Exception as e:
+        logger.warning(f"Could not schedule the retry of OCR message {record.get('messageId')}: {str(e)}")
+
+
+def is_retryable(error):
+    """Whether a failed attempt may succeed when the job is run again."""
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERRORS
+    # Connection failures and read timeouts
+    return isinstance(error, BotoCoreError)
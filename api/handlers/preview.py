@@ -0,0 +1,205 @@
+"""Renders low-resolution SVG previews of memos for the project grid.
+
+Triggered by the memo table's DynamoDB stream. A preview is rendered when a
+header row's `etag` (the content hash) changes and is stored at a fixed key
+per memo, tagged with the etag it was rendered from, so replayed or unchanged
+records never render twice. Deleting a memo deletes its preview.
+"""
+
+from xml.sax.saxutils import escape, quoteattr
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+from handlers import clients, memo
+
+PREVIEW_CONTENT_TYPE = "image/svg+xml"
+PREVIEW_WIDTH = 320
+PREVIEW_HEIGHT = 180
+PREVIEW_PADDING = 8
+# Keeps previews of large canvases small; the lowest items are dropped first
+MAX_PREVIEW_ITEMS = 200
+MAX_PATH_POINTS = 64
+MAX_TEXT_LINES = 4
+MAX_LINE_CHARS = 40
+TEXT_FONT_SIZE = 14
+TEXT_LINE_HEIGHT = 18
+TEXT_HEADER_HEIGHT = 24
+
+_deserializer = TypeDeserializer()
+
+
+def handler(event, context):
+    clients.invocation_started()
+    for record in event.get("Records", []):
+        try:
+            _process(record)
+        except Exception as e:
+            # Previews are best effort; a failed one is rendered on the next save
+            print(f"Preview Error: {e}")
+    clients.print_metrics("Preview")
+
+
+def _process(record):
+    change = record["dynamodb"]
+    keys = _deserialize(change["Keys"])
+    user_id, memo_id = memo._owner(keys["user_id"]), keys["memo_id"]
+    if memo.ROW_SEPARATOR in memo_id:
+        return
+
+    if record["eventName"] == "REMOVE":
+        moved = memo.table.get_item(
+            Key=memo._key(user_id, memo_id), ProjectionExpression="memo_id", ConsistentRead=True
+        )
+        if "Item" in moved:
+            # The version 1 copy of a memo moved to its shard
+            return
+        memo.s3.delete_object(
+            Bucket=memo.ASSET_BUCKET_NAME, Key=memo._preview_key(user_id, memo_id)
+        )
+        return
+
+    etag = _deserialize(change.get("NewImage", {})).get("etag")
+    old_etag = _deserialize(change.get("OldImage", {})).get("etag")
+    if not etag or etag == old_etag or _rendered_etag(user_id, memo_id) == etag:
+        return
+
+    header, item_rows = memo._read_memo(user_id, memo_id, consistent=True)
+    if header is None or header.get("etag") != etag:
+        # Superseded; the newer write has its own stream record
+        return
+    content = memo._content_of(user_id, header, item_rows, resolve=False)
+    memo.s3.put_object(
+        Bucket=memo.ASSET_BUCKET_NAME,
+        Key=memo._preview_key(user_id, memo_id),
+        Body=render(content).encode("utf-8"),
+        ContentType=PREVIEW_CONTENT_TYPE,
+        CacheControl=f"private, max-age={memo.ASSET_URL_EXPIRES_IN}",
+        Metadata={"etag": etag},
+    )
+
+
+def render(content: str):
+    """Returns an SVG sketch of a canvas, or of the first lines of plain text."""
+    data = memo._load_canvas(content)
+    if data is None:
+        body = _text_lines(content, PREVIEW_PADDING, PREVIEW_PADDING, 1.0)
+    else:
+        items = [item for item in data["items"] if _bounds(item)]
+        items.sort(key=lambda item: _number(item.get("zIndex"), 1))
+        body = _render_items(items[-MAX_PREVIEW_ITEMS:])
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{PREVIEW_WIDTH}" '
+        f'height="{PREVIEW_HEIGHT}" viewBox="0 0 {PREVIEW_WIDTH} {PREVIEW_HEIGHT}">'
+        f'<rect width="100%" height="100%" fill="#f5f5f5"/>{body}</svg>'
+    )
+
+
+def _render_items(items):
+    if not items:
+        return ""
+    boxes = [_bounds(item) for item in items]
+    left = min(x for x, _, _, _ in boxes)
+    top = min(y for _, y, _, _ in boxes)
+    right = max(x + w for x, _, w, _ in boxes)
+    bottom = max(y + h for _, y, _, h in boxes)
+    # Fit the used area of the canvas, never enlarging it
+    scale = min(
+        (PREVIEW_WIDTH - 2 * PREVIEW_PADDING) / max(right - left, 1),
+        (PREVIEW_HEIGHT - 2 * PREVIEW_PADDING) / max(bottom - top, 1),
+        1.0,
+    )
+    offset_x = (PREVIEW_WIDTH - (right - left) * scale) / 2 - left * scale
+    offset_y = (PREVIEW_HEIGHT - (bottom - top) * scale) / 2 - top * scale
+
+    parts = []
+    for item, (x, y, w, h) in zip(items, boxes):
+        x, y, w, h = offset_x + x * scale, offset_y + y * scale, w * scale, h * scale
+        kind = item.get("type")
+        if kind == "image":
+            parts.append(_rect(x, y, w, h, "#cbd5e1", "#94a3b8"))
+        elif kind == "pen":
+            parts.append(_rect(x, y, w, h, "#ffffff", "#e2e8f0"))
+            parts.extend(_pen_paths(item, x, y, scale))
+        else:
+            parts.append(_rect(x, y, w, h, "#ffffff", "#e2e8f0"))
+            if isinstance(item.get("content"), str):
+                text_y = y + TEXT_HEADER_HEIGHT * scale
+                parts.append(_text_lines(item["content"], x + 6 * scale, text_y, scale))
+    return "".join(parts)
+
+
+def _pen_paths(item, x, y, scale):
+    for path in item.get("paths") or []:
+        if not isinstance(path, dict):
+            continue
+        points = [p for p in path.get("points") or [] if isinstance(p, dict)]
+        if len(points) < 2:
+            continue
+        step = -(-len(points) // MAX_PATH_POINTS)
+        sampled = points[::step] + ([points[-1]] if (len(points) - 1) % step else [])
+        coords = " ".join(
+            f"{x + _number(p.get('x')) * scale:.1f},{y + _number(p.get('y')) * scale:.1f}"
+            for p in sampled
+        )
+        color = path.get("color") or item.get("color") or "#333333"
+        width = max(_number(path.get("width") or item.get("strokeWidth"), 2) * scale, 0.5)
+        yield (
+            f'<polyline points="{coords}" fill="none" stroke={quoteattr(str(color))} '
+            f'stroke-width="{width:.1f}" stroke-linecap="round" stroke-linejoin="round"/>'
+        )
+
+
+def _text_lines(text: str, x: float, y: float, scale: float):
+    font_size = TEXT_FONT_SIZE * scale
+    if font_size < 3:
+        # Unreadable at this size; the item's box alone is shown
+        return ""
+    lines = [line[:MAX_LINE_CHARS] for line in text.splitlines() if line.strip()][:MAX_TEXT_LINES]
+    return "".join(
+        f'<text x="{x:.1f}" y="{y + (i + 1) * TEXT_LINE_HEIGHT * scale:.1f}" '
+        f'font-size="{font_size:.1f}" font-family="sans-serif" fill="#333333">'
+        f"{escape(line)}</text>"
+        for i, line in enumerate(lines)
+    )
+
+
+def _rect(x, y, w, h, fill, stroke):
+    return (
+        f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{h:.1f}" rx="2" '
+        f'fill="{fill}" stroke="{stroke}"/>'
+    )
+
+
+def _bounds(item):
+    """(x, y, width, height) of a canvas item, or None for anything else."""
+    if not isinstance(item, dict):
+        return None
+    return (
+        _number(item.get("x")),
+        _number(item.get("y")),
+        _number(item.get("width"), 200),
+        _number(item.get("height"), 100),
+    )
+
+
+def _number(value, default=0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return default
+    return float(value)
+
+
+def _rendered_etag(user_id: str, memo_id: str):
+    try:
+        resp = memo.s3.head_object(
+            Bucket=memo.ASSET_BUCKET_NAME, Key=memo._preview_key(user_id, memo_id)
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+            raise
+        return None
+    return resp.get("Metadata", {}).get("etag")
+
+
+def _deserialize(image):
+    return {name: _deserializer.deserialize(value) for name, value in image.items()}
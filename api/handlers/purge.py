@@ -0,0 +1,62 @@
+"""Purges what a deleted memo leaves behind once its tombstone expires.
+
+Triggered by the memo table's DynamoDB stream, filtered to REMOVE records.
+DELETE /memos/{memo_id} only tombstones the header (see memo._delete_memo);
+when the table's TTL removes it, this deletes the memo's item rows and
+revision history and subtracts its tokens from the search index. Failures
+are raised so the stream retries the batch.
+"""
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from handlers import clients, memo, revisions, search
+
+# userIdentity of stream records for items deleted by TTL
+TTL_PRINCIPAL = "dynamodb.amazonaws.com"
+
+_deserializer = TypeDeserializer()
+
+
+def handler(event, context):
+    clients.invocation_started()
+    for record in event.get("Records", []):
+        # Only TTL deletions; moves between key schemas also remove rows
+        if record["eventName"] == "REMOVE" and _expired(record):
+            _purge(record["dynamodb"])
+    clients.print_metrics("Purge")
+
+
+def _expired(record):
+    identity = record.get("userIdentity") or {}
+    return identity.get("type") == "Service" and identity.get("principalId") == TTL_PRINCIPAL
+
+
+def _purge(change):
+    old = {
+        name: _deserializer.deserialize(value)
+        for name, value in change.get("OldImage", {}).items()
+    }
+    user_id, memo_id = memo._owner(old.get("user_id", "")), old.get("memo_id")
+    if not memo_id or memo.ROW_SEPARATOR in memo_id or "deleted_at" not in old:
+        return
+
+    recreated = memo.table.get_item(
+        Key=memo._key(user_id, memo_id),
+        ProjectionExpression="memo_id",
+        ConsistentRead=True,
+    )
+    rows = {}
+    # A memo written again after expiring has already replaced the old rows
+    # (but not the old header's tokens), and its history starts after deleted_at
+    if "Item" not in recreated:
+        rows = memo._item_row_tokens(user_id, memo_id)
+        memo._delete_rows(user_id, rows)
+        revisions.delete_all(user_id, memo_id)
+    else:
+        revisions.delete_all(user_id, memo_id, before=old["deleted_at"])
+    search.apply(
+        user_id,
+        memo_id,
+        search.difference([old.get("tokens", set()), *rows.values()], []),
+    )
+    print(f"Purged {user_id}/{memo_id}: {len(rows)} item rows")
@@ -0,0 +1,250 @@
+"""Revision history of memos: periodic full snapshots plus item-level deltas.
+
+Revisions live in their own table, one partition per memo ("{user_id}#{memo_id}")
+with the memo `version` a write produced as the sort key. The memo handler
+records every write as a delta in PATCH op form ({"ops", "project", "order"})
+against the previous revision, or as a full `snapshot` when no delta applies
+(plain text, a memo's first write, a delta about as large as the content).
+Rebuilding a revision reads back to the nearest snapshot and replays the
+deltas after it.
+
+handlers/compactor.py consumes the table's stream: it adds a snapshot once
+the deltas since the last one grow too long, and trims the oldest revisions
+to the count and byte limits below. Bodies too large for an item go to S3.
+
+History is disabled when REVISION_TABLE_NAME is not set.
+"""
+
+import json
+import os
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Key
+
+from handlers import clients, codec
+
+TABLE_NAME = os.environ.get("REVISION_TABLE_NAME", "")
+table = clients.Lazy("table", TABLE_NAME)
+
+s3 = clients.Lazy("client", "s3")
+BUCKET_NAME = os.environ.get("ASSET_BUCKET_NAME", "")
+REVISION_PREFIX = "revisions/"
+# Larger encoded bodies are stored in S3; items are limited to 400 KB
+MAX_INLINE_BYTES = 300 * 1024
+
+# Snapshot after this many deltas, or once they add up to the last snapshot's size
+SNAPSHOT_EVERY = int(os.environ.get("REVISION_SNAPSHOT_EVERY", "25"))
+# Retention per memo. The newest snapshot and its deltas are always kept.
+MAX_REVISIONS = int(os.environ.get("REVISION_MAX_COUNT", "200"))
+MAX_REVISION_BYTES = int(os.environ.get("REVISION_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Attributes read when listing or planning; everything except the bodies
+METADATA_ATTRIBUTES = ("version", "created_at", "delta_bytes", "snapshot_bytes")
+
+
+def record(user_id: str, memo_id: str, version: int, delta=None, snapshot: str = None):
+    """Stores the revision `version` as a delta dict and/or a snapshot string.
+
+    Replaces any revision already stored under `version`, such as one left by
+    a purged memo that had the same id.
+    """
+    if not TABLE_NAME:
+        return
+    item = {
+        "memo": _memo_key(user_id, memo_id),
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    if delta is not None:
+        text = json.dumps(delta, ensure_ascii=False, separators=(",", ":"))
+        item.update(_body_fields(user_id, memo_id, version, "delta", text))
+    if snapshot is not None:
+        item.update(_body_fields(user_id, memo_id, version, "snapshot", snapshot))
+    table.put_item(Item=item)
+
+
+def add_snapshot(user_id: str, memo_id: str, version: int, snapshot: str):
+    """Adds a snapshot to a revision, creating the revision if needed."""
+    names = {"#created_at": "created_at"}
+    values = {":created_at": datetime.now(timezone.utc).isoformat()}
+    clauses = ["#created_at = if_not_exists(#created_at, :created_at)"]
+    fields = _body_fields(user_id, memo_id, version, "snapshot", snapshot)
+    for i, (attr, value) in enumerate(fields.items()):
+        names[f"#a{i}"] = attr
+        values[f":a{i}"] = value
+        clauses.append(f"#a{i} = :a{i}")
+    table.update_item(
+        Key={"memo": _memo_key(user_id, memo_id), "version": version},
+        UpdateExpression="SET " + ", ".join(clauses),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+    )
+
+
+def page(user_id: str, memo_id: str, limit: int, before: int = None):
+    """Returns (revision metadata, newest first, and the `before` of the next page)."""
+    condition = Key("memo").eq(_memo_key(user_id, memo_id))
+    if before is not None:
+        condition = condition & Key("version").lt(before)
+    resp = table.query(
+        KeyConditionExpression=condition,
+        ProjectionExpression=", ".join(f"#{name}" for name in METADATA_ATTRIBUTES),
+        ExpressionAttributeNames={f"#{name}": name for name in METADATA_ATTRIBUTES},
+        ScanIndexForward=False,
+        Limit=limit,
+    )
+    items = resp.get("Items", [])
+    if "LastEvaluatedKey" not in resp or not items:
+        return items, None
+    return items, int(items[-1]["version"])
+
+
+def chain(user_id: str, memo_id: str, version: int):
+    """Returns (snapshot, [(version, delta), ...]) to rebuild `version`, or None.
+
+    The deltas follow the snapshot oldest first. None when the revision does
+    not exist or no snapshot precedes it (revisions older than the first one).
+    """
+    kwargs = {
+        "KeyConditionExpression": Key("memo").eq(_memo_key(user_id, memo_id))
+        & Key("version").lte(version),
+        "ScanIndexForward": False,
+    }
+    deltas = []
+    first = True
+    while True:
+        resp = table.query(**kwargs)
+        for item in resp.get("Items", []):
+            if first and int(item["version"]) != version:
+                return None
+            first = False
+            if "snapshot_bytes" in item:
+                deltas.reverse()
+                return _body(item, "snapshot"), deltas
+            if "delta_bytes" in item:
+                deltas.append((int(item["version"]), json.loads(_body(item, "delta"))))
+        if "LastEvaluatedKey" not in resp:
+            return None
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def since_snapshot(user_id: str, memo_id: str, version: int):
+    """Returns (number of deltas, their bytes, the snapshot's bytes or None).
+
+    Counts back from `version` to the nearest snapshot.
+    """
+    kwargs = {
+        "KeyConditionExpression": Key("memo").eq(_memo_key(user_id, memo_id))
+        & Key("version").lte(version),
+        "ProjectionExpression": ", ".join(f"#{name}" for name in METADATA_ATTRIBUTES),
+        "ExpressionAttributeNames": {f"#{name}": name for name in METADATA_ATTRIBUTES},
+        "ScanIndexForward": False,
+    }
+    count = 0
+    size = 0
+    while True:
+        resp = table.query(**kwargs)
+        for item in resp.get("Items", []):
+            if "snapshot_bytes" in item:
+                return count, size, int(item["snapshot_bytes"])
+            count += 1
+            size += int(item.get("delta_bytes", 0))
+        if "LastEvaluatedKey" not in resp:
+            return count, size, None
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def trim(user_id: str, memo_id: str):
+    """Deletes the oldest revisions beyond the retention limits; returns how many.
+
+    Revisions go a snapshot and its deltas at a time, so every revision kept
+    can still be rebuilt. Revisions older than the first snapshot never could
+    and are always deleted.
+    """
+    revisions = _all_metadata(user_id, memo_id)
+    chains = []
+    orphans = []
+    for item in revisions:
+        if "snapshot_bytes" in item:
+            chains.append([item])
+        elif chains:
+            chains[-1].append(item)
+        else:
+            orphans.append(item)
+
+    count = sum(len(c) for c in chains)
+    size = sum(_stored_bytes(item) for c in chains for item in c)
+    dropped = list(orphans)
+    while len(chains) > 1 and (count > MAX_REVISIONS or size > MAX_REVISION_BYTES):
+        oldest = chains.pop(0)
+        count -= len(oldest)
+        size -= sum(_stored_bytes(item) for item in oldest)
+        dropped.extend(oldest)
+    _delete(user_id, memo_id, dropped)
+    return len(dropped)
+
+
+def delete_all(user_id: str, memo_id: str, before: str = None):
+    """Deletes a memo's history, or only the revisions created before `before`."""
+    if not TABLE_NAME:
+        return
+    items = _all_metadata(user_id, memo_id)
+    if before is not None:
+        items = [item for item in items if item.get("created_at", "") < before]
+    _delete(user_id, memo_id, items)
+
+
+def _body_fields(user_id: str, memo_id: str, version: int, kind: str, text: str):
+    """Attributes storing `text` as the revision's `kind` body, inline or in S3."""
+    encoded = codec.encode(text)
+    size = len(encoded) if isinstance(encoded, bytes) else len(encoded.encode("utf-8"))
+    if size <= MAX_INLINE_BYTES:
+        return {kind: encoded, f"{kind}_bytes": size}
+    key = f"{REVISION_PREFIX}{user_id}/{memo_id}/{version}.{kind}"
+    s3.put_object(Bucket=BUCKET_NAME, Key=key, Body=text.encode("utf-8"))
+    return {f"{kind}_key": key, f"{kind}_bytes": size}
+
+
+def _body(item, kind: str):
+    if f"{kind}_key" not in item:
+        return codec.decode(item.get(kind))
+    return s3.get_object(Bucket=BUCKET_NAME, Key=item[f"{kind}_key"])["Body"].read().decode("utf-8")
+
+
+def _all_metadata(user_id: str, memo_id: str):
+    """Every revision of the memo, oldest first, without bodies."""
+    names = {f"#{name}": name for name in (*METADATA_ATTRIBUTES, "delta_key", "snapshot_key")}
+    kwargs = {
+        "KeyConditionExpression": Key("memo").eq(_memo_key(user_id, memo_id)),
+        "ProjectionExpression": ", ".join(names),
+        "ExpressionAttributeNames": names,
+    }
+    items = []
+    while True:
+        resp = table.query(**kwargs)
+        items.extend(resp.get("Items", []))
+        if "LastEvaluatedKey" not in resp:
+            return items
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _stored_bytes(item):
+    return int(item.get("delta_bytes", 0)) + int(item.get("snapshot_bytes", 0))
+
+
+def _delete(user_id: str, memo_id: str, items):
+    if not items:
+        return
+    with table.batch_writer() as batch:
+        for item in items:
+            batch.delete_item(Key={"memo": _memo_key(user_id, memo_id), "version": item["version"]})
+    keys = [item[k] for item in items for k in ("delta_key", "snapshot_key") if k in item]
+    for start in range(0, len(keys), 1000):
+        s3.delete_objects(
+            Bucket=BUCKET_NAME,
+            Delete={"Objects": [{"Key": key} for key in keys[start : start + 1000]], "Quiet": True},
+        )
+
+
+def _memo_key(user_id: str, memo_id: str):
+    return f"{user_id}#{memo_id}"
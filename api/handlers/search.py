@@ -0,0 +1,166 @@
+"""Inverted index over memo text for GET /memos/search.
+
+Postings live in their own table, one partition per (user, token), with the
+sort key `memo_id` and a `count` of how many sources in that memo (the
+project name and each canvas item) contain the token. The memo handler
+stores each source's token set next to it and passes only the difference to
+`apply`, so a write costs one update per token that actually changed.
+
+Indexing is disabled when SEARCH_TABLE_NAME is not set.
+"""
+
+import os
+import re
+import unicodedata
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from handlers import clients
+
+TABLE_NAME = os.environ.get("SEARCH_TABLE_NAME", "")
+client = clients.Lazy("client", "dynamodb")
+
+# Hiragana, katakana (incl. the long vowel mark), CJK ideographs, hangul.
+# Runs of these have no word boundaries, so they are indexed as bigrams, and
+# as single characters so that one-character queries (common in Japanese,
+# e.g. 「猫」) match too. Queries look up bigrams only where they can.
+CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af"
+TOKEN_PATTERN = re.compile(f"([{CJK}]+)|((?:(?![{CJK}])[^\\W_])+)")
+
+MAX_TOKEN_LENGTH = 64
+# Bounds the index writes a single huge text item can cause
+MAX_TOKENS_PER_SOURCE = 1000
+MAX_QUERY_TOKENS = 8
+WRITE_CONCURRENCY = 16
+
+
+def tokenize(text: str):
+    """Returns the set of index tokens for `text`: words, and bigrams and characters of CJK runs."""
+    return _tokenize(text, unigrams=True)
+
+
+def query_tokens(query: str):
+    """Returns the tokens to look up for `query`: words, and bigrams of CJK runs.
+
+    A one-character CJK run is looked up as itself.
+    """
+    return _tokenize(query, unigrams=False)
+
+
+def _tokenize(text: str, unigrams: bool):
+    if not text:
+        return set()
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = set()
+    for match in TOKEN_PATTERN.finditer(text):
+        cjk, word = match.groups()
+        if word:
+            tokens.add(word[:MAX_TOKEN_LENGTH])
+        else:
+            if unigrams or len(cjk) == 1:
+                tokens.update(cjk)
+            tokens.update(cjk[i : i + 2] for i in range(len(cjk) - 1))
+        if len(tokens) >= MAX_TOKENS_PER_SOURCE:
+            break
+    return tokens
+
+
+def item_tokens(item):
+    """Tokens of a canvas item: text content and any OCR-derived text."""
+    if not isinstance(item, dict):
+        return set()
+    parts = []
+    if item.get("type") == "text" and isinstance(item.get("content"), str):
+        parts.append(item["content"])
+    if isinstance(item.get("ocrText"), str):
+        parts.append(item["ocrText"])
+    return tokenize("\n".join(parts))
+
+
+def difference(old_sources, new_sources):
+    """Posting count changes between two lists of per-source token sets."""
+    delta = Counter()
+    for tokens in new_sources:
+        delta.update(tokens)
+    for tokens in old_sources:
+        delta.subtract(tokens)
+    return {token: count for token, count in delta.items() if count}
+
+
+def apply(user_id: str, memo_id: str, delta):
+    """Adds `delta` ({token: change}) to the memo's postings."""
+    if not TABLE_NAME or not delta:
+        return
+    if len(delta) == 1:
+        _apply_one(user_id, memo_id, *next(iter(delta.items())))
+        return
+    with ThreadPoolExecutor(max_workers=min(WRITE_CONCURRENCY, len(delta))) as pool:
+        # list() re-raises the first failure
+        list(pool.map(lambda change: _apply_one(user_id, memo_id, *change), delta.items()))
+
+
+def lookup(user_id: str, query: str):
+    """Returns the ids of memos containing every token of `query`.
+
+    Raises ValueError when the query has no searchable characters. CJK
+    matches are on bigrams, so results can include memos where the bigrams
+    are not adjacent.
+    """
+    tokens = sorted(query_tokens(query), key=len, reverse=True)[:MAX_QUERY_TOKENS]
+    if not tokens:
+        raise ValueError("q has no searchable characters")
+    if not TABLE_NAME:
+        return set()
+
+    matches = None
+    for token in tokens:
+        memo_ids = set(_postings(user_id, token))
+        matches = memo_ids if matches is None else matches & memo_ids
+        if not matches:
+            return set()
+    return matches
+
+
+def _apply_one(user_id: str, memo_id: str, token: str, change: int):
+    key = {"token": {"S": _token_key(user_id, token)}, "memo_id": {"S": memo_id}}
+    resp = client.update_item(
+        TableName=TABLE_NAME,
+        Key=key,
+        UpdateExpression="ADD #count :change",
+        ExpressionAttributeNames={"#count": "count"},
+        ExpressionAttributeValues={":change": {"N": str(change)}},
+        ReturnValues="UPDATED_NEW",
+    )
+    if int(resp["Attributes"]["count"]["N"]) <= 0:
+        try:
+            client.delete_item(
+                TableName=TABLE_NAME,
+                Key=key,
+                ConditionExpression="#count <= :zero",
+                ExpressionAttributeNames={"#count": "count"},
+                ExpressionAttributeValues={":zero": {"N": "0"}},
+            )
+        except client.exceptions.ConditionalCheckFailedException:
+            # Re-added concurrently
+            pass
+
+
+def _postings(user_id: str, token: str):
+    kwargs = {
+        "TableName": TABLE_NAME,
+        "KeyConditionExpression": "#token = :token",
+        "ExpressionAttributeNames": {"#token": "token"},
+        "ExpressionAttributeValues": {":token": {"S": _token_key(user_id, token)}},
+        "ProjectionExpression": "memo_id",
+    }
+    while True:
+        resp = client.query(**kwargs)
+        for item in resp.get("Items", []):
+            yield item["memo_id"]["S"]
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def _token_key(user_id: str, token: str):
+    return f"{user_id}#{token}"
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Size and CPU benchmark for the memo storage codec (api/handlers/codec.py).
+
+Encodes synthetic canvases the way the memo handler stores them: one body per
+item row. Reports stored bytes, the write capacity units needed to save every
+row, and encode/decode time per canvas for each codec.
+
+Usage:
+    python bench/codec_bench.py [--items 10 100 1000] [--repeat 20]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from handlers import codec  # noqa: E402
+
+WORDS = ["買い物", "会議", "メモ", "アイデア", "締め切り", "TODO", "確認", "資料", "予定", "連絡"]
+
+
+def make_items(count: int, rng: random.Random):
+    """Roughly the item mix of a real canvas: mostly notes, some pen strokes and images."""
+    items = []
+    for i in range(count):
+        base = {
+            "id": f"{rng.getrandbits(128):032x}",
+            "x": rng.randint(0, 4000),
+            "y": rng.randint(0, 4000),
+            "width": 200,
+            "height": 100,
+            "zIndex": i + 1,
+        }
+        kind = rng.random()
+        if kind < 0.6:
+            text = "".join(rng.choice(WORDS) for _ in range(rng.randint(3, 60)))
+            items.append({**base, "type": "text", "content": text})
+        elif kind < 0.9:
+            paths = []
+            for _ in range(rng.randint(1, 5)):
+                x, y = rng.uniform(0, 200), rng.uniform(0, 100)
+                points = []
+                for _ in range(rng.randint(20, 300)):
+                    x += rng.uniform(-3, 3)
+                    y += rng.uniform(-3, 3)
+                    points.append({"x": round(x, 1), "y": round(y, 1)})
+                paths.append({"points": points, "color": "#333333", "width": 2})
+            items.append({**base, "type": "pen", "paths": paths, "color": "#333333", "strokeWidth": 2})
+        else:
+            items.append({**base, "type": "image", "assetId": f"{rng.getrandbits(256):064x}"})
+    return items
+
+
+def dumps(item):
+    return json.dumps(item, ensure_ascii=False, separators=(",", ":"))
+
+
+def measure(bodies, codec_name: str, repeat: int):
+    encoded = [codec.encode(body, codec_name) for body in bodies]
+    sizes = [len(v) if isinstance(v, bytes) else len(v.encode("utf-8")) for v in encoded]
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for body in bodies:
+            codec.encode(body, codec_name)
+    encode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for value in encoded:
+            codec.decode(value)
+    decode_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    return {
+        "bytes": sum(sizes),
+        "wcu": sum(max(1, math.ceil(size / 1024)) for size in sizes),
+        "encode_ms": encode_ms,
+        "decode_ms": decode_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    codecs = ["none", "zlib"] + (["zstd"] if codec.zstandard is not None else [])
+    print(f"{'items':>6} {'codec':>5} {'bytes':>10} {'ratio':>6} {'WCU':>6} {'enc ms':>8} {'dec ms':>8}")
+    for count in args.items:
+        bodies = [dumps(item) for item in make_items(count, random.Random(args.seed))]
+        baseline = None
+        for name in codecs:
+            result = measure(bodies, name, args.repeat)
+            baseline = baseline or result["bytes"]
+            print(
+                f"{count:>6} {name:>5} {result['bytes']:>10} {result['bytes'] / baseline:>6.2f} "
+                f"{result['wcu']:>6} {result['encode_ms']:>8.2f} {result['decode_ms']:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
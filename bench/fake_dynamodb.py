@@ -0,0 +1,1077 @@
+"""In-process DynamoDB stand-in for benchmarking the handlers offline.
+
+Requests are intercepted through botocore's ``before-send`` hook after boto3
+has serialized them, so the real resource layer (condition builders, type
+serializers, ``batch_writer``, retries) runs unchanged and only the network
+hop is replaced. The module-level clients the handlers bind at import time
+are routed here with ``FakeDynamoDB.attach``:
+
+    fake = FakeDynamoDB(latency=0.005)
+    fake.create_table(memo.TABLE_NAME, "user_id", "memo_id")
+    fake.attach(memo.dynamodb.meta.client)
+
+Supported: GetItem, PutItem, UpdateItem, DeleteItem, Query, Scan,
+BatchGetItem, BatchWriteItem and TransactWriteItems with condition, key,
+filter, projection and update expressions, ReturnValues, global secondary
+indexes, the 400 KB item and 1 MB page limits, and batch and transaction
+sizes. Consumed capacity is tracked per partition and second; ``latency``
+delays every call and ``throttle_rate`` / ``enforce_partition_limits``
+produce the throughput errors (and unprocessed batch items) real tables
+return. TTL expiry and streams are not simulated.
+"""
+
+import base64
+import json
+import math
+import random
+import re
+import threading
+import time
+from decimal import Decimal
+
+from botocore.awsrequest import AWSResponse
+
+ITEM_SIZE_LIMIT = 400 * 1024
+QUERY_PAGE_LIMIT = 1024 * 1024
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+TRANSACT_LIMIT = 100
+PARTITION_WCU_PER_SECOND = 1000
+PARTITION_RCU_PER_SECOND = 3000
+
+
+class DynamoError(Exception):
+    def __init__(self, code, message, status=400, extra=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.extra = extra or {}
+
+
+def _validation(message):
+    return DynamoError("ValidationException", message)
+
+
+# ---------------------------------------------------------------------------
+# Typed values
+# ---------------------------------------------------------------------------
+
+
+def _value_size(value):
+    (kind, raw), = value.items()
+    if kind == "S":
+        return len(raw.encode("utf-8"))
+    if kind == "N":
+        return 1 + math.ceil(len(raw.lstrip("-").replace(".", "")) / 2)
+    if kind == "B":
+        return len(base64.b64decode(raw))
+    if kind == "BOOL" or kind == "NULL":
+        return 1
+    if kind == "SS":
+        return sum(len(v.encode("utf-8")) for v in raw)
+    if kind == "NS":
+        return sum(_value_size({"N": v}) for v in raw)
+    if kind == "BS":
+        return sum(len(base64.b64decode(v)) for v in raw)
+    if kind == "L":
+        return 3 + sum(1 + _value_size(v) for v in raw)
+    if kind == "M":
+        return 3 + sum(len(k.encode("utf-8")) + 1 + _value_size(v) for k, v in raw.items())
+    raise _validation(f"Unknown attribute type {kind}")
+
+
+def item_size(item):
+    if not item:
+        return 0
+    return sum(len(k.encode("utf-8")) + _value_size(v) for k, v in item.items())
+
+
+def _comparable(value):
+    (kind, raw), = value.items()
+    if kind == "N":
+        return kind, Decimal(raw)
+    if kind == "B":
+        return kind, base64.b64decode(raw)
+    if kind in ("SS", "NS", "BS"):
+        return kind, frozenset(raw)
+    if kind == "L":
+        return kind, tuple(_comparable(v) for v in raw)
+    if kind == "M":
+        return kind, tuple(sorted((k, _comparable(v)) for k, v in raw.items()))
+    return kind, raw
+
+
+def _values_equal(a, b):
+    if a is None or b is None:
+        return False
+    return _comparable(a) == _comparable(b)
+
+
+def _compare(a, b, op):
+    if a is None or b is None:
+        return False
+    ka, va = _comparable(a)
+    kb, vb = _comparable(b)
+    if op == "=":
+        return (ka, va) == (kb, vb)
+    if op == "<>":
+        return (ka, va) != (kb, vb)
+    if ka != kb or ka not in ("S", "N", "B"):
+        return False
+    if op == "<":
+        return va < vb
+    if op == "<=":
+        return va <= vb
+    if op == ">":
+        return va > vb
+    if op == ">=":
+        return va >= vb
+    raise _validation(f"Unknown comparator {op}")
+
+
+# ---------------------------------------------------------------------------
+# Expression parsing
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(
+    r"\s*(?:(?P<num>\d+)|(?P<name>#[A-Za-z0-9_]+|[A-Za-z_][A-Za-z0-9_]*)"
+    r"|(?P<value>:[A-Za-z0-9_]+)|(?P<op><>|<=|>=|[=<>(),.\[\]+-]))"
+)
+_KEYWORDS = {"AND", "OR", "NOT", "BETWEEN", "IN", "SET", "REMOVE", "ADD", "DELETE"}
+
+
+def _tokenize(expression):
+    tokens = []
+    pos = 0
+    expression = expression or ""
+    while pos < len(expression):
+        if expression[pos:].strip() == "":
+            break
+        match = _TOKEN_RE.match(expression, pos)
+        if not match:
+            raise _validation(f"Invalid expression near: {expression[pos:pos + 20]!r}")
+        pos = match.end()
+        for kind in ("num", "name", "value", "op"):
+            text = match.group(kind)
+            if text is not None:
+                if kind == "name" and text.upper() in _KEYWORDS:
+                    tokens.append(("kw", text.upper()))
+                else:
+                    tokens.append((kind, text))
+                break
+    return tokens
+
+
+class _Parser:
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.pos = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.pos + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, kind=None, text=None):
+        token = self.peek()
+        if token[0] is None or (kind and token[0] != kind) or (text and token[1] != text):
+            raise _validation(f"Syntax error in expression at token {token[1]!r}")
+        self.pos += 1
+        return token
+
+    def accept(self, kind, text=None):
+        token = self.peek()
+        if token[0] == kind and (text is None or token[1] == text):
+            self.pos += 1
+            return True
+        return False
+
+    def done(self):
+        return self.pos >= len(self.tokens)
+
+    # Paths -----------------------------------------------------------------
+
+    def _name(self, text):
+        if text.startswith("#"):
+            if text not in self.names:
+                raise _validation(f"Undefined expression attribute name {text}")
+            return self.names[text]
+        return text
+
+    def path(self):
+        _, text = self.take("name")
+        parts = [self._name(text)]
+        while True:
+            if self.accept("op", "."):
+                parts.append(self._name(self.take("name")[1]))
+            elif self.accept("op", "["):
+                parts.append(int(self.take("num")[1]))
+                self.take("op", "]")
+            else:
+                return tuple(parts)
+
+    def value_ref(self):
+        _, text = self.take("value")
+        if text not in self.values:
+            raise _validation(f"Undefined expression attribute value {text}")
+        return ("value", self.values[text])
+
+    # Conditions ------------------------------------------------------------
+
+    def condition(self):
+        node = self._and()
+        while self.accept("kw", "OR"):
+            node = ("or", node, self._and())
+        return node
+
+    def _and(self):
+        node = self._not()
+        while self.accept("kw", "AND"):
+            node = ("and", node, self._not())
+        return node
+
+    def _not(self):
+        if self.accept("kw", "NOT"):
+            return ("not", self._not())
+        return self._predicate()
+
+    def _predicate(self):
+        kind, text = self.peek()
+        if kind == "op" and text == "(":
+            self.take()
+            node = self.condition()
+            self.take("op", ")")
+            return node
+        if kind == "name" and self.peek(1) == ("op", "(") and text in (
+            "attribute_exists",
+            "attribute_not_exists",
+            "attribute_type",
+            "begins_with",
+            "contains",
+        ):
+            self.take()
+            self.take("op", "(")
+            args = [self.operand()]
+            while self.accept("op", ","):
+                args.append(self.operand())
+            self.take("op", ")")
+            return ("func", text, args)
+        left = self.operand()
+        if self.accept("kw", "BETWEEN"):
+            low = self.operand()
+            self.take("kw", "AND")
+            high = self.operand()
+            return ("between", left, low, high)
+        if self.accept("kw", "IN"):
+            self.take("op", "(")
+            options = [self.operand()]
+            while self.accept("op", ","):
+                options.append(self.operand())
+            self.take("op", ")")
+            return ("in", left, options)
+        _, comparator = self.take("op")
+        if comparator not in ("=", "<>", "<", "<=", ">", ">="):
+            raise _validation(f"Invalid comparator {comparator}")
+        return ("cmp", comparator, left, self.operand())
+
+    def operand(self):
+        kind, text = self.peek()
+        if kind == "value":
+            return self.value_ref()
+        if kind == "name" and text == "size" and self.peek(1) == ("op", "("):
+            self.take()
+            self.take("op", "(")
+            path = self.path()
+            self.take("op", ")")
+            return ("size", path)
+        return ("path", self.path())
+
+    # Updates ---------------------------------------------------------------
+
+    def update(self):
+        actions = []
+        while not self.done():
+            _, clause = self.take("kw")
+            while True:
+                if clause == "SET":
+                    path = self.path()
+                    self.take("op", "=")
+                    actions.append(("SET", path, self._set_value()))
+                elif clause == "REMOVE":
+                    actions.append(("REMOVE", self.path(), None))
+                elif clause in ("ADD", "DELETE"):
+                    path = self.path()
+                    actions.append((clause, path, self.value_ref()))
+                else:
+                    raise _validation(f"Unknown update clause {clause}")
+                if not self.accept("op", ","):
+                    break
+        return actions
+
+    def _set_value(self):
+        node = self._set_operand()
+        kind, text = self.peek()
+        if kind == "op" and text in ("+", "-"):
+            self.take()
+            return ("arith", text, node, self._set_operand())
+        return node
+
+    def _set_operand(self):
+        kind, text = self.peek()
+        if kind == "name" and text in ("if_not_exists", "list_append") and self.peek(1) == ("op", "("):
+            self.take()
+            self.take("op", "(")
+            first = self._set_operand() if text == "list_append" else ("path", self.path())
+            self.take("op", ",")
+            second = self._set_value()
+            self.take("op", ")")
+            return (text, first, second)
+        if kind == "value":
+            return self.value_ref()
+        return ("path", self.path())
+
+    def projection(self):
+        paths = [self.path()]
+        while self.accept("op", ","):
+            paths.append(self.path())
+        return paths
+
+
+def _resolve(item, path):
+    current = {"M": item}
+    for part in path:
+        if isinstance(part, int):
+            if "L" not in current or part >= len(current["L"]):
+                return None
+            current = current["L"][part]
+        else:
+            if "M" not in current or part not in current["M"]:
+                return None
+            current = current["M"][part]
+    return current
+
+
+def _operand_value(item, node):
+    kind = node[0]
+    if kind == "value":
+        return node[1]
+    if kind == "path":
+        return _resolve(item, node[1])
+    if kind == "size":
+        value = _resolve(item, node[1])
+        if value is None:
+            return None
+        (vkind, raw), = value.items()
+        if vkind == "S":
+            return {"N": str(len(raw.encode("utf-8")))}
+        if vkind == "B":
+            return {"N": str(len(base64.b64decode(raw)))}
+        return {"N": str(len(raw))}
+    raise _validation(f"Unknown operand {kind}")
+
+
+def _evaluate(item, node):
+    if node is None:
+        return True
+    kind = node[0]
+    if kind == "or":
+        return _evaluate(item, node[1]) or _evaluate(item, node[2])
+    if kind == "and":
+        return _evaluate(item, node[1]) and _evaluate(item, node[2])
+    if kind == "not":
+        return not _evaluate(item, node[1])
+    if kind == "cmp":
+        return _compare(_operand_value(item, node[2]), _operand_value(item, node[3]), node[1])
+    if kind == "between":
+        value = _operand_value(item, node[1])
+        return _compare(value, _operand_value(item, node[2]), ">=") and _compare(
+            value, _operand_value(item, node[3]), "<="
+        )
+    if kind == "in":
+        value = _operand_value(item, node[1])
+        return any(_values_equal(value, _operand_value(item, o)) for o in node[2])
+    if kind == "func":
+        name, args = node[1], node[2]
+        value = _operand_value(item, args[0])
+        if name == "attribute_exists":
+            return value is not None
+        if name == "attribute_not_exists":
+            return value is None
+        if name == "attribute_type":
+            expected = _operand_value(item, args[1])
+            return value is not None and next(iter(value)) == expected["S"]
+        if value is None:
+            return False
+        other = _operand_value(item, args[1])
+        (vkind, raw), = value.items()
+        (okind, oraw), = other.items()
+        if name == "begins_with":
+            if vkind == "B" and okind == "B":
+                return base64.b64decode(raw).startswith(base64.b64decode(oraw))
+            return vkind == "S" and okind == "S" and raw.startswith(oraw)
+        if name == "contains":
+            if vkind == "S" and okind == "S":
+                return oraw in raw
+            if vkind in ("SS", "NS", "BS"):
+                return oraw in raw
+            if vkind == "L":
+                return any(_values_equal(v, other) for v in raw)
+            return False
+    raise _validation(f"Unknown condition node {kind}")
+
+
+def _set_path(item, path, value):
+    container = {"M": item}
+    for part in path[:-1]:
+        if isinstance(part, int):
+            container = container["L"][part]
+        else:
+            if "M" not in container or part not in container["M"]:
+                raise _validation("The document path provided in the update expression is invalid for update")
+            container = container["M"][part]
+    last = path[-1]
+    if isinstance(last, int):
+        values = container.get("L")
+        if values is None:
+            raise _validation("The document path provided in the update expression is invalid for update")
+        if last >= len(values):
+            values.append(value)
+        else:
+            values[last] = value
+    else:
+        if "M" not in container:
+            raise _validation("The document path provided in the update expression is invalid for update")
+        container["M"][last] = value
+
+
+def _remove_path(item, path):
+    container = {"M": item}
+    for part in path[:-1]:
+        container = _resolve(container["M"] if "M" in container else {}, (part,)) if not isinstance(part, int) else container["L"][part]
+        if container is None:
+            return
+    last = path[-1]
+    if isinstance(last, int):
+        if "L" in container and last < len(container["L"]):
+            del container["L"][last]
+    elif "M" in container:
+        container["M"].pop(last, None)
+
+
+def _update_value(item, node):
+    kind = node[0]
+    if kind in ("value", "path"):
+        value = _operand_value(item, node)
+        if value is None:
+            raise _validation("The provided expression refers to an attribute that does not exist in the item")
+        return value
+    if kind == "if_not_exists":
+        existing = _resolve(item, node[1][1])
+        return existing if existing is not None else _update_value(item, node[2])
+    if kind == "list_append":
+        first = _update_value(item, node[1])
+        second = _update_value(item, node[2])
+        return {"L": list(first["L"]) + list(second["L"])}
+    if kind == "arith":
+        left = _update_value(item, node[2])
+        right = _update_value(item, node[3])
+        if "N" not in left or "N" not in right:
+            raise _validation("An operand in the update expression has an incorrect data type")
+        a, b = Decimal(left["N"]), Decimal(right["N"])
+        return {"N": str(a + b if node[1] == "+" else a - b)}
+    raise _validation(f"Unknown update operand {kind}")
+
+
+def _apply_update(item, actions):
+    for action, path, node in actions:
+        if action == "SET":
+            _set_path(item, path, json.loads(json.dumps(_update_value(item, node))))
+        elif action == "REMOVE":
+            _remove_path(item, path)
+        elif action == "ADD":
+            operand = node[1]
+            existing = _resolve(item, path)
+            (kind, raw), = operand.items()
+            if kind == "N":
+                base = Decimal(existing["N"]) if existing else Decimal(0)
+                _set_path(item, path, {"N": str(base + Decimal(raw))})
+            elif kind in ("SS", "NS", "BS"):
+                merged = set(existing[kind]) if existing else set()
+                merged.update(raw)
+                _set_path(item, path, {kind: sorted(merged)})
+            else:
+                raise _validation("Incorrect operand type for operator or function; operator: ADD")
+        elif action == "DELETE":
+            existing = _resolve(item, path)
+            if existing is None:
+                continue
+            (kind, raw), = node[1].items()
+            remaining = [v for v in existing.get(kind, []) if v not in raw]
+            if remaining:
+                _set_path(item, path, {kind: remaining})
+            else:
+                _remove_path(item, path)
+
+
+def _project(item, paths):
+    if not paths:
+        return item
+    projected = {}
+    for path in paths:
+        value = _resolve(item, path)
+        if value is None:
+            continue
+        if len(path) == 1:
+            projected[path[0]] = value
+        else:
+            # Nested projections are rebuilt as sparse maps/lists.
+            target = projected
+            source = item
+            for index, part in enumerate(path):
+                last = index == len(path) - 1
+                node = source[part] if isinstance(source, dict) else source[part]
+                if last:
+                    target[part] = node
+                    break
+                kind = "M" if "M" in node else "L"
+                if part not in target:
+                    target[part] = {kind: {} if kind == "M" else []}
+                if kind == "L":
+                    target[part][kind] = [{"NULL": True}] * len(node["L"])
+                target = target[part][kind]
+                source = node[kind]
+    return projected
+
+
+# ---------------------------------------------------------------------------
+# Tables
+# ---------------------------------------------------------------------------
+
+
+class _Index:
+    def __init__(self, name, hash_key, range_key=None, projection=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.projection = projection or {"ProjectionType": "ALL"}
+
+    def project(self, item, table):
+        kind = self.projection.get("ProjectionType", "ALL")
+        if kind == "ALL":
+            return item
+        keep = {table.hash_key, table.range_key, self.hash_key, self.range_key}
+        if kind == "INCLUDE":
+            keep.update(self.projection.get("NonKeyAttributes", []))
+        return {k: v for k, v in item.items() if k in keep}
+
+
+class FakeTable:
+    def __init__(self, name, hash_key, range_key=None, indexes=None):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = {index.name: index for index in indexes or []}
+        self.items = {}
+        # {serialized hash key: {key: item}}, so a query reads one partition
+        self.partitions = {}
+
+    def put(self, key, item):
+        self.items[key] = item
+        self.partitions.setdefault(key[0][1], {})[key] = item
+
+    def pop(self, key):
+        item = self.items.pop(key, None)
+        partition = self.partitions.get(key[0][1])
+        if partition is not None:
+            partition.pop(key, None)
+            if not partition:
+                del self.partitions[key[0][1]]
+        return item
+
+    def key_of(self, item):
+        hash_value = item.get(self.hash_key)
+        if hash_value is None:
+            raise _validation("One of the required keys was not given a value")
+        key = [(self.hash_key, hash_value)]
+        if self.range_key:
+            range_value = item.get(self.range_key)
+            if range_value is None:
+                raise _validation("One of the required keys was not given a value")
+            key.append((self.range_key, range_value))
+        return tuple((name, json.dumps(value, sort_keys=True)) for name, value in key)
+
+    def key_dict(self, item):
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def validate_key(self, key):
+        expected = {self.hash_key} | ({self.range_key} if self.range_key else set())
+        if set(key) != expected:
+            raise _validation("The provided key element does not match the schema")
+
+
+# ---------------------------------------------------------------------------
+# Service
+# ---------------------------------------------------------------------------
+
+
+class FakeDynamoDB:
+    """A DynamoDB-compatible engine that plugs into a boto3 session.
+
+    ``latency`` adds a fixed per-call delay in seconds. ``throttle_rate`` is
+    the probability of rejecting a call with a throughput error, and
+    ``enforce_partition_limits`` throttles once a partition exceeds the
+    per-second WCU/RCU limits of a real partition.
+    """
+
+    def __init__(self, latency=0.0, throttle_rate=0.0, enforce_partition_limits=False, seed=None):
+        self.tables = {}
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.enforce_partition_limits = enforce_partition_limits
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.calls = []
+        self.partition_usage = {}
+        self.consumed = {"read": 0.0, "write": 0.0}
+
+    # Setup -----------------------------------------------------------------
+
+    def create_table(self, name, hash_key, range_key=None, indexes=None):
+        """Creates a table; `indexes` are dicts of `_Index` arguments (GSIs)."""
+        table = FakeTable(name, hash_key, range_key, [_Index(**spec) for spec in indexes or []])
+        self.tables[name] = table
+        return table
+
+    def attach(self, client):
+        """Route every call made by ``client`` (or ``resource.meta.client``)."""
+        client.meta.events.register("before-send.dynamodb", self._on_send)
+        return client
+
+    def reset_metrics(self):
+        self.calls = []
+        self.partition_usage = {}
+        self.consumed = {"read": 0.0, "write": 0.0}
+
+    # Transport -------------------------------------------------------------
+
+    def _on_send(self, request, **kwargs):
+        target = request.headers["X-Amz-Target"]
+        if isinstance(target, bytes):
+            target = target.decode()
+        operation = target.split(".", 1)[1]
+        body = request.body
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        params = json.loads(body or "{}")
+        if self.latency:
+            time.sleep(self.latency)
+        status = 200
+        try:
+            with self.lock:
+                if self.throttle_rate and self.random.random() < self.throttle_rate:
+                    raise DynamoError(
+                        "ProvisionedThroughputExceededException",
+                        "The level of configured provisioned throughput for the table was exceeded.",
+                    )
+                handler = getattr(self, f"_op_{operation}", None)
+                if handler is None:
+                    raise DynamoError("UnknownOperationException", f"Unsupported operation {operation}")
+                result = handler(params)
+        except DynamoError as error:
+            status = error.status
+            result = {"__type": f"com.amazonaws.dynamodb.v20120810#{error.code}", "message": error.message}
+            result.update(error.extra)
+        payload = json.dumps(result).encode("utf-8")
+        self.calls.append(
+            {
+                "operation": operation,
+                "status": status,
+                "request_bytes": len(body or ""),
+                "response_bytes": len(payload),
+            }
+        )
+        response = AWSResponse(request.url, status, {"Content-Type": "application/x-amz-json-1.0"}, None)
+        response._content = payload
+        return response
+
+    # Capacity --------------------------------------------------------------
+
+    def _charge(self, table, key_item, size, write, consistent=False):
+        units = max(1, math.ceil(size / 1024)) if write else max(1, math.ceil(size / 4096))
+        if not write and not consistent:
+            units = units / 2
+        self.consumed["write" if write else "read"] += units
+        partition = (table.name, json.dumps(key_item.get(table.hash_key), sort_keys=True))
+        second = int(time.monotonic())
+        usage = self.partition_usage.setdefault(partition, {})
+        bucket = usage.setdefault(second, {"read": 0.0, "write": 0.0})
+        bucket["write" if write else "read"] += units
+        if self.enforce_partition_limits:
+            limit = PARTITION_WCU_PER_SECOND if write else PARTITION_RCU_PER_SECOND
+            if bucket["write" if write else "read"] > limit:
+                raise DynamoError(
+                    "ProvisionedThroughputExceededException",
+                    "The level of configured provisioned throughput for the table was exceeded.",
+                )
+        return units
+
+    @staticmethod
+    def _capacity(params, table, units):
+        if params.get("ReturnConsumedCapacity") in ("TOTAL", "INDEXES"):
+            return {"ConsumedCapacity": {"TableName": table.name, "CapacityUnits": units}}
+        return {}
+
+    # Helpers ---------------------------------------------------------------
+
+    def _table(self, name):
+        table = self.tables.get(name)
+        if table is None:
+            raise DynamoError("ResourceNotFoundException", "Requested resource not found")
+        return table
+
+    @staticmethod
+    def _condition(params, key="ConditionExpression"):
+        expression = params.get(key)
+        if not expression:
+            return None
+        parser = _Parser(
+            expression,
+            params.get("ExpressionAttributeNames"),
+            params.get("ExpressionAttributeValues"),
+        )
+        node = parser.condition()
+        if not parser.done():
+            raise _validation(f"Syntax error in {key}")
+        return node
+
+    @staticmethod
+    def _projection(params):
+        expression = params.get("ProjectionExpression")
+        if not expression:
+            return None
+        return _Parser(expression, params.get("ExpressionAttributeNames"), {}).projection()
+
+    def _check(self, params, item, old_values=False):
+        node = self._condition(params)
+        if node is not None and not _evaluate(item or {}, node):
+            extra = {}
+            if old_values and item and params.get("ReturnValuesOnConditionCheckFailure") == "ALL_OLD":
+                extra = {"Item": item}
+            raise DynamoError(
+                "ConditionalCheckFailedException",
+                "The conditional request failed",
+                extra=extra,
+            )
+
+    @staticmethod
+    def _check_size(item):
+        if item_size(item) > ITEM_SIZE_LIMIT:
+            raise _validation("Item size has exceeded the maximum allowed size")
+
+    # Item operations -------------------------------------------------------
+
+    def _op_GetItem(self, params):
+        table = self._table(params["TableName"])
+        table.validate_key(params["Key"])
+        item = table.items.get(table.key_of(params["Key"]))
+        units = self._charge(table, params["Key"], item_size(item), False, params.get("ConsistentRead", False))
+        result = self._capacity(params, table, units)
+        if item is not None:
+            result["Item"] = _project(item, self._projection(params))
+        return result
+
+    def _op_PutItem(self, params):
+        table = self._table(params["TableName"])
+        item = params["Item"]
+        self._check_size(item)
+        key = table.key_of(item)
+        old = table.items.get(key)
+        self._check(params, old, old_values=True)
+        units = self._charge(table, item, max(item_size(item), item_size(old)), True)
+        table.put(key, item)
+        result = self._capacity(params, table, units)
+        if params.get("ReturnValues") == "ALL_OLD" and old is not None:
+            result["Attributes"] = old
+        return result
+
+    def _op_DeleteItem(self, params):
+        table = self._table(params["TableName"])
+        table.validate_key(params["Key"])
+        key = table.key_of(params["Key"])
+        old = table.items.get(key)
+        self._check(params, old, old_values=True)
+        units = self._charge(table, params["Key"], item_size(old), True)
+        table.pop(key)
+        result = self._capacity(params, table, units)
+        if params.get("ReturnValues") == "ALL_OLD" and old is not None:
+            result["Attributes"] = old
+        return result
+
+    def _op_UpdateItem(self, params):
+        table = self._table(params["TableName"])
+        table.validate_key(params["Key"])
+        key = table.key_of(params["Key"])
+        old = table.items.get(key)
+        self._check(params, old, old_values=True)
+        new = json.loads(json.dumps(old)) if old is not None else dict(params["Key"])
+        expression = params.get("UpdateExpression")
+        targeted = set()
+        if expression:
+            parser = _Parser(
+                expression,
+                params.get("ExpressionAttributeNames"),
+                params.get("ExpressionAttributeValues"),
+            )
+            actions = parser.update()
+            for _, path, _ in actions:
+                if path[0] in (table.hash_key, table.range_key):
+                    raise _validation("Cannot update attribute; this attribute is part of the key")
+            targeted = {path[0] for _, path, _ in actions}
+            _apply_update(new, actions)
+        self._check_size(new)
+        units = self._charge(table, params["Key"], max(item_size(new), item_size(old)), True)
+        table.put(key, new)
+        result = self._capacity(params, table, units)
+        mode = params.get("ReturnValues", "NONE")
+        if mode == "ALL_NEW":
+            result["Attributes"] = new
+        elif mode == "ALL_OLD" and old is not None:
+            result["Attributes"] = old
+        elif mode in ("UPDATED_NEW", "UPDATED_OLD"):
+            # Every attribute the expression targets, whether or not its value changed
+            source = new if mode == "UPDATED_NEW" else (old or {})
+            result["Attributes"] = {k: v for k, v in source.items() if k in targeted}
+        return result
+
+    # Query / scan ----------------------------------------------------------
+
+    def _op_Query(self, params):
+        table = self._table(params["TableName"])
+        index = None
+        hash_key, range_key = table.hash_key, table.range_key
+        if params.get("IndexName"):
+            index = table.indexes.get(params["IndexName"])
+            if index is None:
+                raise _validation("The table does not have the specified index")
+            hash_key, range_key = index.hash_key, index.range_key
+        key_node = self._condition(params, "KeyConditionExpression")
+        if key_node is None:
+            raise _validation("Either the KeyConditions or KeyConditionExpression parameter must be specified")
+        hash_value = _hash_value(key_node, hash_key)
+        if hash_value is None:
+            raise _validation("Query condition missed key schema element")
+        if index is None:
+            scope = table.partitions.get(json.dumps(hash_value, sort_keys=True), {}).values()
+        else:
+            scope = table.items.values()
+        candidates = [
+            item
+            for item in scope
+            if hash_key in item and (range_key is None or range_key in item) and _evaluate(item, key_node)
+        ]
+        return self._page(params, table, index, candidates, range_key)
+
+    def _op_Scan(self, params):
+        table = self._table(params["TableName"])
+        index = table.indexes.get(params["IndexName"]) if params.get("IndexName") else None
+        candidates = list(table.items.values())
+        if index is not None:
+            candidates = [i for i in candidates if index.hash_key in i]
+        return self._page(params, table, index, candidates, None, scan=True)
+
+    def _page(self, params, table, index, candidates, range_key, scan=False):
+        def sort_key(item):
+            parts = []
+            if range_key:
+                parts.append(_comparable(item[range_key]))
+            parts.append(_comparable(item[table.hash_key]))
+            if table.range_key:
+                parts.append(_comparable(item[table.range_key]))
+            return parts
+
+        candidates.sort(key=sort_key, reverse=not params.get("ScanIndexForward", True) and not scan)
+        start = params.get("ExclusiveStartKey")
+        if start:
+            start_id = table.key_of(start)
+            for position, item in enumerate(candidates):
+                if table.key_of(item) == start_id:
+                    candidates = candidates[position + 1 :]
+                    break
+            else:
+                candidates = [c for c in candidates if _after(sort_key(c), start, table, range_key, params, scan)]
+        limit = params.get("Limit")
+        filter_node = self._condition(params, "FilterExpression")
+        projection = self._projection(params)
+        evaluated = []
+        returned = []
+        scanned_bytes = 0
+        last_key = None
+        for item in candidates:
+            if limit is not None and len(evaluated) >= limit:
+                break
+            if scanned_bytes >= QUERY_PAGE_LIMIT:
+                break
+            visible = index.project(item, table) if index else item
+            evaluated.append(item)
+            scanned_bytes += item_size(visible)
+            if _evaluate(visible, filter_node):
+                returned.append(_project(visible, projection))
+        if evaluated and len(evaluated) < len(candidates):
+            tail = evaluated[-1]
+            last_key = table.key_dict(tail)
+            if index is not None:
+                last_key[index.hash_key] = tail[index.hash_key]
+                if index.range_key:
+                    last_key[index.range_key] = tail[index.range_key]
+        key_item = evaluated[0] if evaluated else {table.hash_key: {"S": ""}}
+        units = self._charge(table, key_item, scanned_bytes, False, params.get("ConsistentRead", False))
+        result = {"Count": len(returned), "ScannedCount": len(evaluated)}
+        if params.get("Select") != "COUNT":
+            result["Items"] = returned
+        if last_key:
+            result["LastEvaluatedKey"] = last_key
+        result.update(self._capacity(params, table, units))
+        return result
+
+    # Batch / transactions --------------------------------------------------
+
+    def _op_BatchGetItem(self, params):
+        requests = params["RequestItems"]
+        total = sum(len(spec["Keys"]) for spec in requests.values())
+        if total > BATCH_GET_LIMIT:
+            raise _validation("Too many items requested for the BatchGetItem call")
+        responses = {}
+        unprocessed = {}
+        budget = 16 * 1024 * 1024
+        for name, spec in requests.items():
+            table = self._table(name)
+            projection = self._projection(spec)
+            seen = set()
+            for key in spec["Keys"]:
+                table.validate_key(key)
+                identity = table.key_of(key)
+                if identity in seen:
+                    raise _validation("Provided list of item keys contains duplicates")
+                seen.add(identity)
+                item = table.items.get(identity)
+                size = item_size(item)
+                if budget - size < 0 or (self.throttle_rate and self.random.random() < self.throttle_rate):
+                    pending = unprocessed.setdefault(name, {k: v for k, v in spec.items() if k != "Keys"})
+                    pending.setdefault("Keys", []).append(key)
+                    continue
+                budget -= size
+                self._charge(table, key, size, False, spec.get("ConsistentRead", False))
+                if item is not None:
+                    responses.setdefault(name, []).append(_project(item, projection))
+        return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def _op_BatchWriteItem(self, params):
+        requests = params["RequestItems"]
+        total = sum(len(ops) for ops in requests.values())
+        if total > BATCH_WRITE_LIMIT:
+            raise _validation("Too many items requested for the BatchWriteItem call")
+        unprocessed = {}
+        for name, operations in requests.items():
+            table = self._table(name)
+            for operation in operations:
+                if self.throttle_rate and self.random.random() < self.throttle_rate:
+                    unprocessed.setdefault(name, []).append(operation)
+                    continue
+                if "PutRequest" in operation:
+                    item = operation["PutRequest"]["Item"]
+                    self._check_size(item)
+                    old = table.items.get(table.key_of(item))
+                    self._charge(table, item, max(item_size(item), item_size(old)), True)
+                    table.put(table.key_of(item), item)
+                else:
+                    key = operation["DeleteRequest"]["Key"]
+                    table.validate_key(key)
+                    old = table.pop(table.key_of(key))
+                    self._charge(table, key, item_size(old), True)
+        return {"UnprocessedItems": unprocessed}
+
+    def _op_TransactWriteItems(self, params):
+        operations = params["TransactItems"]
+        if len(operations) > TRANSACT_LIMIT:
+            raise _validation("Member must have length less than or equal to 100")
+        staged = []
+        reasons = []
+        failed = False
+        for operation in operations:
+            (kind, spec), = operation.items()
+            table = self._table(spec["TableName"])
+            if kind == "Put":
+                key = table.key_of(spec["Item"])
+            else:
+                table.validate_key(spec["Key"])
+                key = table.key_of(spec["Key"])
+            old = table.items.get(key)
+            try:
+                self._check(spec, old)
+                reasons.append({"Code": "None"})
+            except DynamoError as error:
+                failed = True
+                reasons.append({"Code": "ConditionalCheckFailed", "Message": error.message})
+                continue
+            staged.append((kind, spec, table, key, old))
+        if failed:
+            raise DynamoError(
+                "TransactionCanceledException",
+                "Transaction cancelled, please refer cancellation reasons for specific reasons "
+                f"[{', '.join(r['Code'] for r in reasons)}]",
+                extra={"CancellationReasons": reasons},
+            )
+        for kind, spec, table, key, old in staged:
+            if kind == "Put":
+                self._check_size(spec["Item"])
+                self._charge(table, spec["Item"], 2 * max(item_size(spec["Item"]), item_size(old)), True)
+                table.put(key, spec["Item"])
+            elif kind == "Delete":
+                self._charge(table, spec["Key"], 2 * item_size(old), True)
+                table.pop(key)
+            elif kind == "Update":
+                new = json.loads(json.dumps(old)) if old is not None else dict(spec["Key"])
+                parser = _Parser(
+                    spec["UpdateExpression"],
+                    spec.get("ExpressionAttributeNames"),
+                    spec.get("ExpressionAttributeValues"),
+                )
+                _apply_update(new, parser.update())
+                self._check_size(new)
+                self._charge(table, spec["Key"], 2 * max(item_size(new), item_size(old)), True)
+                table.put(key, new)
+        return {}
+
+    def _op_DescribeTable(self, params):
+        table = self._table(params["TableName"])
+        return {"Table": {"TableName": table.name, "TableStatus": "ACTIVE", "ItemCount": len(table.items)}}
+
+
+def _hash_value(node, name):
+    """The value a key condition requires the hash key `name` to equal, or None."""
+    if node[0] == "and":
+        return _hash_value(node[1], name) or _hash_value(node[2], name)
+    if node[0] == "cmp" and node[1] == "=":
+        left, right = node[2], node[3]
+        if right[0] == "path":
+            left, right = right, left
+        if left == ("path", (name,)) and right[0] == "value":
+            return right[1]
+    return None
+
+
+def _after(sort_parts, start, table, range_key, params, scan):
+    start_parts = []
+    if range_key and range_key in start:
+        start_parts.append(_comparable(start[range_key]))
+    start_parts.append(_comparable(start[table.hash_key]))
+    if table.range_key:
+        start_parts.append(_comparable(start[table.range_key]))
+    if not params.get("ScanIndexForward", True) and not scan:
+        return sort_parts < start_parts
+    return sort_parts > start_parts
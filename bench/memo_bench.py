@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""Latency and payload benchmark for the memo handler (api/handlers/memo.py).
+
+Drives handler(event, context) end to end against bench/fake_dynamodb.py, an
+in-process DynamoDB stand-in, so it runs offline and without AWS credentials.
+For each canvas size it saves, patches, reads and lists a synthetic canvas
+(make_items from codec_bench.py) and reports per case the median and p95
+latency, the response bytes, and the DynamoDB calls and capacity units one
+request uses. --latency-ms adds a delay to every DynamoDB call to model the
+network round trip, and --throttle-rate rejects that share of calls with a
+throughput error so the retry paths are exercised.
+
+--save writes the results as JSON. --compare checks them against a saved
+baseline and exits with status 1 when a case's median latency, response
+bytes, calls or capacity grew by more than --tolerance.
+
+Search and revision history are disabled, as when their tables are not set.
+
+Usage:
+    python bench/memo_bench.py [--items 10 100 1000 10000] [--rounds 3]
+    python bench/memo_bench.py --save baseline.json
+    python bench/memo_bench.py --compare baseline.json [--tolerance 0.25]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+# The handlers bind their clients and tables at import time
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+os.environ["DYNAMO_TABLE_NAME"] = "bench-memos"
+os.environ.setdefault("ASSET_BUCKET_NAME", "bench-assets")
+os.environ.pop("SEARCH_TABLE_NAME", None)
+os.environ.pop("REVISION_TABLE_NAME", None)
+
+from codec_bench import make_items  # noqa: E402
+from fake_dynamodb import FakeDynamoDB  # noqa: E402
+from handlers import memo  # noqa: E402
+
+# Latency changes smaller than this are noise, whatever the ratio
+LATENCY_FLOOR_MS = 0.5
+COMPARED = ("median_ms", "response_bytes", "calls", "rcu", "wcu")
+
+
+def event(method: str, user_id: str, memo_id: str = None, body=None, query=None, headers=None):
+    return {
+        "httpMethod": method,
+        "resource": "/memos/{memo_id}" if memo_id else "/memos",
+        "pathParameters": {"memo_id": memo_id} if memo_id else None,
+        "queryStringParameters": query,
+        "headers": headers or {},
+        "requestContext": {"authorizer": {"claims": {"sub": user_id}}},
+        "body": json.dumps(body, ensure_ascii=False) if body is not None else None,
+    }
+
+
+def canvas(items):
+    project = {
+        "id": "bench",
+        "name": "ベンチマーク",
+        "createdAt": "2026-01-01T00:00:00Z",
+        "updatedAt": "2026-01-01T00:00:00Z",
+    }
+    return json.dumps({"project": project, "items": items}, ensure_ascii=False)
+
+
+def setup_fake(args):
+    fake = FakeDynamoDB(
+        latency=args.latency_ms / 1000, throttle_rate=args.throttle_rate, seed=args.seed
+    )
+    fake.create_table(
+        memo.TABLE_NAME,
+        "user_id",
+        "memo_id",
+        indexes=[
+            {
+                "name": memo.UPDATED_AT_INDEX,
+                "hash_key": "user_id",
+                "range_key": "updated_at",
+                "projection": {
+                    "ProjectionType": "INCLUDE",
+                    "NonKeyAttributes": ["project_name", "created_at", "item_count", "content_bytes"],
+                },
+            }
+        ],
+    )
+    fake.attach(memo.dynamodb.meta.client)
+    return fake
+
+
+def send(request):
+    # The handler prints an EMF line per request
+    with contextlib.redirect_stdout(io.StringIO()):
+        return memo.handler(request, None)
+
+
+def run_case(fake, rounds: int, make_event, before=None):
+    """Sends `rounds` requests; returns the case's latency, size and DynamoDB usage."""
+    timings = []
+    sizes = []
+    fake.reset_metrics()
+    for i in range(rounds):
+        if before is not None:
+            before()
+        request = make_event(i)
+        started = time.perf_counter()
+        response = send(request)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response["statusCode"] >= 400:
+            status, body = response["statusCode"], response["body"]
+            raise RuntimeError(f"{request['httpMethod']} returned {status}: {body}")
+        sizes.append(len(response["body"].encode("utf-8")))
+    timings.sort()
+    return {
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[max(0, math.ceil(0.95 * len(timings)) - 1)],
+        "response_bytes": max(sizes),
+        "calls": len(fake.calls) / rounds,
+        "rcu": fake.consumed["read"] / rounds,
+        "wcu": fake.consumed["write"] / rounds,
+    }
+
+
+def bench_size(fake, count: int, args):
+    """Runs every case against a canvas of `count` items; returns {case: result}."""
+    rng = random.Random(args.seed)
+    items = make_items(count, rng)
+    user_id = f"bench-{count}"
+    memo_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    send(event("PUT", user_id, memo_id, {"content": canvas(items)}))
+    etag = send(event("GET", user_id, memo_id))["headers"].get("ETag")
+    edited = [dict(item) for item in items]
+
+    def put_one_change(i):
+        edited[0] = {**items[0], "x": items[0]["x"] + i + 1}
+        return event("PUT", user_id, memo_id, {"content": canvas(edited)})
+
+    def patch_upsert(i):
+        item = {**items[-1], "y": items[-1]["y"] + i + 1}
+        return event("PATCH", user_id, memo_id, {"ops": [{"op": "upsert", "item": item}]})
+
+    def put_new(i):
+        # A fresh memo of a separate user, so the lists above stay one memo long
+        new_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        return event("PUT", f"{user_id}-writer", new_id, {"content": canvas(items)})
+
+    cases = {
+        "get": (lambda i: event("GET", user_id, memo_id), memo.memo_cache.clear),
+        "get (cached)": (lambda i: event("GET", user_id, memo_id), None),
+        "get inline": (
+            lambda i: event("GET", user_id, memo_id, query={"content": "inline"}),
+            memo.memo_cache.clear,
+        ),
+        "get 304": (lambda i: event("GET", user_id, memo_id, headers={"If-None-Match": etag}), None),
+        "list summary": (lambda i: event("GET", user_id, query={"view": "summary"}), None),
+        "list full": (lambda i: event("GET", user_id), None),
+        "put one change": (put_one_change, None),
+        "patch upsert": (patch_upsert, None),
+        "put new": (put_new, None),
+    }
+    return {name: run_case(fake, args.rounds, *case) for name, case in cases.items()}
+
+
+def regressions(results, baseline, tolerance: float):
+    """Lines describing every metric that grew beyond `tolerance` over the baseline."""
+    found = []
+    for count, cases in baseline.items():
+        for name, old in cases.items():
+            new = results.get(count, {}).get(name)
+            if new is None:
+                continue
+            for metric in COMPARED:
+                before, after = old[metric], new[metric]
+                if metric == "median_ms" and after - before < LATENCY_FLOOR_MS:
+                    continue
+                if after > before * (1 + tolerance):
+                    found.append(f"{count} items, {name}: {metric} {before:.2f} -> {after:.2f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay per DynamoDB call")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of calls throttled")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file from --save")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed growth over the baseline")
+    args = parser.parse_args()
+
+    fake = setup_fake(args)
+    results = {}
+    print(
+        f"{'items':>6} {'case':<15} {'median ms':>10} {'p95 ms':>8} {'bytes':>10} "
+        f"{'calls':>6} {'RCU':>7} {'WCU':>7}"
+    )
+    for count in args.items:
+        results[str(count)] = bench_size(fake, count, args)
+        for name, result in results[str(count)].items():
+            print(
+                f"{count:>6} {name:<15} {result['median_ms']:>10.2f} {result['p95_ms']:>8.2f} "
+                f"{result['response_bytes']:>10} {result['calls']:>6.1f} {result['rcu']:>7.1f} "
+                f"{result['wcu']:>7.1f}"
+            )
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
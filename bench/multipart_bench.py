@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Fuzz test and benchmark of the OCR upload parser (api/handlers/ocr.py).
+
+Compares ocr.parse_multipart with the split-based parser it replaced, kept
+below as legacy_parse_multipart.
+
+The fuzz pass builds random multipart bodies: binary payloads (including
+ones ending in whitespace or "--"), random boundaries, extra form fields,
+quoted filenames, preambles and epilogues. It checks that the file comes
+back byte for byte, and counts where the legacy parser got it wrong. It
+then truncates and mutates bodies, and checks that the parser fails only
+with MultipartError.
+
+The benchmark parses base64-encoded uploads of each size with both parsers
+and reports the median time and the peak memory allocated while parsing.
+
+Usage:
+    python bench/multipart_bench.py [--iterations 2000] [--sizes 1 5 9] [--repeat 5]
+"""
+
+import argparse
+import base64
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "ap-northeast-1")
+
+from handlers import ocr  # noqa: E402
+
+ocr.logger.disabled = True
+
+BOUNDARY_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'()+_,-./:=?"
+FILENAMES = ["image.png", "スクリーンショット 2026-01-01.png", 'say "hi".jpg', "a;b.webp", "file"]
+
+
+def legacy_parse_multipart(event):
+    """The parser ocr.parse_multipart replaced, without its logging."""
+    content_type = event.get("headers", {}).get("content-type") or event.get(
+        "headers", {}
+    ).get("Content-Type", "")
+
+    if "multipart/form-data" not in content_type:
+        return None, "Content-Type must be multipart/form-data"
+
+    boundary = None
+    for part in content_type.split(";"):
+        part = part.strip()
+        if part.startswith("boundary="):
+            boundary = part[9:].strip('"')
+            break
+
+    if not boundary:
+        return None, "No boundary found in Content-Type"
+
+    body = event.get("body", "")
+    is_base64 = event.get("isBase64Encoded", False)
+
+    if is_base64:
+        body = base64.b64decode(body)
+    elif isinstance(body, str):
+        try:
+            body = base64.b64decode(body)
+        except Exception:
+            body = body.encode("utf-8", errors="surrogateescape")
+
+    boundary_bytes = f"--{boundary}".encode("utf-8")
+    parts = body.split(boundary_bytes)
+
+    for part in parts:
+        if b'name="file"' not in part:
+            continue
+
+        if b"\r\n\r\n" in part:
+            headers_section, content = part.split(b"\r\n\r\n", 1)
+        elif b"\n\n" in part:
+            headers_section, content = part.split(b"\n\n", 1)
+        else:
+            continue
+
+        content = content.rstrip()
+        if content.endswith(b"--"):
+            content = content[:-2].rstrip()
+
+        headers_str = headers_section.decode("utf-8", errors="ignore")
+        filename = "image"
+        if 'filename="' in headers_str:
+            start = headers_str.index('filename="') + 10
+            end = headers_str.index('"', start)
+            filename = headers_str[start:end]
+
+        file_content_type = "application/octet-stream"
+        for line in headers_str.split("\n"):
+            if line.lower().startswith("content-type:"):
+                file_content_type = line.split(":", 1)[1].strip()
+                break
+
+        return {
+            "filename": filename,
+            "content": content,
+            "content_type": file_content_type,
+        }, None
+
+    return None, "No file found in request"
+
+
+def random_payload(rng: random.Random, max_size: int = 4096):
+    payload = rng.randbytes(rng.randint(0, max_size))
+    ending = rng.random()
+    if ending < 0.2:
+        payload += rng.choice([b" ", b"\n", b"\r\n", b"\t\x00", b"--"])
+    elif ending < 0.3:
+        payload += b"\r\n\r\n"
+    return payload
+
+
+def random_boundary(rng: random.Random):
+    if rng.random() < 0.5:
+        return "----WebKitFormBoundary" + "".join(rng.choice(BOUNDARY_CHARS[:62]) for _ in range(16))
+    # Spaces are allowed inside a boundary, not at its end
+    middle = "".join(rng.choice(BOUNDARY_CHARS + " ") for _ in range(rng.randint(1, 60)))
+    return middle + rng.choice(BOUNDARY_CHARS)
+
+
+def quote(value: str):
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def build_body(rng: random.Random, payload: bytes, boundary: str, filename: str, media_type: str):
+    dash = b"--" + boundary.encode("latin-1")
+    fields = [(b'form-data; name="note"', None, rng.randbytes(rng.randint(0, 64)))]
+    if rng.random() < 0.3:
+        fields.append((b'form-data; name="files"; filename="decoy.png"', b"image/png", b"decoy"))
+    file_part = (
+        b"form-data; name=\"file\"; filename=" + quote(filename).encode("utf-8"),
+        media_type.encode("ascii"),
+        payload,
+    )
+    fields.insert(rng.randint(0, len(fields)), file_part)
+
+    chunks = []
+    if rng.random() < 0.2:
+        chunks.append(b"This is the preamble.\r\n")
+    for disposition, part_type, content in fields:
+        padding = b" " * rng.randint(0, 2) if rng.random() < 0.1 else b""
+        chunks.append(dash + padding + b"\r\nContent-Disposition: " + disposition + b"\r\n")
+        if part_type is not None:
+            chunks.append(b"Content-Type: " + part_type + b"\r\n")
+        chunks.append(b"\r\n" + content + b"\r\n")
+    chunks.append(dash + b"--\r\n")
+    if rng.random() < 0.2:
+        chunks.append(b"epilogue")
+    return b"".join(chunks)
+
+
+def make_event(body: bytes, boundary: str):
+    # Boundaries with separator characters or spaces must be quoted in the header
+    if any(c in boundary for c in ' "()<>@,;:\\/[]?='):
+        boundary = quote(boundary)
+    return {
+        "headers": {"Content-Type": f"multipart/form-data; boundary={boundary}"},
+        "body": base64.b64encode(body).decode("ascii"),
+        "isBase64Encoded": True,
+    }
+
+
+def fuzz(iterations: int, seed: int):
+    rng = random.Random(seed)
+    failures = []
+    legacy_wrong = 0
+    for i in range(iterations):
+        payload = random_payload(rng)
+        boundary = random_boundary(rng)
+        filename = rng.choice(FILENAMES)
+        media_type = rng.choice(["image/png", "image/jpeg", "application/octet-stream"])
+        body = build_body(rng, payload, boundary, filename, media_type)
+        if boundary.encode("latin-1") in payload:
+            continue
+        event = make_event(body, boundary)
+
+        try:
+            result = ocr.parse_multipart(event)
+            ok = (bytes(result["content"]), result["filename"], result["content_type"]) == (
+                payload,
+                filename,
+                media_type,
+            )
+        except Exception as e:
+            result, ok = None, False
+            failures.append(f"case {i}: valid body raised {e!r}")
+        if result is not None and not ok:
+            failures.append(f"case {i}: file part differs")
+
+        try:
+            legacy, _ = legacy_parse_multipart(event)
+            legacy_ok = legacy is not None and (legacy["content"], legacy["filename"]) == (payload, filename)
+        except Exception:
+            legacy_ok = False
+        legacy_wrong += not legacy_ok
+
+        # Truncated and mutated bodies may parse or fail, but only with MultipartError
+        broken = bytearray(body[: rng.randint(0, len(body))] if rng.random() < 0.5 else body)
+        for _ in range(rng.randint(1, 8)):
+            if broken:
+                broken[rng.randrange(len(broken))] = rng.randrange(256)
+        try:
+            ocr.parse_multipart(make_event(bytes(broken), boundary))
+        except ocr.MultipartError:
+            pass
+        except Exception as e:
+            failures.append(f"case {i}: mutated body raised {e!r}")
+
+    return failures, legacy_wrong
+
+
+def check_limit():
+    """An oversized upload must be refused before its body is decoded."""
+    body = "A" * (ocr.MAX_UPLOAD_BYTES // 3 * 4 + 8)
+    event = {
+        "headers": {"Content-Type": "multipart/form-data; boundary=x"},
+        "body": body,
+        "isBase64Encoded": True,
+    }
+    tracemalloc.start()
+    try:
+        ocr.parse_multipart(event)
+        status = None
+    except ocr.MultipartError as e:
+        status = e.status
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return status, peak
+
+
+def measure(parse, event, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parse(event)
+        timings.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    parse(event)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(timings), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000, help="Fuzz cases")
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 5, 9], help="Upload MB")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures, legacy_wrong = fuzz(args.iterations, args.seed)
+    print(f"fuzz: {args.iterations} cases, {len(failures)} failures, legacy parser wrong on {legacy_wrong}")
+    for line in failures[:20]:
+        print(f"  FAIL {line}")
+    status, peak = check_limit()
+    print(f"oversized upload: status {status}, peak {peak / 1024:.0f} KB allocated")
+
+    rng = random.Random(args.seed)
+    print(f"\n{'MB':>5} {'parser':>8} {'median ms':>10} {'peak MB':>8}")
+    for size in args.sizes:
+        payload = rng.randbytes(int(size * 1024 * 1024))
+        boundary = "----WebKitFormBoundary7MA4YWxkTrZu0gW"
+        event = make_event(build_body(rng, payload, boundary, "photo.jpg", "image/jpeg"), boundary)
+        for name, parse in (("legacy", legacy_parse_multipart), ("current", ocr.parse_multipart)):
+            ms, peak = measure(parse, event, args.repeat)
+            print(f"{size:>5g} {name:>8} {ms:>10.2f} {peak / 1024 / 1024:>8.1f}")
+
+    if failures or status != 413:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from aws_cdk import (
+    BundlingOptions,
     CfnOutput,
     Duration,
     RemovalPolicy,
@@ -25,12 +26,21 @@ from aws_cdk import (
 from aws_cdk import (
     aws_lambda as lambda_,
 )
+from aws_cdk import (
+    aws_lambda_event_sources as lambda_event_sources,
+)
 from aws_cdk import (
     aws_s3 as s3,
 )
 from aws_cdk import (
     aws_s3_deployment as s3deploy,
 )
+from aws_cdk import (
+    aws_secretsmanager as secretsmanager,
+)
+from aws_cdk import (
+    aws_sqs as sqs,
+)
 from constructs import Construct
 
 
@@ -79,12 +89,87 @@ class ApiStack(Stack):
             ),
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
             removal_policy=RemovalPolicy.DESTROY,
+            # Feeds the preview renderer; old images let it skip unchanged content
+            stream=dynamodb.StreamViewType.NEW_AND_OLD_IMAGES,
+            # Set on tombstones by DELETE /memos/{memo_id}
+            time_to_live_attribute="expires_at",
+        )
+
+        # Most-recent-first project listing without reading canvas bodies.
+        # A GSI rather than an LSI because LSIs cannot be added to an existing table.
+        memo_table.add_global_secondary_index(
+            index_name="UpdatedAtIndex",
+            partition_key=dynamodb.Attribute(
+                name="user_id",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="updated_at",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["project_name", "created_at", "item_count", "content_bytes"],
+        )
+
+        # Inverted index for GET /memos/search: one partition per "{user_id}#{token}",
+        # one item per memo containing the token
+        search_table = dynamodb.Table(
+            self,
+            "MemoSearchTable",
+            partition_key=dynamodb.Attribute(
+                name="token",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="memo_id",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
+        # Revision history: one partition per "{user_id}#{memo_id}", one item per
+        # memo version. The stream feeds the compactor; keys are all it reads.
+        revision_table = dynamodb.Table(
+            self,
+            "MemoRevisionTable",
+            partition_key=dynamodb.Attribute(
+                name="memo",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            sort_key=dynamodb.Attribute(
+                name="version",
+                type=dynamodb.AttributeType.NUMBER,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+            stream=dynamodb.StreamViewType.KEYS_ONLY,
+        )
+
+        # HMAC key for the opaque GET /memos pagination cursors
+        cursor_secret = secretsmanager.Secret(
+            self,
+            "MemoCursorSecret",
+            generate_secret_string=secretsmanager.SecretStringGenerator(
+                exclude_punctuation=True,
+                password_length=48,
+            ),
+            removal_policy=RemovalPolicy.DESTROY,
         )
 
         # ---------------------------------------------------------------------
         # Compute (Lambda)
         # ---------------------------------------------------------------------
 
+        # Key schema of MemoTable, shared by every function that reads it. Version 2
+        # shards each user's memos over MEMO_SHARD_COUNT partition keys; switching
+        # from version 1 goes through MEMO_KEY_MIGRATION=1 and
+        # scripts/migrate_memo_shards.py.
+        memo_key_schema = {
+            "MEMO_TABLE_KEY_VERSION": "1",
+            "MEMO_SHARD_COUNT": "8",
+        }
+
         # Lambda: Memo Handler
         memo_handler = lambda_.Function(
             self,
@@ -94,12 +179,143 @@ class ApiStack(Stack):
             handler="handlers.memo.handler",
             environment={
                 "DYNAMO_TABLE_NAME": memo_table.table_name,
+                "SEARCH_TABLE_NAME": search_table.table_name,
+                "REVISION_TABLE_NAME": revision_table.table_name,
+                # Read at runtime, so the key stays out of the template
+                "CURSOR_SECRET_ARN": cursor_secret.secret_arn,
+                **memo_key_schema,
             },
             timeout=Duration.seconds(30),
         )
 
         # Grant DynamoDB read/write access
         memo_table.grant_read_write_data(memo_handler)
+        search_table.grant_read_write_data(memo_handler)
+        revision_table.grant_read_write_data(memo_handler)
+        cursor_secret.grant_read(memo_handler)  # CURSOR_SECRET_ARN
+
+        # S3 Bucket for canvas images (content-addressed, kept with the memos)
+        asset_bucket = s3.Bucket(
+            self,
+            "AssetBucket",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            lifecycle_rules=[
+                # Archives written by GET /memos/export
+                s3.LifecycleRule(
+                    prefix="exports/",
+                    expiration=Duration.days(1),
+                )
+            ],
+        )
+        memo_handler.add_environment("ASSET_BUCKET_NAME", asset_bucket.bucket_name)
+        asset_bucket.grant_read_write(memo_handler)
+
+        # Lambda: Preview Handler (renders project grid previews from the table stream)
+        preview_handler = lambda_.Function(
+            self,
+            "PreviewHandler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("../api"),
+            handler="handlers.preview.handler",
+            environment={
+                "DYNAMO_TABLE_NAME": memo_table.table_name,
+                "ASSET_BUCKET_NAME": asset_bucket.bucket_name,
+                **memo_key_schema,
+            },
+            timeout=Duration.seconds(60),
+        )
+        memo_table.grant_read_data(preview_handler)
+        asset_bucket.grant_read_write(preview_handler, "previews/*")
+        preview_handler.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                memo_table,
+                starting_position=lambda_.StartingPosition.LATEST,
+                batch_size=50,
+                max_batching_window=Duration.seconds(5),
+                retry_attempts=2,
+            )
+        )
+
+        # Lambda: Purge Handler (removes item rows and search postings of expired tombstones)
+        purge_handler = lambda_.Function(
+            self,
+            "PurgeHandler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("../api"),
+            handler="handlers.purge.handler",
+            environment={
+                "DYNAMO_TABLE_NAME": memo_table.table_name,
+                "SEARCH_TABLE_NAME": search_table.table_name,
+                "REVISION_TABLE_NAME": revision_table.table_name,
+                "ASSET_BUCKET_NAME": asset_bucket.bucket_name,
+                **memo_key_schema,
+            },
+            timeout=Duration.seconds(60),
+        )
+        memo_table.grant_read_write_data(purge_handler)
+        search_table.grant_read_write_data(purge_handler)
+        revision_table.grant_read_write_data(purge_handler)
+        asset_bucket.grant_delete(purge_handler, "revisions/*")
+        purge_handler.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                memo_table,
+                starting_position=lambda_.StartingPosition.LATEST,
+                batch_size=25,
+                bisect_batch_on_error=True,
+                retry_attempts=10,
+                filters=[
+                    # Deletions by TTL only
+                    lambda_.FilterCriteria.filter(
+                        {
+                            "eventName": lambda_.FilterRule.is_equal("REMOVE"),
+                            "userIdentity": {
+                                "type": lambda_.FilterRule.is_equal("Service"),
+                                "principalId": lambda_.FilterRule.is_equal(
+                                    "dynamodb.amazonaws.com"
+                                ),
+                            },
+                        }
+                    )
+                ],
+            )
+        )
+
+        # Lambda: Compactor (snapshots and trims revision history from its stream)
+        compactor_handler = lambda_.Function(
+            self,
+            "CompactorHandler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("../api"),
+            handler="handlers.compactor.handler",
+            environment={
+                "DYNAMO_TABLE_NAME": memo_table.table_name,
+                "REVISION_TABLE_NAME": revision_table.table_name,
+                "ASSET_BUCKET_NAME": asset_bucket.bucket_name,
+                **memo_key_schema,
+            },
+            timeout=Duration.seconds(120),
+        )
+        memo_table.grant_read_data(compactor_handler)
+        revision_table.grant_read_write_data(compactor_handler)
+        asset_bucket.grant_read_write(compactor_handler, "revisions/*")
+        compactor_handler.add_event_source(
+            lambda_event_sources.DynamoEventSource(
+                revision_table,
+                starting_position=lambda_.StartingPosition.LATEST,
+                batch_size=100,
+                max_batching_window=Duration.seconds(30),
+                bisect_batch_on_error=True,
+                retry_attempts=5,
+                filters=[
+                    # New revisions only; its own snapshots and trims are not
+                    lambda_.FilterCriteria.filter(
+                        {"eventName": lambda_.FilterRule.is_equal("INSERT")}
+                    )
+                ],
+            )
+        )
 
         # Lambda: Hello Handler
         hello_handler = lambda_.Function(
@@ -123,7 +339,73 @@ class ApiStack(Stack):
             ],
         )
 
-        # Lambda: OCR Handler
+        # OCR job state, read by GET /ocr/jobs/{job_id}; expires with the bucket's images
+        ocr_job_table = dynamodb.Table(
+            self,
+            "OcrJobTable",
+            partition_key=dynamodb.Attribute(
+                name="job_id",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+            time_to_live_attribute="expires_at",
+        )
+
+        # OCR results by image hash, model and prompt version (see ocr.cache_key)
+        ocr_cache_table = dynamodb.Table(
+            self,
+            "OcrCacheTable",
+            partition_key=dynamodb.Attribute(
+                name="cache_key",
+                type=dynamodb.AttributeType.STRING,
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,
+            time_to_live_attribute="expires_at",
+        )
+
+        # OCR jobs waiting for the worker. A message is received at most 3 times
+        # (ocr.MAX_ATTEMPTS); the worker fails the job on its last attempt. A
+        # failed attempt is made visible again after a short delay
+        # (ocr_worker.RETRY_DELAY_SECONDS), not the visibility timeout below.
+        ocr_dead_letter_queue = sqs.Queue(
+            self,
+            "OcrJobDeadLetterQueue",
+            retention_period=Duration.days(14),
+        )
+        ocr_queue = sqs.Queue(
+            self,
+            "OcrJobQueue",
+            # At least 6x the worker's timeout, as Lambda recommends for SQS sources
+            visibility_timeout=Duration.seconds(720),
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3,
+                queue=ocr_dead_letter_queue,
+            ),
+        )
+
+        # Lambda layer: Pillow, which the OCR worker uses to downscale images
+        # before Bedrock (ocr.prepare_image). Built for the Lambda runtime in
+        # its bundling image.
+        imaging_layer = lambda_.LayerVersion(
+            self,
+            "ImagingLayer",
+            code=lambda_.Code.from_asset(
+                "layers/imaging",
+                bundling=BundlingOptions(
+                    image=lambda_.Runtime.PYTHON_3_12.bundling_image,
+                    command=[
+                        "bash",
+                        "-c",
+                        "pip install -r requirements.txt -t /asset-output/python",
+                    ],
+                ),
+            ),
+            compatible_runtimes=[lambda_.Runtime.PYTHON_3_12],
+        )
+
+        # Lambda: OCR Handler (stages images and queues jobs; returns immediately)
         ocr_handler = lambda_.Function(
             self,
             "OcrHandler",
@@ -134,16 +416,57 @@ class ApiStack(Stack):
             memory_size=512,
             environment={
                 "OCR_BUCKET_NAME": ocr_bucket.bucket_name,
+                "OCR_JOB_TABLE_NAME": ocr_job_table.table_name,
+                "OCR_CACHE_TABLE_NAME": ocr_cache_table.table_name,
+                "OCR_QUEUE_URL": ocr_queue.queue_url,
             },
         )
 
         # Grant OCR Lambda permissions
         ocr_bucket.grant_write(ocr_handler)
+        # A job that cannot be queued is failed and its image dropped
+        ocr_bucket.grant_delete(ocr_handler, "jobs/*")
+        ocr_job_table.grant_read_write_data(ocr_handler)
+        ocr_cache_table.grant_read_data(ocr_handler)
+        ocr_queue.grant_send_messages(ocr_handler)
 
-        # Grant Bedrock InvokeModel permission
-        ocr_handler.add_to_role_policy(
+        # Lambda: OCR Worker (runs queued jobs against Bedrock)
+        ocr_worker = lambda_.Function(
+            self,
+            "OcrWorkerHandler",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            code=lambda_.Code.from_asset("../api"),
+            handler="handlers.ocr_worker.handler",
+            layers=[imaging_layer],
+            timeout=Duration.seconds(120),
+            memory_size=512,
+            environment={
+                "OCR_BUCKET_NAME": ocr_bucket.bucket_name,
+                "OCR_JOB_TABLE_NAME": ocr_job_table.table_name,
+                "OCR_CACHE_TABLE_NAME": ocr_cache_table.table_name,
+                # Retries are rescheduled with ChangeMessageVisibility, which
+                # the event source's consume grant covers
+                "OCR_QUEUE_URL": ocr_queue.queue_url,
+            },
+        )
+        ocr_bucket.grant_read(ocr_worker, "jobs/*")
+        ocr_bucket.grant_delete(ocr_worker, "jobs/*")
+        ocr_job_table.grant_read_write_data(ocr_worker)
+        ocr_cache_table.grant_read_write_data(ocr_worker)
+        ocr_worker.add_event_source(
+            lambda_event_sources.SqsEventSource(
+                ocr_queue,
+                batch_size=1,
+                report_batch_item_failures=True,
+                # Bounds concurrent Bedrock calls; the rest wait in the queue
+                max_concurrency=10,
+            )
+        )
+
+        # Grant Bedrock InvokeModel permissions (blocking and streamed responses)
+        ocr_worker.add_to_role_policy(
             iam.PolicyStatement(
-                actions=["bedrock:InvokeModel"],
+                actions=["bedrock:InvokeModel", "bedrock:InvokeModelWithResponseStream"],
                 resources=["arn:aws:bedrock:*::foundation-model/anthropic.claude-3-haiku-20240307-v1:0"],
             )
         )
@@ -159,9 +482,11 @@ class ApiStack(Stack):
             default_cors_preflight_options=apigw.CorsOptions(
                 allow_origins=apigw.Cors.ALL_ORIGINS,
                 allow_methods=apigw.Cors.ALL_METHODS,
-                allow_headers=["Content-Type", "Authorization"],
+                allow_headers=["Content-Type", "Authorization", "If-Match", "If-None-Match"],
             ),
-            binary_media_types=["multipart/form-data"],
+            # application/json lets the memo handler return gzipped, base64-encoded bodies;
+            # application/gzip passes tar exports to POST /memos/import intact
+            binary_media_types=["multipart/form-data", "application/json", "application/gzip"],
         )
 
         # Cognito Authorizer
@@ -190,6 +515,40 @@ class ApiStack(Stack):
             authorization_type=apigw.AuthorizationType.COGNITO,
         )
 
+        # POST /memos/batch-get (a static path takes precedence over {memo_id})
+        memos_batch_get = memos.add_resource("batch-get")
+        memos_batch_get.add_method(
+            "POST",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+
+        # GET /memos/export, POST /memos/import
+        memos_export = memos.add_resource("export")
+        memos_export.add_method(
+            "GET",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+        memos_import = memos.add_resource("import")
+        memos_import.add_method(
+            "POST",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+
+        # GET /memos/search
+        memos_search = memos.add_resource("search")
+        memos_search.add_method(
+            "GET",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+
         memo = memos.add_resource("{memo_id}")
         memo.add_method(
             "GET",
@@ -203,6 +562,12 @@ class ApiStack(Stack):
             authorizer=authorizer,
             authorization_type=apigw.AuthorizationType.COGNITO,
         )
+        memo.add_method(
+            "PATCH",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
         memo.add_method(
             "DELETE",
             apigw.LambdaIntegration(memo_handler),
@@ -210,6 +575,30 @@ class ApiStack(Stack):
             authorization_type=apigw.AuthorizationType.COGNITO,
         )
 
+        # POST /memos/{memo_id}/restore
+        memo_restore = memo.add_resource("restore")
+        memo_restore.add_method(
+            "POST",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+
+        # GET /memos/{memo_id}/revisions and /memos/{memo_id}/revisions/{version}
+        memo_revisions = memo.add_resource("revisions")
+        memo_revisions.add_method(
+            "GET",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+        memo_revisions.add_resource("{version}").add_method(
+            "GET",
+            apigw.LambdaIntegration(memo_handler),
+            authorizer=authorizer,
+            authorization_type=apigw.AuthorizationType.COGNITO,
+        )
+
         # ---------------------------------------------------------------------
         # Frontend Hosting
         # ---------------------------------------------------------------------
@@ -284,6 +673,10 @@ class ApiStack(Stack):
         CfnOutput(self, "UserPoolId", value=user_pool.user_pool_id)
         CfnOutput(self, "UserPoolClientId", value=user_pool_client.user_pool_client_id)
         CfnOutput(self, "DynamoTableName", value=memo_table.table_name)
+        CfnOutput(self, "SearchTableName", value=search_table.table_name)
+        CfnOutput(self, "RevisionTableName", value=revision_table.table_name)
+        CfnOutput(self, "OcrJobTableName", value=ocr_job_table.table_name)
+        CfnOutput(self, "OcrCacheTableName", value=ocr_cache_table.table_name)
         CfnOutput(
             self,
             "S3BucketName",
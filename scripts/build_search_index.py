@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""Adds memos written before search existed to the search index.
+
+New writes keep the index up to date (see handlers/search.py); this script
+only covers headers and item rows that have no `tokens` attribute yet. With
+--reindex it also re-tokenizes rows indexed before a change to
+search.tokenize (e.g. CJK characters being indexed on their own) and
+applies the difference. Each row is updated only if it has not changed
+since it was scanned, so memos saved while the script runs are left to the
+handler. The script is safe to re-run.
+
+Usage:
+    DYNAMO_TABLE_NAME=<MemoTable> SEARCH_TABLE_NAME=<MemoSearchTable> \\
+        python scripts/build_search_index.py [--dry-run] [--reindex]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+from handlers import codec, memo, search  # noqa: E402
+
+
+def unindexed_rows(reindex: bool = False):
+    """Yields every header and item row without a `tokens` attribute, or every row."""
+    kwargs = {} if reindex else {"FilterExpression": Attr("tokens").not_exists()}
+    while True:
+        resp = memo.table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def row_tokens(row):
+    """Returns (tokens, condition that the row is unchanged)."""
+    if "item_id" in row:
+        item = json.loads(codec.decode(row["body"]))
+        return search.item_tokens(item), Attr("body").eq(row["body"])
+
+    unchanged = (
+        Attr("updated_at").eq(row["updated_at"])
+        if "updated_at" in row
+        else Attr("updated_at").not_exists()
+    )
+    if row.get("layout") == memo.ROWS_LAYOUT:
+        return search.tokenize(row.get("project_name", "")), unchanged
+    return search.tokenize(codec.decode(row.get("content"))), unchanged
+
+
+def index(row, dry_run: bool):
+    tokens, unchanged = row_tokens(row)
+    old = row.get("tokens", set())
+    if tokens == old:
+        return "current" if tokens else "empty"
+    if dry_run:
+        return "indexed"
+
+    indexed = Attr("tokens").eq(old) if old else Attr("tokens").not_exists()
+    update = {"UpdateExpression": "REMOVE #tokens"}
+    if tokens:
+        update = {
+            "UpdateExpression": "SET #tokens = :tokens",
+            "ExpressionAttributeValues": {":tokens": tokens},
+        }
+    try:
+        memo.table.update_item(
+            Key={"user_id": row["user_id"], "memo_id": row["memo_id"]},
+            ConditionExpression=indexed & unchanged,
+            ExpressionAttributeNames={"#tokens": "tokens"},
+            **update,
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return "changed"
+    memo_id = row["memo_id"].partition(memo.ROW_SEPARATOR)[0]
+    search.apply(memo._owner(row["user_id"]), memo_id, search.difference([old], [tokens]))
+    return "indexed"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument(
+        "--reindex", action="store_true", help="Also re-tokenize rows that are already indexed"
+    )
+    args = parser.parse_args()
+
+    if not memo.TABLE_NAME:
+        parser.error("DYNAMO_TABLE_NAME is not set")
+    if not search.TABLE_NAME:
+        parser.error("SEARCH_TABLE_NAME is not set")
+
+    counts = {"indexed": 0, "empty": 0, "current": 0, "changed": 0}
+    for row in unindexed_rows(args.reindex):
+        result = index(row, args.dry_run)
+        counts[result] += 1
+        if result not in ("empty", "current"):
+            print(f"{result}: {row['user_id']}/{row['memo_id']}")
+
+    print(
+        f"Done: {counts['indexed']} indexed, {counts['current']} up to date, "
+        f"{counts['empty']} without text, "
+        f"{counts['changed']} modified during indexing (already indexed by the handler)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Converts canvas memos stored as a single `content` blob to the row layout.
+
+Each canvas becomes a header row plus one row per item (see handlers/memo.py).
+Memos whose content is not a canvas are left as they are. Before any row is
+written the header is claimed, on condition that `updated_at` is unchanged and
+it is still a blob; a PUT or PATCH waits for the claim or answers 409, so it
+never interleaves its rows with the script's. A memo saved while the script
+runs is skipped and picked up on the next run. The script is safe to re-run.
+
+Usage:
+    DYNAMO_TABLE_NAME=<MemoTable> python scripts/migrate_memo_rows.py [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+from botocore.exceptions import ClientError  # noqa: E402
+from handlers import codec, memo  # noqa: E402
+
+
+def blob_memos():
+    """Yields every header that still stores its content inline."""
+    kwargs = {"FilterExpression": Attr("content").exists() & Attr("layout").not_exists()}
+    while True:
+        resp = memo.table.scan(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def migrate(item, dry_run: bool):
+    content = codec.decode(item["content"])
+    if memo._load_canvas(content) is None:
+        return "skipped"
+    if dry_run:
+        return "converted"
+
+    unchanged = (
+        Attr("updated_at").eq(item["updated_at"])
+        if "updated_at" in item
+        else Attr("updated_at").not_exists()
+    )
+    claim = uuid.uuid4().hex
+    try:
+        memo.table.update_item(
+            Key={"user_id": item["user_id"], "memo_id": item["memo_id"]},
+            ConditionExpression=unchanged
+            & Attr("layout").not_exists()
+            & Attr("deleted_at").not_exists()
+            & memo._unclaimed(),
+            **memo._update_expression(memo._claim_fields(claim)),
+        )
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return "changed"
+    try:
+        memo._write_memo(
+            memo._owner(item["user_id"]),
+            item["memo_id"],
+            content,
+            created_at=item.get("created_at", item.get("updated_at", "")),
+            updated_at=item.get("updated_at", ""),
+            condition=unchanged,
+            claim=claim,
+        )
+    except memo.VersionConflict:
+        return "changed"
+    return "converted"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    args = parser.parse_args()
+
+    if not memo.TABLE_NAME:
+        parser.error("DYNAMO_TABLE_NAME is not set")
+
+    counts = {"converted": 0, "skipped": 0, "changed": 0}
+    for item in blob_memos():
+        result = migrate(item, args.dry_run)
+        counts[result] += 1
+        print(f"{result}: {item['user_id']}/{item['memo_id']}")
+
+    print(
+        f"Done: {counts['converted']} converted, {counts['skipped']} not canvases, "
+        f"{counts['changed']} modified during migration (re-run to retry)"
+    )
+
+
+if __name__ == "__main__":
+    main()
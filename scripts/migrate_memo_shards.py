@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Moves memos from the version 1 key schema to sharded partitions.
+
+Version 2 of the memo table's key schema stores each memo under
+"{user_id}#{shard}" instead of `user_id` (see handlers/memo.py). The move is
+online:
+
+1. Deploy with MEMO_TABLE_KEY_VERSION=2 and MEMO_KEY_MIGRATION=1. The API
+   then writes only to shards, reads both layouts, and moves any memo it
+   touches before using it.
+2. Run this script until it reports nothing left to move. It moves each
+   remaining memo with the same code path as the API, so it can run
+   alongside live traffic and is safe to re-run.
+3. Deploy with MEMO_KEY_MIGRATION unset.
+
+Usage:
+    DYNAMO_TABLE_NAME=<MemoTable> MEMO_TABLE_KEY_VERSION=2 MEMO_KEY_MIGRATION=1 \\
+        python scripts/migrate_memo_shards.py [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from boto3.dynamodb.conditions import Attr  # noqa: E402
+from handlers import memo  # noqa: E402
+
+
+def unmoved_memos():
+    """Yields (user_id, memo_id) for every memo with rows under a version 1 key."""
+    kwargs = {
+        "FilterExpression": ~Attr("user_id").contains(memo.SHARD_SEPARATOR),
+        "ProjectionExpression": "user_id, memo_id",
+    }
+    seen = set()
+    while True:
+        resp = memo.table.scan(**kwargs)
+        for row in resp.get("Items", []):
+            key = (row["user_id"], row["memo_id"].partition(memo.ROW_SEPARATOR)[0])
+            if key not in seen:
+                seen.add(key)
+                yield key
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would move")
+    args = parser.parse_args()
+
+    if not memo.TABLE_NAME:
+        parser.error("DYNAMO_TABLE_NAME is not set")
+    if not memo.KEY_MIGRATION:
+        parser.error("Set MEMO_TABLE_KEY_VERSION=2 and MEMO_KEY_MIGRATION=1")
+
+    memos = 0
+    rows = 0
+    for user_id, memo_id in unmoved_memos():
+        memos += 1
+        if args.dry_run:
+            print(f"would move: {user_id}/{memo_id}")
+            continue
+        moved = memo._migrate_memo(user_id, memo_id)
+        rows += moved
+        print(f"moved: {user_id}/{memo_id} ({moved} rows)")
+
+    if args.dry_run:
+        print(f"Done: {memos} memos left to move")
+    else:
+        print(f"Done: {memos} memos, {rows} rows moved")
+
+
+if __name__ == "__main__":
+    main()
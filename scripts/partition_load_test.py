@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Load test of per-partition write throughput under both key schemas.
+
+Models one heavy user autosaving from many tabs: every tab sends a PATCH
+upserting one item every --interval seconds, each to its own memo. For key
+schema versions 1 and 2 (see handlers/memo.py) it reports, per partition,
+the writes and write capacity units per second against the 1,000 WCU/s a
+single DynamoDB partition sustains.
+
+By default the load is computed offline from the handler's own row layout
+and key function. With --live the same load is sent through the memo
+handler to DYNAMO_TABLE_NAME for --duration seconds, using whichever key
+schema the environment selects, and throttled requests are counted too.
+
+Usage:
+    python scripts/partition_load_test.py [--tabs 40] [--interval 2] [--shards 8]
+    DYNAMO_TABLE_NAME=<MemoTable> MEMO_TABLE_KEY_VERSION=2 \\
+        python scripts/partition_load_test.py --live [--duration 60]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+
+from handlers import memo  # noqa: E402
+
+PARTITION_WCU_LIMIT = 1000
+THROTTLE_CODES = ("ProvisionedThroughputExceededException", "ThrottlingException")
+
+
+def text_item(index: int):
+    return {
+        "id": f"item-{index}",
+        "type": "text",
+        "x": 40 * index,
+        "y": 30 * index,
+        "width": 200,
+        "height": 100,
+        "zIndex": 1,
+        "content": "autosave " * 20,
+    }
+
+
+def patch_cost(user_id: str, memo_id: str):
+    """(partition key, WCUs) of one single-item PATCH autosave."""
+    row = memo._item_row(user_id, memo_id, text_item(0), 0)
+    header = {
+        "user_id": row["user_id"],
+        "memo_id": memo_id,
+        "updated_at": "2026-01-01T00:00:00+00:00",
+        "etag": "0" * 32,
+        "version": 1,
+        "layout": memo.ROWS_LAYOUT,
+        "item_count": 1,
+        "content_bytes": row["body_bytes"],
+    }
+    # An update is billed on the larger of the item before and after
+    wcu = memo._write_units(header) + memo._write_units(row)
+    return row["user_id"], wcu
+
+
+def simulate(args, key_version: int):
+    memo.TABLE_KEY_VERSION = key_version
+    memo.SHARD_COUNT = args.shards
+    user_id = str(uuid.UUID(int=random.Random(0).getrandbits(128)))
+    rng = random.Random(1)
+    load = {}
+    for _ in range(args.tabs):
+        memo_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        partition, wcu = patch_cost(user_id, memo_id)
+        writes, units = load.get(partition, (0, 0))
+        load[partition] = (writes + 1 / args.interval, units + wcu / args.interval)
+    return load
+
+
+def run_live(args):
+    user_id = f"loadtest-{uuid.uuid4()}"
+    memo_ids = [str(uuid.uuid4()) for _ in range(args.tabs)]
+    for memo_id in memo_ids:
+        memo._write_memo(user_id, memo_id, json.dumps({"project": {}, "items": [text_item(0)]}))
+
+    throttles = Counter()
+    writes = Counter()
+    lock = threading.Lock()
+
+    def count_throttles(http_response, parsed, model, **kwargs):
+        if parsed.get("Error", {}).get("Code") in THROTTLE_CODES:
+            with lock:
+                throttles[model.name] += 1
+
+    memo.dynamodb.meta.client.meta.events.register("after-call.dynamodb", count_throttles)
+
+    def tab(memo_id: str):
+        deadline = time.monotonic() + args.duration
+        index = 0
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            index += 1
+            response = memo.handler(
+                {
+                    "httpMethod": "PATCH",
+                    "pathParameters": {"memo_id": memo_id},
+                    "requestContext": {"authorizer": {"claims": {"sub": user_id}}},
+                    "body": json.dumps({"ops": [{"op": "upsert", "item": text_item(index)}]}),
+                },
+                None,
+            )
+            if response["statusCode"] == 200:
+                with lock:
+                    writes[memo._partition(user_id, memo_id)] += 1
+            time.sleep(max(0.0, args.interval - (time.monotonic() - started)))
+
+    threads = [threading.Thread(target=tab, args=(memo_id,)) for memo_id in memo_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for memo_id in memo_ids:
+        memo._delete_memo(user_id, memo_id)
+    _, wcu = patch_cost(user_id, memo_ids[0])
+    load = {p: (n / args.duration, n * wcu / args.duration) for p, n in writes.items()}
+    return load, throttles
+
+
+def report(title: str, load):
+    print(f"\n{title}")
+    print(f"  {'partition':<48} {'writes/s':>9} {'WCU/s':>9} {'of limit':>9}")
+    for partition, (writes, units) in sorted(load.items(), key=lambda e: -e[1][1]):
+        share = units / PARTITION_WCU_LIMIT
+        print(f"  {partition:<48} {writes:>9.1f} {units:>9.1f} {share:>9.1%}")
+    hottest = max(units for _, units in load.values())
+    print(f"  hottest partition: {hottest:.1f} WCU/s across {len(load)} partitions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tabs", type=int, default=40, help="Concurrent autosaving tabs")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between autosaves")
+    parser.add_argument("--shards", type=int, default=memo.SHARD_COUNT, help="MEMO_SHARD_COUNT")
+    parser.add_argument("--live", action="store_true", help="Send the load to DYNAMO_TABLE_NAME")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of live load")
+    args = parser.parse_args()
+
+    if not args.live:
+        report("Key schema version 1 (user_id)", simulate(args, 1))
+        report(f"Key schema version 2 ({args.shards} shards)", simulate(args, 2))
+        return
+
+    if not memo.TABLE_NAME:
+        parser.error("DYNAMO_TABLE_NAME is not set")
+    load, throttles = run_live(args)
+    report(f"Live, key schema version {memo.TABLE_KEY_VERSION}", load)
+    print(f"  throttled requests: {dict(throttles) or 0}")
+
+
+if __name__ == "__main__":
+    main()
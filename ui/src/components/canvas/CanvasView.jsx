@@ -27,6 +27,7 @@ export default function CanvasView() {
 
   const [dropActive, setDropActive] = useState(false);
   const [ocrLoading, setOcrLoading] = useState(false);
+  const [ocrPreview, setOcrPreview] = useState('');
   const [loaded, setLoaded] = useState(false);
 
   const ocrInputRef = useRef(null);
@@ -140,8 +141,9 @@ export default function CanvasView() {
       return;
     }
     setOcrLoading(true);
+    setOcrPreview('');
     try {
-      const result = await OcrService.processImage(file);
+      const result = await OcrService.processImage(file, { onProgress: setOcrPreview });
       const newItem = new TextItem({ x, y, width: 300, height: 150, content: result.text });
       addItem(newItem);
       triggerAutoSave();
@@ -159,6 +161,7 @@ export default function CanvasView() {
       toast.error('OCR処理エラー', error.message || 'OCR処理中にエラーが発生しました', errorDetails);
     } finally {
       setOcrLoading(false);
+      setOcrPreview('');
     }
   }
 
@@ -289,7 +292,7 @@ export default function CanvasView() {
       />
 
       <DropOverlay active={dropActive} />
-      <LoadingOverlay active={ocrLoading} />
+      <LoadingOverlay active={ocrLoading} text={ocrPreview} />
 
       <CanvasArea
         items={items}
@@ -1,9 +1,10 @@
-export default function LoadingOverlay({ active }) {
+export default function LoadingOverlay({ active, text }) {
   return (
     <div id="loading-overlay" className={active ? 'active' : ''}>
       <div className="loading-content">
         <div className="spinner"></div>
         <span>OCR処理中...</span>
+        {text && <pre className="loading-preview">{text}</pre>}
       </div>
     </div>
   );
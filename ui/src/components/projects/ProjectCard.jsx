@@ -1,3 +1,5 @@
+import { useState } from 'react';
+
 function formatDate(isoString) {
   const date = new Date(isoString);
   return date.toLocaleDateString('ja-JP', {
@@ -8,10 +10,25 @@ function formatDate(isoString) {
 }
 
 export default function ProjectCard({ project, onClick, onRename, onDelete }) {
+  // Previews render after a save, so a new project may not have one yet
+  const [failedUrl, setFailedUrl] = useState(null);
+  const showPreview = project.previewUrl && project.previewUrl !== failedUrl;
+
   return (
     <div className="project-card" data-project-id={project.id} onClick={() => onClick(project)}>
       <div className="project-thumbnail">
-        <span className="placeholder-icon"></span>
+        {showPreview ? (
+          <img
+            className="project-preview"
+            src={project.previewUrl}
+            alt=""
+            loading="lazy"
+            draggable={false}
+            onError={() => setFailedUrl(project.previewUrl)}
+          />
+        ) : (
+          <span className="placeholder-icon"></span>
+        )}
       </div>
       <div className="project-info">
         <h3 className="project-name">{project.name}</h3>
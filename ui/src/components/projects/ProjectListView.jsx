@@ -2,22 +2,54 @@ import { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../../hooks/useAuth.js';
 import { useProjects } from '../../hooks/useProjects.js';
+import { useToast } from '../../hooks/useToast.js';
+import { Storage } from '../../services/storage.js';
+import { Project } from '../../models/Project.js';
 import ProjectGrid from './ProjectGrid.jsx';
 import ProjectModal from './ProjectModal.jsx';
 
+const SEARCH_DEBOUNCE_MS = 300;
+
 export default function ProjectListView() {
   const { signOut } = useAuth();
-  const { projects, loadProjects, addProject, deleteProject, renameProject } = useProjects();
+  const {
+    projects,
+    loadProjects,
+    addProject,
+    deleteProject,
+    restoreProject,
+    renameProject,
+  } = useProjects();
+  const toast = useToast();
   const navigate = useNavigate();
 
   const [modalActive, setModalActive] = useState(false);
   const [modalMode, setModalMode] = useState('create');
   const [editingProject, setEditingProject] = useState(null);
+  const [searchQuery, setSearchQuery] = useState('');
+  const [searchResults, setSearchResults] = useState(null);
 
   useEffect(() => {
     loadProjects();
   }, [loadProjects]);
 
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (!query) {
+      setSearchResults(null);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const results = await Storage.searchProjects(query);
+      if (!cancelled) setSearchResults(results.map(p => new Project(p)));
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery]);
+
   function handleOpen(project) {
     navigate(`/projects/${project.id}`);
   }
@@ -37,6 +69,14 @@ export default function ProjectListView() {
   async function handleDelete(project) {
     if (confirm(`「${project.name}」を削除しますか？`)) {
       await deleteProject(project.id);
+      toast.addToast({
+        title: '削除しました',
+        message: `「${project.name}」を削除しました`,
+        actions: [
+          { label: '元に戻す', primary: true, onClick: () => restoreProject(project.id) },
+          { label: '閉じる', primary: false, onClick: () => {} },
+        ],
+      });
     }
   }
 
@@ -62,9 +102,16 @@ export default function ProjectListView() {
       </header>
       <div id="project-actions">
         <button className="primary-btn" onClick={handleNewProject}>+ 新規プロジェクト</button>
+        <input
+          type="search"
+          id="project-search"
+          placeholder="メモを検索"
+          value={searchQuery}
+          onChange={e => setSearchQuery(e.target.value)}
+        />
       </div>
       <ProjectGrid
-        projects={projects}
+        projects={searchResults ?? projects}
         onOpen={handleOpen}
         onRename={handleRename}
         onDelete={handleDelete}
@@ -107,7 +107,13 @@ export function useCanvas() {
     const currentItems = itemsRef.current;
     if (!meta) return;
     const serialized = Array.from(currentItems.values()).map(item => item.serialize());
-    await Storage.saveFullData(projectId, meta, serialized);
+    const saved = await Storage.saveFullData(projectId, meta, serialized);
+
+    // Adopt S3 asset ids so inline images are uploaded only once
+    saved?.items?.forEach(savedItem => {
+      const item = itemsRef.current.get(savedItem.id);
+      if (item && savedItem.assetId && !item.assetId) item.assetId = savedItem.assetId;
+    });
   }, []);
 
   return {
@@ -2,6 +2,9 @@ import { useState, useCallback } from 'react';
 import { Storage } from '../services/storage.js';
 import { Project } from '../models/Project.js';
 
+// Most recently updated canvases fetched in the background after listing
+const PREFETCH_COUNT = 6;
+
 export function useProjects() {
   const [projects, setProjects] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -14,6 +17,7 @@ export function useProjects() {
         .map(p => new Project(p))
         .sort((a, b) => new Date(b.updatedAt) - new Date(a.updatedAt));
       setProjects(sorted);
+      Storage.prefetchFullData(sorted.slice(0, PREFETCH_COUNT).map(p => p.id));
     } catch (e) {
       console.error("Failed to load projects", e);
     } finally {
@@ -33,6 +37,11 @@ export function useProjects() {
     await loadProjects();
   }, [loadProjects]);
 
+  const restoreProject = useCallback(async (projectId) => {
+    await Storage.restoreProject(projectId);
+    await loadProjects();
+  }, [loadProjects]);
+
   const renameProject = useCallback(async (projectId, newName) => {
     const project = projects.find(p => p.id === projectId);
     if (!project) return;
@@ -48,6 +57,7 @@ export function useProjects() {
     loadProjects,
     addProject,
     deleteProject,
+    restoreProject,
     renameProject,
   };
 }
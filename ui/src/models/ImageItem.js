@@ -4,10 +4,13 @@ export class ImageItem extends CanvasItem {
   constructor(data) {
     super({ ...data, type: "image" });
     this.src = data.src || "";
+    // Set once the API has stored the image in S3; src is then not re-sent
+    this.assetId = data.assetId || null;
   }
 
   serialize() {
     const base = super.serialize();
+    if (this.assetId) return { ...base, assetId: this.assetId };
     return { ...base, src: this.src };
   }
 }
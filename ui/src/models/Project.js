@@ -4,6 +4,8 @@ export class Project {
     this.name = data.name || "無題のプロジェクト";
     this.createdAt = data.createdAt || new Date().toISOString();
     this.updatedAt = data.updatedAt || new Date().toISOString();
+    // Rendered by the server; not part of the saved project metadata
+    this.previewUrl = data.previewUrl || null;
   }
 
   serialize() {
@@ -2,8 +2,11 @@ import { auth } from './auth.js';
 
 const API_ENDPOINT = (window.ENV && window.ENV.API_ENDPOINT) || "";
 
+// Returned instead of a body when a conditional GET answers 304
+export const NOT_MODIFIED = Symbol('NOT_MODIFIED');
+
 export const Api = {
-  async request(method, path, body = null) {
+  async request(method, path, body = null, extraHeaders = {}) {
     if (!API_ENDPOINT) {
         console.warn("API Endpoint not set. Using LocalStorage fallback (not fully implemented).");
         return null;
@@ -20,7 +23,10 @@ export const Api = {
 
     const headers = {
       'Content-Type': 'application/json',
-      'Authorization': token
+      // Matches the API's binary media type, which lets it return gzipped JSON
+      'Accept': 'application/json',
+      'Authorization': token,
+      ...extraHeaders
     };
 
     const response = await fetch(`${API_ENDPOINT}${path}`, {
@@ -29,15 +35,22 @@ export const Api = {
       body: body ? JSON.stringify(body) : null
     });
 
-    if (!response.ok) {
+    if (!response.ok && response.status !== 304) {
         if (response.status === 401) {
             await auth.signOut();
             window.location.reload();
         }
-        throw new Error(`API Error: ${response.status}`);
+        const error = new Error(`API Error: ${response.status}`);
+        error.status = response.status;
+        error.body = await response.json().catch(() => null);
+        throw error;
     }
 
+    if (response.status === 304) return NOT_MODIFIED;
     if (response.status === 204) return null;
-    return response.json();
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) data.etag = etag;
+    return data;
   }
 };
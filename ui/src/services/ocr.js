@@ -8,8 +8,68 @@ export class OcrError extends Error {
   }
 }
 
+// POST /ocr/jobs only queues the job; its result is polled from GET /ocr/jobs/{job_id}
+const POLL_INTERVAL_MS = 1000;
+const MAX_POLL_INTERVAL_MS = 5000;
+// A RUNNING job returns the text extracted so far, updated as the model streams it
+const RUNNING_POLL_INTERVAL_MS = 400;
+// Covers a job's retries: MAX_ATTEMPTS worker runs of up to 120 s plus the
+// retry delays (api/handlers/ocr_worker.py, RETRY_DELAY_SECONDS)
+const JOB_TIMEOUT_MS = 7 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function waitForJob(jobId, details, onProgress) {
+  const deadline = Date.now() + JOB_TIMEOUT_MS;
+  let interval = POLL_INTERVAL_MS;
+  let partialText = "";
+  while (Date.now() < deadline) {
+    await sleep(interval);
+    interval = Math.min(interval * 1.5, MAX_POLL_INTERVAL_MS);
+
+    let response;
+    let responseData;
+    try {
+      response = await fetch(`${API_ENDPOINT}/ocr/jobs/${encodeURIComponent(jobId)}`);
+      responseData = await response.json().catch(() => null);
+    } catch {
+      // Transient network errors while polling; the job keeps running
+      continue;
+    }
+    if (!response.ok) {
+      throw new OcrError(
+        responseData?.error || `HTTPエラー: ${response.status}`,
+        {
+          ...details,
+          type: "HTTP_ERROR",
+          jobId,
+          httpStatus: response.status,
+          httpStatusText: response.statusText,
+          response: responseData,
+        }
+      );
+    }
+    if (responseData?.status === "SUCCEEDED" || responseData?.status === "FAILED") {
+      return responseData;
+    }
+    if (responseData?.status === "RUNNING") {
+      interval = RUNNING_POLL_INTERVAL_MS;
+      if (onProgress && responseData.text && responseData.text !== partialText) {
+        partialText = responseData.text;
+        onProgress(partialText);
+      }
+    }
+  }
+  throw new OcrError("OCR処理がタイムアウトしました", {
+    ...details,
+    type: "TIMEOUT",
+    jobId,
+  });
+}
+
 export const OcrService = {
-  async processImage(file) {
+  // onProgress(text) is called with the text extracted so far while the job runs
+  async processImage(file, { onProgress } = {}) {
     const formData = new FormData();
     formData.append("file", file, file.name);
 
@@ -51,6 +111,16 @@ export const OcrService = {
       );
     }
 
+    const details = {
+      timestamp: requestTime,
+      fileName: file.name,
+      fileSize: file.size,
+      fileType: file.type,
+    };
+    if (responseData?.status === "QUEUED" || responseData?.status === "RUNNING") {
+      responseData = await waitForJob(responseData.job_id, details, onProgress);
+    }
+
     if (responseData?.status === "FAILED") {
       throw new OcrError(responseData.error || "OCR処理に失敗しました", {
         type: "OCR_FAILED",
@@ -65,6 +135,7 @@ export const OcrService = {
 
     return {
       text: responseData?.text || "",
+      cached: Boolean(responseData?.cached),
     };
   },
 };
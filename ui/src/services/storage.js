@@ -1,21 +1,75 @@
-import { Api } from './api.js';
+import { Api, NOT_MODIFIED } from './api.js';
+
+// Last state the server acknowledged per project, so saves send only changes
+const savedSnapshots = new Map();
+// Server version of each loaded project, sent as the PATCH precondition
+const savedVersions = new Map();
+// Last GET response per project with its ETag, reused when the server answers 304
+const loadedResponses = new Map();
+// Saves from this tab are numbered per project; the server drops one that
+// arrives after a later one, and only the latest answered save moves the snapshot
+const clientId = crypto.randomUUID();
+const sentSequences = new Map();
+const appliedSequences = new Map();
+
+function nextSequence(projectId) {
+  const seq = (sentSequences.get(projectId) || 0) + 1;
+  sentSequences.set(projectId, seq);
+  return seq;
+}
+
+function isLatestApplied(projectId, seq, res) {
+  if (!res || res.stale || seq <= (appliedSequences.get(projectId) || 0)) return false;
+  appliedSequences.set(projectId, seq);
+  return true;
+}
+
+// Stored images are identified by assetId; their signed src URLs may differ
+function itemKey(item) {
+  return JSON.stringify(item.assetId ? { ...item, src: undefined } : item);
+}
+
+function takeSnapshot(projectMeta, items) {
+  return {
+    project: JSON.stringify(projectMeta),
+    items: new Map(items.map(item => [item.id, itemKey(item)])),
+  };
+}
+
+function diffItems(snapshot, items) {
+  const ops = [];
+  const currentIds = new Set();
+  items.forEach(item => {
+    currentIds.add(item.id);
+    if (snapshot.items.get(item.id) !== itemKey(item)) {
+      ops.push({ op: 'upsert', item });
+    }
+  });
+  snapshot.items.forEach((_, id) => {
+    if (!currentIds.has(id)) ops.push({ op: 'delete', id });
+  });
+  return ops;
+}
 
 export const Storage = {
   async loadProjects() {
     try {
-        const res = await Api.request('GET', '/memos');
-        if (!res) return [];
+        const projects = [];
+        let cursor = null;
+        do {
+            const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : '';
+            const res = await Api.request('GET', `/memos?view=summary${query}`);
+            if (!res) break;
 
-        const projects = res.memos.map(memo => {
-            try {
-                const data = JSON.parse(memo.content);
-                if (data.project) return data.project;
-                if (data.id && data.name) return data;
-                return { id: memo.memoId, name: "無題のプロジェクト", updatedAt: new Date().toISOString() };
-            } catch (e) {
-                return { id: memo.memoId, name: "破損したデータ", updatedAt: new Date().toISOString() };
-            }
-        });
+            res.memos.forEach(memo => projects.push({
+                id: memo.memoId,
+                name: memo.name || "無題のプロジェクト",
+                createdAt: memo.createdAt,
+                updatedAt: memo.updatedAt,
+                previewUrl: memo.previewUrl,
+            }));
+            cursor = res.nextCursor;
+        } while (cursor);
         return projects;
     } catch (e) {
         console.error("Load projects failed", e);
@@ -23,40 +77,150 @@ export const Storage = {
     }
   },
 
+  async searchProjects(query) {
+    try {
+        const res = await Api.request('GET', `/memos/search?q=${encodeURIComponent(query)}`);
+        if (!res) return [];
+        return res.memos.map(memo => ({
+            id: memo.memoId,
+            name: memo.name || "無題のプロジェクト",
+            createdAt: memo.createdAt,
+            updatedAt: memo.updatedAt,
+            previewUrl: memo.previewUrl,
+        }));
+    } catch (e) {
+        console.error("Search failed", e);
+        return [];
+    }
+  },
+
   async saveFullData(projectId, projectMeta, itemsArray) {
     const items = itemsArray || [];
+    loadedResponses.delete(projectId);
+    const previous = savedSnapshots.get(projectId);
+    if (previous) {
+        const ops = diffItems(previous, items);
+        const projectChanged = previous.project !== JSON.stringify(projectMeta);
+        if (ops.length === 0 && !projectChanged) return null;
+        try {
+            const clientSeq = nextSequence(projectId);
+            const body = projectChanged ? { ops, project: projectMeta } : { ops };
+            const res = await this.patchWithVersion(projectId, { ...body, clientId, clientSeq });
+            if (isLatestApplied(projectId, clientSeq, res)) {
+                savedSnapshots.set(projectId, takeSnapshot(projectMeta, items));
+            }
+            return res;
+        } catch (e) {
+            console.warn("Patch save failed, falling back to full save", e);
+        }
+    }
+
     const data = {
         project: projectMeta,
         items: items
     };
-    await Api.request('PUT', `/memos/${projectId}`, {
-        content: JSON.stringify(data)
+    const clientSeq = nextSequence(projectId);
+    const res = await Api.request('PUT', `/memos/${projectId}`, {
+        content: JSON.stringify(data),
+        clientId,
+        clientSeq
     });
+    if (!isLatestApplied(projectId, clientSeq, res)) return null;
+    savedSnapshots.set(projectId, takeSnapshot(projectMeta, items));
+    savedVersions.set(projectId, res.version);
+    return res.content ? JSON.parse(res.content) : null;
   },
 
-  async updateProjectMeta(project) {
-    const currentData = await this.loadFullData(project.id);
-    const items = currentData ? currentData.items : [];
+  // Item-level ops are safe to re-apply on top of another tab's save, so a
+  // version conflict is rebased once onto the version the server reports.
+  async patchWithVersion(projectId, body) {
+    const expectedVersion = savedVersions.get(projectId);
+    let res;
+    try {
+        res = await Api.request('PATCH', `/memos/${projectId}`, { ...body, expectedVersion });
+    } catch (e) {
+        if (e.status !== 409 || e.body?.currentVersion === undefined) throw e;
+        res = await Api.request('PATCH', `/memos/${projectId}`, {
+            ...body,
+            expectedVersion: e.body.currentVersion,
+        });
+    }
+    // An earlier save may be answered last; never go back to its version
+    if (res) savedVersions.set(projectId, Math.max(res.version, savedVersions.get(projectId) || 0));
+    return res;
+  },
 
-    const newData = {
+  async updateProjectMeta(project) {
+    loadedResponses.delete(project.id);
+    const clientSeq = nextSequence(project.id);
+    const res = await this.patchWithVersion(project.id, {
+        ops: [],
         project: project,
-        items: items
-    };
-
-    await Api.request('PUT', `/memos/${project.id}`, {
-        content: JSON.stringify(newData)
+        clientId,
+        clientSeq
     });
+    const snapshot = savedSnapshots.get(project.id);
+    if (snapshot && isLatestApplied(project.id, clientSeq, res)) {
+        snapshot.project = JSON.stringify(project);
+    }
   },
 
   async deleteProject(projectId) {
     await Api.request('DELETE', `/memos/${projectId}`);
+    savedSnapshots.delete(projectId);
+    savedVersions.delete(projectId);
+    loadedResponses.delete(projectId);
+  },
+
+  // Deleted projects stay restorable until the server purges them
+  async restoreProject(projectId) {
+    await Api.request('POST', `/memos/${projectId}/restore`);
+  },
+
+  // Fetches several canvases in one request so opening them later only costs
+  // a conditional GET answered with 304
+  async prefetchFullData(projectIds) {
+    const ids = projectIds.filter(id => !loadedResponses.has(id));
+    if (ids.length === 0) return;
+    try {
+        const res = await Api.request('POST', '/memos/batch-get', {
+            memoIds: ids,
+            view: 'full',
+            content: 'inline',
+        });
+        if (!res) return;
+        res.memos.forEach(memo => {
+            if (!loadedResponses.has(memo.memoId)) loadedResponses.set(memo.memoId, memo);
+        });
+    } catch (e) {
+        console.warn("Prefetch failed", e);
+    }
   },
 
   async loadFullData(projectId) {
       try {
-        const res = await Api.request('GET', `/memos/${projectId}`);
+        const cached = loadedResponses.get(projectId);
+        let res = await Api.request(
+            'GET',
+            `/memos/${projectId}?content=inline`,
+            null,
+            cached ? { 'If-None-Match': cached.etag } : {}
+        );
+        if (res === NOT_MODIFIED) {
+            res = cached;
+        } else if (res && res.etag) {
+            loadedResponses.set(projectId, res);
+        }
         if (!res || !res.content) return null;
-        return JSON.parse(res.content);
+        // Inline canvases arrive parsed; a cached one is copied so edits stay local
+        const data = typeof res.content === 'string'
+            ? JSON.parse(res.content)
+            : structuredClone(res.content);
+        savedVersions.set(projectId, res.version);
+        if (data.project && Array.isArray(data.items)) {
+            savedSnapshots.set(projectId, takeSnapshot(data.project, data.items));
+        }
+        return data;
       } catch (e) {
           console.error("Load full data failed", e);
           return null;